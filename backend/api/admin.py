@@ -1,5 +1,4 @@
 import jwt
-import httpx
 import asyncio
 from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from pydantic import BaseModel, EmailStr
@@ -7,6 +6,7 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from db.models import db_manager
 from config import settings
+from utils.http_pool import http_pool
 
 router = APIRouter()
 
@@ -47,8 +47,7 @@ async def send_telegram_notification(telegram_id: int, message: str, reply_marku
         payload["reply_markup"] = reply_markup
         
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post(url, json=payload)
+        await http_pool.post(url, json=payload)
     except Exception as e:
         print(f"Failed to send telegram notification: {e}")
 
@@ -135,10 +134,45 @@ async def get_role(admin: Dict = Depends(get_current_admin)):
 @router.get("/cache-stats")
 async def get_cache_stats(admin: Dict = Depends(get_current_admin)):
     from bot.gmail_client import GmailClient
+    from bot.gmail_quota import gmail_quota
+    from bot.gmail_transport import payload_stats
+    from db.mailstore import mail_store
+    from bot.intent_classifier import intent_classifier
+    from bot.tool_cache import tool_cache
+    from bot.summary_cache import summary_cache
+    from utils.embeddings import embedding_cache
+    from bot.ai_engine import ai_engine
     return {
         "hits": GmailClient.cache_hits,
         "misses": GmailClient.cache_misses,
-        "user_count": len(GmailClient._token_cache)
+        "user_count": len(GmailClient._token_cache),
+        "service_hits": GmailClient.service_cache_hits,
+        "service_misses": GmailClient.service_cache_misses,
+        "service_count": len(GmailClient._service_cache),
+        "message_hits": GmailClient.message_cache_hits,
+        "message_misses": GmailClient.message_cache_misses,
+        "listing_hits": GmailClient.listing_cache_hits,
+        "listing_pages_fetched": GmailClient.listing_pages_fetched,
+        "message_count": len(GmailClient._message_cache),
+        "message_cache_bytes": GmailClient._message_cache.currsize,
+        "attachment_downloads": GmailClient.attachment_downloads,
+        "attachment_bytes": GmailClient.attachment_bytes,
+        "attachment_rss_growth_kb": GmailClient.attachment_rss_growth_kb,
+        "inline_refreshes": GmailClient.inline_refreshes,
+        "background_refreshes": GmailClient.background_refreshes,
+        "gmail_quota": gmail_quota.stats(),
+        "gmail_payload": payload_stats.report(),
+        "mail_store": mail_store.stats(),
+        "http_pool": http_pool.stats(),
+        "intent_preclassifier": intent_classifier.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "agent_context": ai_engine.context_stats(),
+        "agent_speculation": ai_engine.speculation_stats(),
+        "agent_reply_latency": ai_engine.reply_latency_stats(),
+        "agent_prompt_cache": ai_engine.prompt_cache_stats(),
+        "agent_tools": ai_engine.tool_stats(),
+        "tool_cache": tool_cache.stats(),
+        "search_summary_cache": summary_cache.stats()
     }
 
 @router.get("/stats")
@@ -13,7 +13,6 @@ Features:
 import json
 import os
 import jwt
-import httpx
 import asyncio
 import logging
 from typing import Optional
@@ -24,6 +23,7 @@ from google_auth_oauthlib.flow import Flow
 
 from config import settings
 from db.models import db_manager
+from utils.http_pool import http_pool
 
 os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
 router = APIRouter()
@@ -86,8 +86,7 @@ async def _send_welcome_to_telegram(telegram_id: int):
         "reply_markup": kb,
     }
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            await client.post(url, json=payload)
+        await http_pool.post(url, json=payload, timeout=10)
     except Exception as e:
         logger.error(f"Fallback welcome notifier delivery failed: {e}")
 
@@ -156,13 +155,13 @@ async def callback(code: str, state: str):
         email = None
         if auth_token["token"]:
             try:
-                async with httpx.AsyncClient(timeout=20) as client:
-                    resp = await client.get(
-                        "https://www.googleapis.com/oauth2/v2/userinfo",
-                        headers={"Authorization": f"Bearer {auth_token['token']}"},
-                    )
-                    resp.raise_for_status()
-                    email = resp.json().get("email")
+                resp = await http_pool.get(
+                    "https://www.googleapis.com/oauth2/v2/userinfo",
+                    headers={"Authorization": f"Bearer {auth_token['token']}"},
+                    timeout=20,
+                )
+                resp.raise_for_status()
+                email = resp.json().get("email")
             except Exception as e:
                 logger.error(f"Failed to fetch userinfo profile: {e}")
                 email = None
@@ -210,6 +209,8 @@ async def callback(code: str, state: str):
             await db_manager.upsert_user_token(telegram_id, user_email, auth_token)
         else:
             await db_manager.create_user(telegram_id, email=user_email, auth_token=auth_token)
+        # The account may have changed: the next sync re-baselines instead of walking another mailbox's historyId
+        await db_manager.set_gmail_history_id(telegram_id, None)
 
         # Clear active RAM cache in gmail_client to enforce immediate token propagation
         try:
@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException
 from db.models import db_manager
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import httpx
 from config import settings
+from utils.http_pool import http_pool
 
 router = APIRouter()
 
@@ -92,12 +92,11 @@ async def submit_contact_form(form_data: ContactFormMessage):
                 f"*Message:*\n{form_data.message}"
             )
             url = f"https://api.telegram.org/bot{settings.BOT_TOKEN}/sendMessage"
-            async with httpx.AsyncClient(timeout=10) as client:
-                await client.post(url, json={
-                    "chat_id": owner_id,
-                    "text": notification_text,
-                    "parse_mode": "Markdown",
-                })
+            await http_pool.post(url, json={
+                "chat_id": owner_id,
+                "text": notification_text,
+                "parse_mode": "Markdown",
+            }, timeout=10)
         
         return {"success": True, "message": "Your message has been sent successfully!"}
     
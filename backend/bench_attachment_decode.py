@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import time
+import base64
+import tracemalloc
+
+# Append backend to path so imports work natively
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.streaming import Base64JsonFieldDecoder
+
+# Compares the old whole-blob attachment decode against the streaming decoder used by
+# GmailClient._stream_attachment_to_file. The attachments.get response is synthesised in
+# memory and replayed in network-sized chunks, so no Gmail account is needed.
+#
+#   python bench_attachment_decode.py [size_mb] [count]
+
+CHUNK = 256 * 1024
+
+def make_response(size_bytes: int) -> bytes:
+    raw = os.urandom(size_bytes)
+    return json.dumps({"size": size_bytes, "data": base64.urlsafe_b64encode(raw).decode("ascii")}).encode("utf-8"), raw
+
+def blob_decode(body: bytes, out_path: str):
+    # Mirrors the previous implementation: parse JSON, decode the whole string, write once
+    attachment = json.loads(body)
+    file_data = base64.urlsafe_b64decode(attachment.get("data", "").encode("utf-8"))
+    with open(out_path, "wb") as f:
+        f.write(file_data)
+
+def stream_decode(body: bytes, out_path: str):
+    decoder = Base64JsonFieldDecoder("data")
+    with open(out_path, "wb") as f:
+        view = memoryview(body)
+        for i in range(0, len(body), CHUNK):
+            data = decoder.feed(bytes(view[i:i + CHUNK]))
+            if data:
+                f.write(data)
+    decoder.close()
+    return decoder.peak_buffer
+
+def measure(label, fn, bodies, raws):
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i, body in enumerate(bodies):
+        path = f"bench_att_{i}.bin"
+        fn(body, path)
+        with open(path, "rb") as f:
+            assert f.read() == raws[i], f"{label}: decoded bytes mismatch"
+        os.remove(path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {elapsed * 1000:9.1f} ms   peak traced alloc {peak / 1024 / 1024:8.2f} MB")
+
+if __name__ == "__main__":
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print(f"      --- ATTACHMENT DECODE BENCHMARK ({count} x {size_mb:g} MB) ---")
+    pairs = [make_response(int(size_mb * 1024 * 1024)) for _ in range(count)]
+    bodies = [p[0] for p in pairs]
+    raws = [p[1] for p in pairs]
+
+    measure("blob", blob_decode, bodies, raws)
+    measure("streaming", stream_decode, bodies, raws)
@@ -0,0 +1,81 @@
+import os
+import sys
+import asyncio
+import argparse
+
+# The user will provide the .env file containing the real API keys.
+from dotenv import load_dotenv
+load_dotenv() # Load the .env file explicitly before importing config
+
+# Append backend to path so imports work natively
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot import gmail_client as gc
+from bot.gmail_client import GmailClient
+from bot.gmail_transport import RestTransport, PayloadStats
+import bot.gmail_transport as transport
+
+# Measures the response payload of each GmailClient read with and without the
+# partial-response field masks, over the REST transport so gzip wire bytes are visible.
+# Every call is made twice against the same messages: unmasked (the full resource) and
+# with the mask GmailClient now sends.
+#
+#   python bench_gmail_fields.py --telegram-id 123456789 --messages 20
+
+async def run_reads(api, msg_ids, history_id, masked):
+    def f(mask):
+        return {"fields": mask} if masked else {}
+
+    await api.list_messages(q="in:inbox", maxResults=len(msg_ids), **f(gc._LIST_FIELDS))
+    await api.batch_get_messages(msg_ids, format='metadata', metadataHeaders=['From', 'Subject'], **f(gc._METADATA_FIELDS))
+    for m_id in msg_ids:
+        await api.get_message(m_id, format='full', **f(gc._VIEW_FIELDS))
+        await api.get_message(m_id, format='full', **f(gc._MANIFEST_FIELDS))
+    await api.get_profile(**f(gc._PROFILE_FIELDS))
+    if history_id:
+        await api.list_history(startHistoryId=history_id, historyTypes=['messageAdded'], labelId='INBOX', **f(gc._HISTORY_FIELDS))
+
+async def main(args):
+    gmail = GmailClient()
+    if not await gmail.get_service(args.telegram_id):
+        print("❌ No valid Gmail credentials for this user.")
+        return
+    api = RestTransport(GmailClient._service_cache[args.telegram_id]["credentials"].token)
+
+    listing = await api.list_messages(q="in:inbox", maxResults=args.messages)
+    msg_ids = [m["id"] for m in listing.get("messages", [])]
+    if not msg_ids:
+        print("❌ Inbox is empty; nothing to measure.")
+        return
+    profile = await api.get_profile()
+    # A recent-but-valid watermark so history.list returns a few records
+    history_id = str(max(1, int(profile.get("historyId", 0)) - 200)) if profile.get("historyId") else None
+
+    reports = {}
+    for label, masked in (("full", False), ("masked", True)):
+        transport.payload_stats = PayloadStats()
+        await run_reads(api, msg_ids, history_id, masked)
+        reports[label] = transport.payload_stats.report()
+
+    print(f"      --- GMAIL PAYLOAD SIZE ({len(msg_ids)} messages) ---")
+    print(f"{'call':<20}{'full KB':>10}{'masked KB':>11}{'saved':>8}{'wire KB':>10}")
+    total_full = total_masked = 0
+    for op, row in reports["full"].items():
+        masked_row = reports["masked"].get(op, {})
+        full_b, masked_b = row["decoded_bytes"], masked_row.get("decoded_bytes", 0)
+        total_full += full_b
+        total_masked += masked_b
+        saved = 100 * (1 - masked_b / full_b) if full_b else 0.0
+        print(f"{op:<20}{full_b / 1024:10.1f}{masked_b / 1024:11.1f}{saved:7.1f}%{masked_row.get('wire_bytes', 0) / 1024:10.1f}")
+    print("")
+    print(f"decoded bytes: {total_full / 1024:.1f} KB -> {total_masked / 1024:.1f} KB "
+          f"({100 * (1 - total_masked / max(1, total_full)):.1f}% smaller)")
+    print("note: get_message is listed once but covers both the view and manifest masks.")
+
+    await RestTransport.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Gmail response sizes with and without field masks.")
+    parser.add_argument("--telegram-id", type=int, required=True, help="Telegram ID of a user with a connected Gmail account")
+    parser.add_argument("--messages", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
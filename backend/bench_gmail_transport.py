@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+# The user will provide the .env file containing the real API keys.
+from dotenv import load_dotenv
+load_dotenv() # Load the .env file explicitly before importing config
+
+# Append backend to path so imports work natively
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.gmail_client import GmailClient
+from bot.gmail_transport import DiscoveryTransport, RestTransport
+
+# Compares the two Gmail transports on a connected account: the googleapiclient discovery
+# client (httplib2 in executor threads) and the native async REST client (pooled httpx).
+# Fires bursts of concurrent messages.get calls and reports p50/p99 latency, throughput
+# and the peak number of live threads while each burst runs.
+#
+#   python bench_gmail_transport.py --telegram-id 123456789 --requests 200 --concurrency 25
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def sample_threads(stop: asyncio.Event, peak: list):
+    while not stop.is_set():
+        peak[0] = max(peak[0], threading.active_count())
+        await asyncio.sleep(0.005)
+
+async def run_burst(api, msg_ids, total, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            started = time.perf_counter()
+            try:
+                await api.get_message(msg_ids[i % len(msg_ids)], format='metadata', metadataHeaders=['From', 'Subject'])
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    stop = asyncio.Event()
+    peak = [threading.active_count()]
+    sampler = asyncio.create_task(sample_threads(stop, peak))
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(total)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    return latencies, errors, elapsed, peak[0]
+
+async def main(args):
+    gmail = GmailClient()
+    service = await gmail.get_service(args.telegram_id)
+    if not service:
+        print("❌ No valid Gmail credentials for this user.")
+        return
+    token = GmailClient._service_cache[args.telegram_id]["credentials"].token
+
+    listing = await DiscoveryTransport(service).list_messages(q="in:inbox", maxResults=50)
+    msg_ids = [m["id"] for m in listing.get("messages", [])]
+    if not msg_ids:
+        print("❌ Inbox is empty; nothing to benchmark.")
+        return
+
+    print(f"      --- GMAIL TRANSPORT BENCHMARK ({args.requests} requests, concurrency {args.concurrency}) ---")
+    print(f"{'transport':<11}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>9}{'threads':>9}{'errors':>8}")
+    for api in (DiscoveryTransport(service), RestTransport(token)):
+        await run_burst(api, msg_ids, min(args.concurrency, args.requests), args.concurrency)  # warm-up
+        latencies, errors, elapsed, peak_threads = await run_burst(api, msg_ids, args.requests, args.concurrency)
+        if not latencies:
+            print(f"{api.name:<11}{'-':>9}{'-':>9}{'-':>9}{peak_threads:>9}{errors:>8}")
+            continue
+        print(f"{api.name:<11}{percentile(latencies, 50) * 1000:9.1f}{percentile(latencies, 99) * 1000:9.1f}"
+              f"{len(latencies) / elapsed:9.1f}{peak_threads:>9}{errors:>8}")
+        print(f"           mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+    await RestTransport.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Gmail discovery vs native async REST transports.")
+    parser.add_argument("--telegram-id", type=int, required=True, help="Telegram ID of a user with a connected Gmail account")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=25)
+    asyncio.run(main(parser.parse_args()))
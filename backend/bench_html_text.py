@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import email
+import random
+import argparse
+import statistics
+
+# Append backend to path so imports work natively
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.html_text import fast_html_to_text, bs4_html_to_text
+
+# Benchmarks the HTML-to-text engines behind GmailClient._extract_body.
+# By default a corpus of marketing/newsletter-shaped bodies is generated (ESP-style table
+# layouts, MSO conditional comments, large <style> blocks, preheaders, tracking pixels,
+# entities). Point --corpus at a folder of exported .eml/.html files to run on real mail.
+#
+#   python bench_html_text.py [--corpus DIR] [--limit 8000] [--rounds 5]
+
+PRODUCTS = ["Wireless Earbuds", "Smart Watch", "Laptop Stand", "USB-C Hub", "Desk Lamp", "Backpack"]
+
+def _newsletter(blocks: int, seed: int) -> str:
+    rnd = random.Random(seed)
+    style = "\n".join(f".c{i} {{ padding: {i % 9}px; color: #{rnd.randrange(0xFFFFFF):06x}; }}" for i in range(400))
+    rows = []
+    for i in range(blocks):
+        name = rnd.choice(PRODUCTS)
+        rows.append(
+            f'<tr><td class="c{i % 400}" style="padding:12px;font-family:Arial,sans-serif;" align="left">'
+            f'<!--[if mso]><table role="presentation"><tr><td width="280"><![endif]-->'
+            f'<a href="https://click.example.com/ls/click?upn={rnd.getrandbits(64):x}&amp;u={i}" '
+            f'title="Shop &gt; {name}" data-track=\'{{"pos": {i}, "cmp": "fall>sale"}}\'>'
+            f'<img src="https://cdn.example.com/p/{i}.jpg" alt="{name}" width="280" style="display:block;border:0;"></a>'
+            f'<!--[if mso]></td></tr></table><![endif]-->'
+            f'<h3 style="margin:0;font-size:18px;">{name} &#8211; {rnd.randint(10, 70)}% off</h3>'
+            f'<p style="margin:4px 0;">Now only &pound;{rnd.randint(5, 300)}.99 &nbsp;&middot;&nbsp; '
+            f'Free delivery on orders over &euro;50 &amp; easy returns&hellip;</p>'
+            f'<span style="display:none;">&zwnj;&nbsp;&zwnj;&nbsp;</span></td></tr>'
+        )
+    return (
+        '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" '
+        '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">'
+        '<html xmlns="http://www.w3.org/1999/xhtml"><head><meta charset="utf-8">'
+        '<title>This week&#8217;s deals</title>'
+        f'<style type="text/css">{style}</style>'
+        '<script type="application/ld+json">{"@context": "http://schema.org", "@type": "EmailMessage"}</script>'
+        '</head><body style="margin:0;padding:0;">'
+        '<div style="display:none;max-height:0;overflow:hidden;">Don&#39;t miss out &mdash; prices end Sunday</div>'
+        '<table width="100%" cellpadding="0" cellspacing="0" border="0" role="presentation">'
+        + "".join(rows) +
+        '</table><p style="font-size:11px;color:#999;">&copy; 2026 Example Retail Ltd. '
+        'You received this because you subscribed. <a href="https://example.com/u?id=1&amp;t=2">Unsubscribe</a></p>'
+        '<img src="https://open.example.com/o.gif?u=123" width="1" height="1" alt="">'
+        '</body></html>'
+    )
+
+# Truncated or hostile markup: an unclosed '<' used to backtrack catastrophically in the tag
+# pattern (52 s for the first case). Each must convert within PATHOLOGICAL_BUDGET seconds.
+PATHOLOGICAL_BUDGET = 0.25
+
+def pathological_corpus():
+    return [
+        ("repeated_unclosed_tags", "<p>hi</p>" + "<a" * 1000),
+        ("unclosed_tag_long_tail", "<p>hi</p><b " + "x" * 3000),
+        ("unclosed_quotes", "<p>hi</p>" + '<a "' * 2000),
+        ("truncated_newsletter", _newsletter(40, seed=40)[:-7] + "<td class=" + "y" * 20000),
+    ]
+
+def generated_corpus():
+    # Roughly 20 KB .. 600 KB bodies, the range seen in retail and digest newsletters
+    return [(f"newsletter_{b}_blocks", _newsletter(b, seed=b)) for b in (10, 40, 120, 300, 800, 1500)]
+
+def load_corpus(path: str):
+    docs = []
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if name.endswith(".html") or name.endswith(".htm"):
+            with open(full, encoding="utf-8", errors="replace") as f:
+                docs.append((name, f.read()))
+        elif name.endswith(".eml"):
+            with open(full, "rb") as f:
+                msg = email.message_from_bytes(f.read())
+            for part in msg.walk():
+                if part.get_content_type() == "text/html":
+                    payload = part.get_payload(decode=True) or b""
+                    docs.append((name, payload.decode(part.get_content_charset() or "utf-8", errors="replace")))
+                    break
+    return docs
+
+def timed(fn, doc, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(doc)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTML-to-text engine throughput and parity benchmark.")
+    parser.add_argument("--corpus", default=None, help="Folder of .html/.eml files (default: generated newsletters)")
+    parser.add_argument("--limit", type=int, default=8000, help="Early-stop budget used by the email view")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = load_corpus(args.corpus) if args.corpus else generated_corpus()
+    print(f"      --- HTML-TO-TEXT BENCHMARK ({len(docs)} documents) ---")
+    print(f"{'document':<28}{'KB':>8}{'bs4 ms':>10}{'fast ms':>10}{'early ms':>10}  parity")
+
+    totals = {"bytes": 0, "bs4": 0.0, "fast": 0.0, "early": 0.0}
+    matches = 0
+    for name, doc in docs:
+        reference = bs4_html_to_text(doc)
+        full = fast_html_to_text(doc)
+        early = fast_html_to_text(doc, max_chars=args.limit)
+        parity = full == reference and reference.startswith(early)
+        matches += parity
+
+        t_bs4 = timed(bs4_html_to_text, doc, args.rounds)
+        t_fast = timed(fast_html_to_text, doc, args.rounds)
+        t_early = timed(lambda d: fast_html_to_text(d, max_chars=args.limit), doc, args.rounds)
+        size = len(doc.encode("utf-8"))
+        totals["bytes"] += size
+        totals["bs4"] += t_bs4
+        totals["fast"] += t_fast
+        totals["early"] += t_early
+        print(f"{name[:27]:<28}{size / 1024:8.1f}{t_bs4 * 1000:10.2f}{t_fast * 1000:10.2f}{t_early * 1000:10.2f}  {'OK' if parity else 'DIFF'}")
+
+    mb = totals["bytes"] / 1024 / 1024
+    print("")
+    for key in ("bs4", "fast", "early"):
+        print(f"{key:<6} throughput {mb / totals[key]:8.1f} MB/s")
+    print(f"output parity with BeautifulSoup: {matches}/{len(docs)}")
+
+    print("")
+    print(f"      --- PATHOLOGICAL INPUTS (budget {PATHOLOGICAL_BUDGET * 1000:.0f} ms) ---")
+    slow = 0
+    for name, doc in pathological_corpus():
+        started = time.perf_counter()
+        fast_html_to_text(doc)
+        elapsed = time.perf_counter() - started
+        slow += elapsed > PATHOLOGICAL_BUDGET
+        print(f"{name:<28}{len(doc) / 1024:8.1f} KB{elapsed * 1000:10.2f} ms  {'OK' if elapsed <= PATHOLOGICAL_BUDGET else 'SLOW'}")
+    if slow:
+        sys.exit(1)
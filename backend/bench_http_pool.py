@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+# Append backend to path so imports work natively
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.http_pool import HttpPool
+
+# Measures the connection-setup cost removed by the shared HTTP pool.
+# One simulated agent turn makes the outbound calls a typical message triggers
+# (intent router, history/summarizer sub-agents, embedding, Telegram raw send);
+# each turn is run with a fresh httpx.AsyncClient per call (the old pattern) and
+# through the pooled client. Endpoints are cheap unauthenticated GETs on the same
+# hosts, so the difference is DNS + TCP + TLS handshake time, not model latency.
+#
+#   python bench_http_pool.py [--turns 20]
+
+TURN = [
+    "https://api.groq.com/openai/v1/models",
+    "https://api.groq.com/openai/v1/models",
+    "https://generativelanguage.googleapis.com/$discovery/rest?version=v1beta",
+    "https://api.groq.com/openai/v1/models",
+    "https://api.telegram.org/",
+]
+
+async def per_call_turn(urls):
+    samples = []
+    for url in urls:
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=20.0) as client:
+            await client.get(url)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+async def pooled_turn(pool, urls):
+    samples = []
+    for url in urls:
+        started = time.perf_counter()
+        await pool.get(url, retries=0)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+async def main(args):
+    urls = args.url or TURN
+    pool = HttpPool()
+    await pooled_turn(pool, urls)  # warm the pool like a long-running process would be
+
+    results = {"per-call": [], "pooled": []}
+    for _ in range(args.turns):
+        results["per-call"].append(await per_call_turn(urls))
+        results["pooled"].append(await pooled_turn(pool, urls))
+    await pool.aclose()
+
+    print(f"      --- OUTBOUND HTTP BENCHMARK ({args.turns} turns x {len(urls)} calls) ---")
+    print(f"{'mode':<10}{'call p50 ms':>13}{'turn p50 ms':>13}{'turn mean ms':>14}")
+    turn_means = {}
+    for mode, turns in results.items():
+        calls = [s for turn in turns for s in turn]
+        totals = [sum(turn) for turn in turns]
+        turn_means[mode] = statistics.mean(totals)
+        print(f"{mode:<10}{statistics.median(calls) * 1000:13.1f}{statistics.median(totals) * 1000:13.1f}{turn_means[mode] * 1000:14.1f}")
+
+    saved = turn_means["per-call"] - turn_means["pooled"]
+    print("")
+    print(f"handshake time saved per turn: {saved * 1000:.1f} ms ({saved / len(urls) * 1000:.1f} ms per call)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-call httpx clients vs the shared HTTP pool.")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--url", action="append", help="Override the per-turn URL list (repeatable)")
+    asyncio.run(main(parser.parse_args()))
@@ -17,6 +17,7 @@ Features:
 """
 
 import asyncio
+import time
 import json
 import logging
 import re
@@ -51,6 +52,18 @@ def _sanitize_final_text(final_text: str) -> str:
     return cleaned_text
 
 
+def _visible_partial(text: str) -> str:
+    """
+    Display-safe view of a still-streaming reply: UI sentinels and control tags are removed,
+    and a trailing fragment that may be the start of one ("[SHOW_EM", "<VOI", "__SHO") is held back.
+    The complete reply still goes through _unify_agent_response / _dispatch_ai unchanged.
+    """
+    text = text.replace("__SHOW_SEARCH_LIST__", "").replace("<VOICE_REQUIRED>", "").replace("[VOICE]", "")
+    text = re.sub(r'\[SHOW_EMAIL:[^\]]*\]', '', text)
+    text = re.sub(r'(?:\[[^\]\n]*|<[^>\n]*|_{2}[A-Z_]*)$', '', text)
+    return _sanitize_final_text(text)
+
+
 def _is_quota_error(exc: Exception) -> bool:
     """
     Returns True if the exception represents an API quota / rate-limit error
@@ -79,7 +92,7 @@ import httpx
 import re
 import os
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, List
+from typing import Any, Awaitable, Callable, Dict, Optional, List
 import inspect
 import functools
 
@@ -91,6 +104,10 @@ from db.memory import memory_manager
 from db.contacts import contact_manager
 from db.models import db_manager
 from utils.embeddings import generate_embedding
+from utils.http_pool import http_pool
+from bot.intent_classifier import intent_classifier
+from bot.tool_cache import tool_cache
+from bot.summary_cache import summary_cache
 
 logger = logging.getLogger(__name__)
 
@@ -112,6 +129,28 @@ _module_pending_drafts: Dict[int, Dict[str, Any]] = {}
 _module_pending_searches: Dict[int, Dict[str, Any]] = {}
 _module_pending_schedules: Dict[int, Dict[str, Any]] = {}
 _module_last_search_results: Dict[int, str] = {}
+# user_id -> {"turn", "queries", "hits"}: the search calls of the current agent turn. Parallel calls
+# in one step run concurrently, so an empty sibling must not discard a list another call found.
+_module_turn_searches: Dict[int, Dict[str, Any]] = {}
+
+
+def _search_turn_state(user_id: int) -> Dict[str, Any]:
+    turn = tool_cache.current_turn()
+    state = _module_turn_searches.get(user_id)
+    if state is None or not turn or state["turn"] != turn:
+        state = _module_turn_searches[user_id] = {"turn": turn, "queries": [], "hits": False}
+    return state
+
+
+def _record_search_outcome(user_id: int, state: Dict[str, Any], summary: Optional[str]) -> None:
+    """Publishes one search call's outcome; "nothing found" only sticks if no sibling call found mail."""
+    if summary is not None:
+        state["hits"] = True
+        _module_pending_searches[user_id] = {"query": ", ".join(state["queries"])}
+        _module_last_search_results[user_id] = summary
+    elif not state["hits"]:
+        _module_pending_searches.pop(user_id, None)
+        _module_last_search_results[user_id] = "No emails found for previous search."
 
 
 def _get_gmail_client():
@@ -134,19 +173,13 @@ import contextvars
 
 current_telegram_id = contextvars.ContextVar("current_telegram_id")
 
-async def _summarize_content_with_groq(raw_text: str, context_type="email") -> str:
-    """
-    Modular Agent: Uses Groq (Llama 3) to compress massive raw data dumps into dense, token-light 
-    structured summaries to prevent Gemini AFC quota exhaustion.
-    """
-    if not raw_text or len(raw_text.strip()) < 300:
-        return raw_text
-        
+async def _groq_extract(raw_text: str, context_type: str, line_format: str) -> Optional[str]:
+    """One Groq extraction call; returns None on failure so callers choose their fallback."""
     prompt = (
         f"You are an elite Data Extraction Agent. Read the following raw {context_type}s. "
         "Output a highly compressed, structured list. \n"
         "CRITICAL RULE: You MUST preserve exact names, dates, times, statuses (e.g., Approved/Rejected), and links. \n"
-        "Format: [Sender/Source] | [Date] | [Subject] | [1-2 sentence dense summary retaining all critical facts].\n\n"
+        f"{line_format}\n\n"
         f"RAW DATA:\n{raw_text}"
     )
     
@@ -159,18 +192,81 @@ async def _summarize_content_with_groq(raw_text: str, context_type="email") -> s
         "max_tokens": 1500,
     }
     
-    import httpx
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            text = resp.json()["choices"][0]["message"].get("content", "").strip()
-            logger.info(f"Groq extracted data from {len(raw_text)} chars of raw text successfully.")
-            return text if text else raw_text[:500] + "... [Data truncated]"
+        resp = await http_pool.post(url, headers=headers, json=payload, timeout=15.0)
+        resp.raise_for_status()
+        text = resp.json()["choices"][0]["message"].get("content", "").strip()
+        logger.info(f"Groq extracted data from {len(raw_text)} chars of raw text successfully.")
+        return text or None
     except Exception as e:
         logger.error(f"Groq summarization failed: {e}")
-        # Graceful fallback: return sliced text
-        return raw_text[:500] + "... [Data truncated to prevent quota exhaustion]"
+        return None
+
+async def _summarize_content_with_groq(raw_text: str, context_type="email") -> str:
+    """
+    Modular Agent: Uses Groq (Llama 3) to compress massive raw data dumps into dense, token-light 
+    structured summaries to prevent Gemini AFC quota exhaustion.
+    """
+    if not raw_text or len(raw_text.strip()) < 300:
+        return raw_text
+
+    text = await _groq_extract(raw_text, context_type,
+                               "Format: [Sender/Source] | [Date] | [Subject] | [1-2 sentence dense summary retaining all critical facts].")
+    # Graceful fallback: return sliced text
+    return text if text else raw_text[:500] + "... [Data truncated to prevent quota exhaustion]"
+
+def _fallback_email_line(email: Dict[str, Any]) -> str:
+    return (f"{email.get('Message ID', '')} | {email.get('Sender Name & Email', '')} | {email.get('Date', '')} | "
+            f"{email.get('Subject', '')} | {email.get('Snippet', '') or email.get('body', '')[:160]}")
+
+async def _summarize_search_results(emails: List[Dict[str, Any]]) -> str:
+    """
+    _summarize_content_with_groq for search results, backed by summary_cache: an identical
+    result set is served whole, otherwise only emails without a cached line (new or changed
+    content) are sent to Groq, and the lines are merged back in result order.
+    """
+    raw_json = json.dumps(emails)
+    if len(raw_json.strip()) < 300:
+        return raw_json
+
+    keys = [summary_cache.item_key(e) for e in emails]
+    set_key = summary_cache.set_key(keys)
+    cached_set = summary_cache.get_set(set_key)
+    if cached_set is not None:
+        return cached_set
+
+    lines = summary_cache.get_items(keys)
+    delta = [(k, e) for k, e in zip(keys, emails) if k not in lines]
+    if delta:
+        summary_cache.items_summarized += len(delta)
+        summary_cache.groq_calls += 1
+        text = await _groq_extract(json.dumps([e for _, e in delta]), "email",
+                                   "Format: exactly one line per email: [Message ID] | [Sender/Source] | [Date] | [Subject] | "
+                                   "[1-2 sentence dense summary retaining all critical facts].")
+        fresh: Dict[str, str] = {}
+        by_id = {e["Message ID"]: k for k, e in delta if e.get("Message ID")}
+        for line in (text or "").splitlines():
+            line = line.strip().lstrip("-*• ").strip()
+            # Only a line whose leading field is exactly a requested ID is attributed; an ID
+            # quoted inside another email's summary must not pin that text to the wrong message
+            head, sep, _ = line.partition("|")
+            k = by_id.get(head.strip().strip("[]`*\"'").strip()) if sep else None
+            if k and k not in fresh:
+                fresh[k] = line
+        summary_cache.put_items(fresh)
+        lines.update(fresh)
+        # Emails the model skipped or merged (or all of them, if Groq failed) keep a deterministic line
+        for k, e in delta:
+            lines.setdefault(k, _fallback_email_line(e))
+        if len(fresh) < len(delta):
+            # Do not pin fallback lines in the set cache; the next identical search retries them
+            return "\n".join(lines[k] for k in keys)
+    else:
+        summary_cache.groq_calls_saved += 1
+
+    summary = "\n".join(lines[k] for k in keys)
+    summary_cache.put_set(set_key, summary)
+    return summary
 
 async def parse_timezone_with_groq(location_text: str) -> str:
     """
@@ -197,13 +293,11 @@ async def parse_timezone_with_groq(location_text: str) -> str:
         "max_tokens": 10
     }
     
-    import httpx
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            text = resp.json()["choices"][0]["message"].get("content", "").strip()
-            return text if text != "UNKNOWN" else ""
+        resp = await http_pool.post(url, headers=headers, json=payload, timeout=10.0)
+        resp.raise_for_status()
+        text = resp.json()["choices"][0]["message"].get("content", "").strip()
+        return text if text != "UNKNOWN" else ""
     except Exception as e:
         logger.error(f"Groq Timezone API Error: {e}")
         return ""
@@ -242,20 +336,35 @@ async def search_gmail_tool(query: list[str], max_results: int = 10) -> str:
         
         queries = list(expanded_queries)
         logger.info(f"[Tool Execution] Searching Gmail for user {user_id} with queries: {queries}")
-        _module_pending_searches[user_id] = {"query": ", ".join(queries)}
-        
+        # Parallel search calls in one agent step share the turn's pending list query
+        search_turn = _search_turn_state(user_id)
+        search_turn["queries"].extend(queries)
+        _module_pending_searches[user_id] = {"query": ", ".join(search_turn["queries"])}
+
+        # Same search within the TTL (model retry, follow-up, Retry button): replay its outcome
+        cache_args = {"queries": sorted(queries), "max_results": int(max_results)}
+        cached = tool_cache.get(user_id, "search_gmail_tool", cache_args)
+        if cached is not None:
+            _record_search_outcome(user_id, search_turn, None if cached["empty"] else cached["result"])
+            return cached["result"]
+
         gmail = _get_gmail_client()
         all_results = {}
         
         import asyncio
-        from utils.embeddings import generate_embedding
+        from utils.embeddings import generate_embeddings
         from db.memory import memory_manager
         
         # 1. RAG Vector Search (Database Cache)
+        # All keywords are embedded in one cached batch call; repeated keywords never hit the API again
         rag_found = False
-        for q in queries:
+        try:
+            query_embeddings = await generate_embeddings(queries)
+        except Exception as e:
+            logger.error(f"RAG embedding failed in tool: {e}")
+            query_embeddings = [None] * len(queries)
+        for q, emb in zip(queries, query_embeddings):
             try:
-                emb = await generate_embedding(q)
                 if emb:
                     semantic_matches = await memory_manager.semantic_search_emails(user_id, emb, match_threshold=0.6, limit=int(max_results))
                     for email in semantic_matches:
@@ -276,22 +385,49 @@ async def search_gmail_tool(query: list[str], max_results: int = 10) -> str:
             except Exception as e:
                 logger.error(f"RAG search failed in tool: {e}")
 
-        # 2. Live Gmail API Fallback (Only if RAG missed or we need more)
+        # 2. Live Gmail API Fallback (Only if RAG missed), alongside
+        # 2b. the local mail store (FTS over sender/subject/snippet of already-synced mail).
+        # The store mirrors only synced mail, so its hits supplement the live search, never replace it;
+        # only plain keyword queries go there, Gmail operators (from:, newer_than:, ...) need the live API.
         if not rag_found:
+            from db.mailstore import mail_store
             logger.info("[Tool Execution] RAG missed, falling back to Live Gmail API")
-            tasks = [gmail.search_emails(user_id, q, max_results=int(max_results)) for q in queries]
-            results_list = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for res in results_list:
-                if isinstance(res, list):
-                    for email in res:
-                        if isinstance(email, dict) and "id" in email:
-                            all_results[email["id"]] = email
+            keyword_queries = [q for q in queries if ":" not in q]
+            local_search = asyncio.gather(*[mail_store.search(user_id, q, limit=int(max_results)) for q in keyword_queries])
+            # IDs are de-duplicated across queries before any detail fetch, then fetched in parallel
+            try:
+                res = await gmail.search_emails_multi(user_id, queries, max_results=int(max_results))
+            finally:
+                local_hits = await local_search
+            if isinstance(res, list):
+                for email in res:
+                    if isinstance(email, dict) and "id" in email:
+                        all_results[email["id"]] = email
+            # Live results (with bodies) take precedence; local hits fill in what the live search did not return
+            extra = 0
+            for row in (r for hits in local_hits for r in hits):
+                if row["id"] in all_results:
+                    continue
+                extra += 1
+                all_results[row["id"]] = {
+                    "id": row["id"],
+                    "threadId": row["threadId"],
+                    "sender": row["sender"],
+                    "subject": row["subject"],
+                    "date": datetime.fromtimestamp(row["internal_date"] / 1000, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+                            if row["internal_date"] else "",
+                    "snippet": row["snippet"],
+                    "has_attachment": bool(row["attachments"]),
+                    "body": "",  # the store keeps no bodies; the snippet travels in its own field
+                }
+            if extra:
+                logger.info(f"[Tool Execution] {extra} additional matches from the local mail store")
                         
         if not all_results:
-            _module_pending_searches.pop(user_id, None)
-            _module_last_search_results[user_id] = "No emails found for previous search."
-            return json.dumps({"status": "empty", "tried": queries})
+            _record_search_outcome(user_id, search_turn, None)
+            result = json.dumps({"status": "empty", "tried": queries})
+            tool_cache.put(user_id, "search_gmail_tool", cache_args, {"result": result, "empty": True}, empty=True)
+            return result
 
         # Truncate email bodies aggressively to prevent TPM exhaustion.
         optimized_results = []
@@ -313,12 +449,12 @@ async def search_gmail_tool(query: list[str], max_results: int = 10) -> str:
             }
             optimized_results.append(opt_email)
             
-        opt_json = json.dumps(optimized_results)
         
-        # Intercept and summarize to prevent Gemini AFC Context Bloat
-        compressed_summary = await _summarize_content_with_groq(opt_json, context_type="email")
+        # Intercept and summarize to prevent Gemini AFC Context Bloat (cached per email / result set)
+        compressed_summary = await _summarize_search_results(optimized_results)
         
-        _module_last_search_results[user_id] = compressed_summary
+        _record_search_outcome(user_id, search_turn, compressed_summary)
+        tool_cache.put(user_id, "search_gmail_tool", cache_args, {"result": compressed_summary, "empty": False})
         return compressed_summary
     
     except KeyError as e:
@@ -447,6 +583,7 @@ async def save_contact_tool(name: str, email: str) -> str:
                 "email_address": clean_email,
                 "contact_name": clean_name
             }, on_conflict="telegram_id,email_address").execute())
+            tool_cache.invalidate_user(safe_uid, "save_contact_tool")
             return json.dumps({"status": "success", "message": f"Contact '{clean_name}' with email '{clean_email}' saved successfully."})
         except Exception as e:
             logger.error(f"Failed to upsert contact via Tool call: {e}")
@@ -518,6 +655,102 @@ async def summarize_long_thread_tool(thread_id: str) -> str:
     return json.dumps({"status": "not_implemented", "message": "Thread summarization is currently a stub."})
 
 
+# ==========================================
+# COMPILED AGENT PROMPT / CONFIG
+# ==========================================
+# Everything that does not depend on the user or the turn is built once at import.
+# The directives come first and the per-user session block last, so consecutive turns
+# share a byte-identical system-instruction prefix (eligible for Gemini implicit
+# context caching); only the session block is rendered per turn.
+
+AGENT_TOOLS = {
+    "search_gmail_tool": search_gmail_tool,
+    "prepare_email_draft_tool": prepare_email_draft_tool,
+    "schedule_email_tool": schedule_email_tool,
+    "save_contact_tool": save_contact_tool,
+    "trash_email_tool": trash_email_tool,
+    "untrash_email_tool": untrash_email_tool,
+    "parse_attachment_tool": parse_attachment_tool,
+    "summarize_long_thread_tool": summarize_long_thread_tool,
+}
+
+# Safety settings — OFF for email content (may contain flagged words)
+_SAFETY_OFF = [
+    types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",  threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",          threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",         threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",   threshold="OFF"),
+    types.SafetySetting(category="HARM_CATEGORY_CIVIC_INTEGRITY",     threshold="OFF"),
+]
+
+# SDK AFC is off: function calls are executed (in parallel) by AIEngine._agent_loop
+_AFC_CONFIG = types.AutomaticFunctionCallingConfig(disable=True)
+_NO_TOOL_CALLS = types.ToolConfig(function_calling_config=types.FunctionCallingConfig(mode="NONE"))
+
+_AGENT_BASE_CONFIG = types.GenerateContentConfig(
+    tools=list(AGENT_TOOLS.values()),
+    automatic_function_calling=_AFC_CONFIG,
+    temperature=0.2,
+    safety_settings=_SAFETY_OFF,
+)
+
+_STATIC_INSTRUCTIONS = (
+    "You are a complete, highly capable agentic alternative to the Gmail web interface. You confidently act as the user's primary email client and manager. Do not claim to be just an assistant.\n"
+    "NEVER speak as a conversational middleman (avoid phrases like 'The sender is saying...', 'This email states...', 'The email is about...').\n"
+    "Act strictly as a clean native dashboard presentation layer. Serve direct data and complete tasks natively, without conversational introductions.\n"
+    "NEVER say 'As an AI' or 'I cannot access'. You already have full Gmail access via tools. Act immediately.\n\n"
+
+    "LANGUAGE ENFORCEMENT: You must strictly maintain a Professional English persona at all times. The script the user is currently writing in is given under SESSION CONTEXT. ONLY respond in Urdu, Roman Urdu, or any other regional language IF the user explicitly demands it in their current message. Otherwise, default to clear, professional English.\n"
+    "Always output markdown format.\n"
+    "If the user explicitly asks for an audio/voice reply, OR if you are providing a long readable response (e.g., an email summary), you MUST output the literal tag <VOICE_REQUIRED> somewhere in your message. This triggers the backend TTS system. The VOICE TAG rule under SESSION CONTEXT decides whether '[VOICE]' is appended.\n\n"
+
+    "DIRECTIVES (follow strictly, no preambles, call tools immediately):\n"
+    "Rule A (Mandatory Search for Queries): If the user asks ANY question about whether an email arrived, what an email says, or requests a summary (e.g., 'Did I get an email?', 'Exam schedule aa gaya?', 'Check my email'), you MUST invoke the search_gmail_tool FIRST to fetch the data. NEVER answer conversationally without querying the data first.\n"
+    "Rule B (UI Card Rendering): If emails ARE found, or the user explicitly asks to 'show', 'list', 'view', or 'open' emails, output the exact string __SHOW_SEARCH_LIST__ at the end of your response to trigger the native UI dashboard cards. However, if a search returns 'No results', do NOT output this string.\n"
+    "Rule C (Broad Search Strategy): NEVER use complex restrictive operators like `label:INBOX` unless explicitly requested. Always prefer broad, simple 1-2 word keywords (e.g., just 'fyp') and let the backend do the semantic filtering from the larger result pool. Do not append operators unnecessarily.\n"
+    "Rule D (Parallel Hypothesis Testing): Whenever there is slight doubt, ambiguity, or potential for missing emails, you should freely generate multiple parallel search queries in the array (e.g., both broad `exam` and narrow `subject:\"final exam schedule\"`). Do not force parallel searching for simple, explicit requests.\n"
+    "Rule E (Natural Language on Misses & Confirmations): If a tool returns 'No results', you MUST respond in a natural, conversational manner explaining that nothing was found (e.g., 'I couldn't find any emails about that'). Do not dump raw tool output. Conversely, after successful task executions (e.g., saving a draft), provide a natural confirmation while still ensuring UI triggers are appended if applicable.\n"
+    "Rule F (Result Limit Enforcement): If the user asks for a specific number of emails (e.g., 'last 7 emails'), you MUST map that exact number to the `max_results` integer parameter in the search tool.\n"
+    "5. DRAFT/SEND/REPLY: User asks to write/send/reply → call prepare_email_draft_tool immediately. Never write draft as plain text.\n"
+    "6. SCHEDULE: User asks to schedule an email → call schedule_email_tool immediately.\n"
+    "7. TRASH/DELETE: User asks to delete, trash, or remove an email → call trash_email_tool using the target message ID.\n"
+    "8. UNTRASH/RESTORE: User asks to restore, undo delete, or untrash an email → call untrash_email_tool.\n"
+    "9. RECIPIENT UNKNOWN: If you don't know the recipient's email → use '[Specify Recipient Email]' as to_email. Never guess.\n"
+    "10. SHOW EMAIL: To show a specific email from results, include [SHOW_EMAIL:<message_id>] in your response.\n"
+    "11. READ FULL HTML: The email detail card includes a 'Read Full' button allowing users to download the email as an interactive HTML document.\n"
+    "12. DRAFT FORMATTING: Always prioritize any explicit formatting instructions provided in the user's current prompt. If the user does not specify a format, strictly fall back to the Draft Style given under SESSION CONTEXT.\n"
+    "Never output raw JSON, function names, or code in your text response.\n\n"
+)
+
+_SESSION_TEMPLATE = (
+    "SESSION CONTEXT\n"
+    "User is currently writing in: {detected_script}\n"
+    "User Voice Preference: '{voice_preference}'\n"
+    "{voice_instruction}"
+    "Draft Style: {draft_style}\n"
+    "UTC Time: {utc_now}\n"
+    "Address Book:{contacts}\n"
+    "Memory Context:{memory}\n"
+    "Semantic Search Matches (Cached Emails):{semantic}\n"
+    "[SHORT-TERM SEARCH MEMORY]\nRecently fetched emails in context:\n{recent_search}\n"
+)
+
+
+def compile_tool_declarations(client: Any) -> List[Any]:
+    """
+    Introspects the agent tool callables into FunctionDeclarations once. The SDK otherwise
+    repeats this signature/docstring conversion for every request that carries callables.
+    """
+    return [types.FunctionDeclaration.from_callable(client=client, callable=fn) for fn in AGENT_TOOLS.values()]
+
+
+def render_agent_config(base_config: Any, session: Dict[str, str]) -> Any:
+    """Per-turn GenerateContentConfig: the compiled base config plus the rendered session block."""
+    return base_config.model_copy(update={
+        "system_instruction": _STATIC_INSTRUCTIONS + _SESSION_TEMPLATE.format(**session),
+    })
+
+
 # ==========================================
 # AI ENGINE CLASS
 # ==========================================
@@ -539,6 +772,31 @@ class AIEngine:
         # Multi-user conversation history cache for persistent stateful chat sessions
         self.active_chats: Dict[int, List[types.Content]] = {}
 
+        # source -> {"calls", "total_ms", "max_ms", "timeouts", "errors"} for the context-assembly stage
+        self.context_timings: Dict[str, Dict[str, float]] = {}
+        # Speculative context prefetch alongside the Groq router (hit = intent was EMAIL_ACTION)
+        self.speculation: Dict[str, float] = {"started": 0, "hits": 0, "wasted": 0, "wasted_completed": 0,
+                                              "hidden_ms": 0.0, "residual_wait_ms": 0.0}
+        # Gemini reply latency: time to first visible partial (streamed turns) and to the full reply
+        self.reply_latency: Dict[str, float] = {"streamed": 0, "first_token_ms": 0.0, "streamed_total_ms": 0.0,
+                                                "buffered": 0, "buffered_total_ms": 0.0, "partials": 0}
+        # Prompt tokens vs tokens served from Gemini's context cache (static instruction prefix)
+        self.prompt_cache: Dict[str, int] = {"turns": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        try:
+            self.tool_declarations = compile_tool_declarations(self.client)
+        except Exception as e:
+            logger.warning(f"Could not precompile agent tool declarations: {e}")
+            self.tool_declarations = []
+        # Precompiled declarations when available; otherwise the SDK converts the callables per request
+        self.agent_config = (
+            _AGENT_BASE_CONFIG.model_copy(update={"tools": [types.Tool(function_declarations=self.tool_declarations)]})
+            if self.tool_declarations else _AGENT_BASE_CONFIG
+        )
+        # tool -> {"calls", "total_ms", "max_ms", "timeouts", "errors"} for the manual function-calling loop
+        self.tool_timings: Dict[str, Dict[str, float]] = {}
+        self.tool_loop: Dict[str, float] = {"steps": 0, "batches": 0, "max_parallel": 0, "batch_ms": 0.0,
+                                            "budget_exhausted": 0, "deadline_hits": 0}
+
     # ==========================================
     # SCRIPT / LANGUAGE DETECTION
     # ==========================================
@@ -584,6 +842,14 @@ class AIEngine:
     # GROQ GATEKEEPER / INTENT ROUTER
     # ==========================================
 
+    def _last_model_text(self, telegram_id: int) -> Optional[str]:
+        """Text of the assistant's most recent turn, or None."""
+        for turn in reversed(self.active_chats.get(telegram_id, [])):
+            if getattr(turn, 'role', '') == "model":
+                parts = getattr(turn, 'parts', None) or []
+                return "".join(getattr(p, 'text', None) or "" for p in parts) or None
+        return None
+
     async def _groq_intent_router(self, message: str, telegram_id: int, voice_preference: str = "text") -> dict:
         """
         Orchestrator Gatekeeper. Analyzes intent and returns STRICT JSON.
@@ -630,14 +896,13 @@ class AIEngine:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                if response.status_code == 429:
-                    return {"intent": "__GROQ_QUOTA_ERROR__"}
-                response.raise_for_status()
-                data = response.json()
-                content = data["choices"][0]["message"]["content"].strip()
-                return json.loads(content)
+            response = await http_pool.post(url, headers=headers, json=payload, timeout=15.0)
+            if response.status_code == 429:
+                return {"intent": "__GROQ_QUOTA_ERROR__"}
+            response.raise_for_status()
+            data = response.json()
+            content = data["choices"][0]["message"]["content"].strip()
+            return json.loads(content)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:
                 return {"intent": "__GROQ_QUOTA_ERROR__"}
@@ -683,10 +948,9 @@ class AIEngine:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                return response.json()["choices"][0]["message"]["content"].strip()
+            response = await http_pool.post(url, headers=headers, json=payload, timeout=15.0)
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"].strip()
         except Exception as e:
             logger.error(f"History Recall Sub-Agent failed: {e}")
             return "I apologize, but I couldn't access my recent memory right now."
@@ -741,8 +1005,293 @@ class AIEngine:
         )
         return resolved_text
 
-    async def agent_chat(self, message: str, telegram_id: int, voice_preference: str = "text") -> str:
+    async def _semantic_matches(self, telegram_id: int, message: str) -> List[Dict[str, Any]]:
+        query_embed = await generate_embedding(message)
+        if not query_embed:
+            return []
+        # Fetch top 3 semantically relevant cached emails
+        return await memory_manager.semantic_search_emails(telegram_id, query_embed, match_threshold=0.6, limit=3)
+
+    async def _assemble_context(self, telegram_id: int, message: str) -> Dict[str, Any]:
+        """
+        Context-assembly stage for the Gemini turn. Every source runs concurrently under its own
+        deadline; a slow or failing source degrades to None (an empty prompt section) instead of
+        stalling the turn. Per-source latency and timeouts are accumulated in self.context_timings.
+        """
+        sources = {
+            "contacts": (contact_manager.get_user_contacts(telegram_id), settings.CONTEXT_SOURCE_TIMEOUT),
+            "memory":   (memory_manager.build_memory_prompt(telegram_id), settings.CONTEXT_SOURCE_TIMEOUT),
+            "user":     (db_manager.get_user(telegram_id), settings.CONTEXT_PROFILE_TIMEOUT),
+            "prefs":    (db_manager.get_user_preferences(telegram_id), settings.CONTEXT_PROFILE_TIMEOUT),
+            "semantic": (self._semantic_matches(telegram_id, message), settings.CONTEXT_SEMANTIC_TIMEOUT),
+        }
+
+        def _record(name: str, started: float, outcome: str) -> None:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            timing = self.context_timings.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0, "errors": 0})
+            timing["calls"] += 1
+            timing["total_ms"] += elapsed_ms
+            timing["max_ms"] = max(timing["max_ms"], elapsed_ms)
+            if outcome == "timeout":
+                timing["timeouts"] += 1
+            elif outcome == "error":
+                timing["errors"] += 1
+
+        async def _run(name: str, coro, deadline: float):
+            # A cancelled source (speculative prefetch discarded) propagates and records no sample
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(coro, timeout=deadline)
+            except asyncio.TimeoutError:
+                _record(name, started, "timeout")
+                logger.warning(f"Context source '{name}' exceeded {deadline}s for user {telegram_id}; continuing without it.")
+                return None
+            except Exception as e:
+                _record(name, started, "error")
+                logger.error(f"Context source '{name}' failed for user {telegram_id}: {e}")
+                return None
+            _record(name, started, "ok")
+            return result
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*[_run(name, coro, deadline) for name, (coro, deadline) in sources.items()])
+        logger.debug(f"Context assembled for user {telegram_id} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return dict(zip(sources.keys(), results))
+
+    def speculation_stats(self) -> Dict[str, float]:
+        s = self.speculation
+        return {
+            "started": s["started"],
+            "hits": s["hits"],
+            "wasted": s["wasted"],
+            "wasted_completed": s["wasted_completed"],
+            "hit_rate": round(s["hits"] / s["started"], 3) if s["started"] else 0.0,
+            "avg_hidden_ms": round(s["hidden_ms"] / s["hits"], 1) if s["hits"] else 0.0,
+            "avg_residual_wait_ms": round(s["residual_wait_ms"] / s["hits"], 1) if s["hits"] else 0.0,
+        }
+
+    def _record_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        self.prompt_cache["turns"] += 1
+        self.prompt_cache["prompt_tokens"] += usage.prompt_token_count or 0
+        self.prompt_cache["cached_tokens"] += getattr(usage, "cached_content_token_count", None) or 0
+
+    def prompt_cache_stats(self) -> Dict[str, float]:
+        c = self.prompt_cache
+        return {
+            **c,
+            "cached_ratio": round(c["cached_tokens"] / c["prompt_tokens"], 3) if c["prompt_tokens"] else 0.0,
+            "tool_declarations": len(self.tool_declarations),
+        }
+
+    def reply_latency_stats(self) -> Dict[str, float]:
+        r = self.reply_latency
+        return {
+            "streamed_turns": r["streamed"],
+            "avg_first_token_ms": round(r["first_token_ms"] / r["streamed"], 1) if r["streamed"] else 0.0,
+            "avg_streamed_total_ms": round(r["streamed_total_ms"] / r["streamed"], 1) if r["streamed"] else 0.0,
+            "avg_partials_per_turn": round(r["partials"] / r["streamed"], 1) if r["streamed"] else 0.0,
+            "buffered_turns": r["buffered"],
+            "avg_buffered_total_ms": round(r["buffered_total_ms"] / r["buffered"], 1) if r["buffered"] else 0.0,
+        }
+
+    def tool_stats(self) -> Dict[str, Any]:
+        loop = self.tool_loop
+        serial_ms = sum(t["total_ms"] for t in self.tool_timings.values())
+        return {
+            "model_steps": loop["steps"],
+            "tool_batches": loop["batches"],
+            "max_parallel": loop["max_parallel"],
+            # Sum of individual tool latencies minus batch wall time: what sequential AFC would have added
+            "parallel_saved_ms": round(max(0.0, serial_ms - loop["batch_ms"]), 1),
+            "budget_exhausted": loop["budget_exhausted"],
+            "deadline_hits": loop["deadline_hits"],
+            "tools": {
+                name: {
+                    "calls": t["calls"],
+                    "avg_ms": round(t["total_ms"] / t["calls"], 1) if t["calls"] else 0.0,
+                    "max_ms": round(t["max_ms"], 1),
+                    "timeouts": t["timeouts"],
+                    "errors": t["errors"],
+                }
+                for name, t in self.tool_timings.items()
+            },
+        }
+
+    def context_stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "calls": t["calls"],
+                "avg_ms": round(t["total_ms"] / t["calls"], 1) if t["calls"] else 0.0,
+                "max_ms": round(t["max_ms"], 1),
+                "timeouts": t["timeouts"],
+                "errors": t["errors"],
+            }
+            for name, t in self.context_timings.items()
+        }
+
+    async def _model_step(self, telegram_id: int, contents: List[Any], config: Any,
+                          on_partial: Optional[Callable[[str], Awaitable[None]]], stream_state: Dict[str, Any]):
+        """
+        One Gemini round trip. Returns (model parts, text, function calls). When on_partial is
+        set the step is streamed and its accumulated, display-safe text is handed to on_partial
+        as it grows; partials stop once a tool has queued a search list, draft or schedule,
+        since that turn ends in a UI card.
+        """
+        if on_partial is None:
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=contents,
+                config=config,
+            )
+            self._record_usage(response.usage_metadata)
+            candidate = response.candidates[0] if response.candidates else None
+            parts = list(candidate.content.parts or []) if candidate and candidate.content else []
+            return parts, "".join(p.text for p in parts if p.text and not p.thought), list(response.function_calls or [])
+
+        parts: List[Any] = []
+        chunks: List[str] = []
+        calls: List[Any] = []
+        usage = None
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=contents,
+            config=config,
+        )
+        async for chunk in stream:
+            usage = chunk.usage_metadata or usage
+            candidate = chunk.candidates[0] if chunk.candidates else None
+            chunk_parts = list(candidate.content.parts or []) if candidate and candidate.content else []
+            parts.extend(chunk_parts)
+            calls.extend(p.function_call for p in chunk_parts if p.function_call)
+            piece = "".join(p.text for p in chunk_parts if p.text and not p.thought)
+            if not piece:
+                continue
+            chunks.append(piece)
+            if (telegram_id in _module_pending_searches or telegram_id in _module_pending_drafts
+                    or telegram_id in _module_pending_schedules):
+                continue
+            visible = _visible_partial("".join(chunks))
+            if not visible or visible == stream_state.get("shown"):
+                continue
+            stream_state["shown"] = visible
+            # stamped before the Telegram edit so first_token_ms measures the model, not the Bot API round trip
+            stream_state.setdefault("first_token_at", time.perf_counter())
+            try:
+                await on_partial(visible)
+            except Exception as e:
+                logger.debug(f"Partial reply callback failed for user {telegram_id}: {e}")
+            self.reply_latency["partials"] += 1
+        self._record_usage(usage)
+        return parts, "".join(chunks), calls
+
+    async def _invoke_tool(self, call: Any, deadline: float) -> Dict[str, Any]:
+        """Runs one model-requested tool under the per-tool timeout and the turn deadline."""
+        name = call.name or ""
+        fn = AGENT_TOOLS.get(name)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            if fn is None:
+                outcome = "error"
+                return {"error": f"Unknown tool '{name}'."}
+            args = dict(call.args or {})
+            # JSON numbers arrive as floats; restore int parameters (e.g. max_results)
+            for param, spec in inspect.signature(fn).parameters.items():
+                if spec.annotation is int and isinstance(args.get(param), float):
+                    args[param] = int(args[param])
+            timeout = min(settings.AGENT_TOOL_TIMEOUT, max(0.0, deadline - time.perf_counter()))
+            return {"result": await asyncio.wait_for(fn(**args), timeout=timeout)}
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            logger.warning(f"Tool {name} timed out")
+            return {"error": "TOOL TIMED OUT. Answer with the information already available."}
+        except Exception as e:
+            outcome = "error"
+            logger.error(f"Tool {name} failed: {e}", exc_info=True)
+            return {"error": f"TOOL EXECUTION FAILED: {str(e)}. Please check arguments and retry."}
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            timing = self.tool_timings.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0, "errors": 0})
+            timing["calls"] += 1
+            timing["total_ms"] += elapsed_ms
+            timing["max_ms"] = max(timing["max_ms"], elapsed_ms)
+            if outcome == "timeout":
+                timing["timeouts"] += 1
+            elif outcome == "error":
+                timing["errors"] += 1
+
+    async def _agent_loop(self, telegram_id: int, contents: List[Any], config: Any,
+                          on_partial: Optional[Callable[[str], Awaitable[None]]], turn_started: float) -> str:
+        """
+        Manual function-calling loop (replaces SDK AFC). Every function call the model emits in
+        one step is executed concurrently, so Rule D's parallel search hypotheses cost one tool
+        latency instead of N. The turn is bounded by AGENT_MAX_MODEL_STEPS round trips,
+        AGENT_TOOL_BUDGET tool executions and the AGENT_TURN_DEADLINE wall clock; when a bound
+        is hit the model gets one tool-less step to answer from what it already has.
+        """
+        deadline = turn_started + settings.AGENT_TURN_DEADLINE
+        contents = list(contents)
+        stream_state: Dict[str, Any] = {}
+        budget = settings.AGENT_TOOL_BUDGET
+        text = ""
+        step_config = config
+        for step in range(settings.AGENT_MAX_MODEL_STEPS + 1):
+            self.tool_loop["steps"] += 1
+            parts, text, calls = await self._model_step(telegram_id, contents, step_config, on_partial, stream_state)
+            if not calls:
+                break
+            if step_config is not config:
+                # Tool-less final step still asked for tools: its text is a preamble, not an answer
+                text = ""
+                break
+
+            contents.append(types.Content(role="model", parts=parts))
+            runnable, refused = calls[:budget], calls[budget:]
+            budget -= len(runnable)
+            batch_started = time.perf_counter()
+            results = await asyncio.gather(*[self._invoke_tool(call, deadline) for call in runnable])
+            batch_ms = (time.perf_counter() - batch_started) * 1000
+            results += [{"error": "TOOL BUDGET EXHAUSTED for this turn. Answer with the information already available."}] * len(refused)
+
+            self.tool_loop["batches"] += 1
+            self.tool_loop["max_parallel"] = max(self.tool_loop["max_parallel"], len(runnable))
+            self.tool_loop["batch_ms"] += batch_ms
+            if refused:
+                self.tool_loop["budget_exhausted"] += 1
+
+            contents.append(types.Content(role="user", parts=[
+                types.Part.from_function_response(name=call.name or "", response=result)
+                for call, result in zip(calls, results)
+            ]))
+
+            out_of_time = time.perf_counter() >= deadline
+            if out_of_time:
+                self.tool_loop["deadline_hits"] += 1
+            if out_of_time or budget <= 0 or step + 1 >= settings.AGENT_MAX_MODEL_STEPS:
+                # Final step with function calling switched off: answer from the results it has
+                step_config = config.model_copy(update={"tool_config": _NO_TOOL_CALLS})
+
+        if on_partial is not None:
+            now = time.perf_counter()
+            self.reply_latency["streamed"] += 1
+            self.reply_latency["first_token_ms"] += (stream_state.get("first_token_at", now) - turn_started) * 1000
+            self.reply_latency["streamed_total_ms"] += (now - turn_started) * 1000
+        else:
+            self.reply_latency["buffered"] += 1
+            self.reply_latency["buffered_total_ms"] += (time.perf_counter() - turn_started) * 1000
+        return text
+
+    async def agent_chat(self, message: str, telegram_id: int, voice_preference: str = "text",
+                         on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        on_partial, when given (and GEMINI_STREAMING is on), receives the growing display-safe
+        text of the Gemini reply while it streams; the return value is unchanged either way.
+        """
         current_telegram_id.set(telegram_id)
+        tool_cache.begin_turn()
+        turn_started = time.perf_counter()
         
         # Fast HITL (Human In The Loop) Interceptors
         # Check if user is confirming or modifying a pending draft Email Assistant.
@@ -760,10 +1309,36 @@ class AIEngine:
             )
 
         try:
-            # 🚀 1. GROQ GATEKEEPER ROUTING 🚀
-            route = await self._groq_intent_router(message, telegram_id, voice_preference)
+            # 🚀 1. GATEKEEPER ROUTING: local pre-classifier first, Groq only when it is unsure 🚀
+            route = (intent_classifier.classify(message, self._last_model_text(telegram_id))
+                     if settings.INTENT_PRECLASSIFIER_ENABLED else None)
+            prefetch = None
+            if route is None:
+                # Speculatively assemble the EMAIL_ACTION context while Groq decides the intent
+                router_started = time.perf_counter()
+                if settings.SPECULATIVE_CONTEXT_PREFETCH and settings.GROQ_API_KEY:
+                    prefetch = asyncio.create_task(self._assemble_context(telegram_id, message))
+                    prefetch_done: Dict[str, float] = {}
+                    prefetch.add_done_callback(lambda _t: prefetch_done.setdefault("at", time.perf_counter()))
+                    self.speculation["started"] += 1
+                try:
+                    route = await self._groq_intent_router(message, telegram_id, voice_preference)
+                except BaseException:
+                    if prefetch:
+                        prefetch.cancel()
+                    raise
+                router_ms = (time.perf_counter() - router_started) * 1000
             intent = route.get("intent", "EMAIL_ACTION")
 
+            # Only intents answered outside the Gemini pipeline discard the prefetch; anything
+            # else (including an unrecognised router label) falls through and uses it
+            if prefetch and intent in ("CHITCHAT", "HISTORY_RECALL", "__GROQ_QUOTA_ERROR__"):
+                prefetch.cancel()
+                self.speculation["wasted"] += 1
+                if prefetch.done() and not prefetch.cancelled():
+                    self.speculation["wasted_completed"] += 1
+                prefetch = None
+
             if intent == "__GROQ_QUOTA_ERROR__":
                 return "__GROQ_QUOTA_ERROR__"
 
@@ -777,28 +1352,41 @@ class AIEngine:
                 return self._unify_agent_response(telegram_id, message, response_text)
 
             # 🚀 2. GEMINI AFC PIPELINE (Email Action) 🚀
-            try:
-                contacts_list = await contact_manager.get_user_contacts(telegram_id)
-            except Exception as e:
-                logger.error(f"Error fetching DB contacts: {e}")
-                contacts_list = []
+            # Contacts, memory, user record, preferences and semantic matches are fetched concurrently
+            if prefetch:
+                waited = time.perf_counter()
+                context = await prefetch
+                self.speculation["hits"] += 1
+                # Serial cost was router + context; speculation overlaps the shorter of the two
+                context_ms = (prefetch_done.get("at", time.perf_counter()) - router_started) * 1000
+                self.speculation["hidden_ms"] += min(router_ms, context_ms)
+                self.speculation["residual_wait_ms"] += (time.perf_counter() - waited) * 1000
+            else:
+                context = await self._assemble_context(telegram_id, message)
+            contacts_list = context["contacts"] or []
             contacts_context = "\n".join([
                 f"- {c.get('contact_alias')} ({c.get('contact_name')}): {c.get('email_address')}"
                 for c in contacts_list
             ])
 
             # Memory Context (Optimized via key_facts)
-            history_context = await memory_manager.build_memory_prompt(telegram_id)
+            history_context = context["memory"] or ""
 
             utc_now = datetime.utcnow().replace(tzinfo=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
             # Fetch user and preferences
-            user_record = await db_manager.get_user(telegram_id)
-            user_prefs = await db_manager.get_user_preferences(telegram_id)
+            user_record = context["user"]
+            user_prefs = context["prefs"]
+            if user_record is None:
+                # Admin restrictions live on this record: retry without the context deadline, then fail closed
+                user_record = await db_manager.get_user(telegram_id)
+                if user_record is None:
+                    logger.warning(f"User record unavailable for {telegram_id}; treating AI access as restricted.")
+                    return "⚠️ I couldn't verify your account access right now. Please try again in a moment."
             
             # Admin Penalty Overrides
-            ai_allowed = user_record.get("ai_allowed", True) if user_record else True
-            voice_allowed_admin = user_record.get("voice_allowed", True) if user_record else True
+            ai_allowed = user_record.get("ai_allowed", True)
+            voice_allowed_admin = user_record.get("voice_allowed", True)
             
             if not ai_allowed:
                 return "⚠️ Your AI access has been temporarily restricted by an administrator."
@@ -809,104 +1397,30 @@ class AIEngine:
                 
             draft_style = user_prefs.get("draft_style", "Detailed") if user_prefs else "Detailed"
             
-            voice_instruction = "VOICE TAG: Append '[VOICE]' at the very end of your response because the user prefers audio responses.\n\n" if voice_preference == "audio" else "VOICE TAG: Do NOT append '[VOICE]' unless the user explicitly asks for audio in this specific message.\n\n"
+            voice_instruction = "VOICE TAG: Append '[VOICE]' at the very end of your response because the user prefers audio responses.\n" if voice_preference == "audio" else "VOICE TAG: Do NOT append '[VOICE]' unless the user explicitly asks for audio in this specific message.\n"
 
             # Detect the user's script/language for mirroring
             detected_script = self._detect_user_script(message)
 
             # ── SEMANTIC CACHE SEARCH (pgvector) ──
-            semantic_context = ""
-            try:
-                query_embed = await generate_embedding(message)
-                if query_embed:
-                    # Fetch top 3 semantically relevant cached emails
-                    semantic_matches = await memory_manager.semantic_search_emails(telegram_id, query_embed, match_threshold=0.6, limit=3)
-                    if semantic_matches:
-                        semantic_context = "\n".join([
-                            f"- {m.get('sender')} ({m.get('received_at')}): Subj: {m.get('subject')} - {m.get('preview')}"
-                            for m in semantic_matches
-                        ])
-            except Exception as e:
-                logger.error(f"Semantic search failed: {e}")
+            semantic_matches = context["semantic"] or []
+            semantic_context = "\n".join([
+                f"- {m.get('sender')} ({m.get('received_at')}): Subj: {m.get('subject')} - {m.get('preview')}"
+                for m in semantic_matches
+            ])
 
             recent_search = _module_last_search_results.get(telegram_id, "None")
-            system_instructions = (
-                "You are a complete, highly capable agentic alternative to the Gmail web interface. You confidently act as the user's primary email client and manager. Do not claim to be just an assistant.\n"
-                "NEVER speak as a conversational middleman (avoid phrases like 'The sender is saying...', 'This email states...', 'The email is about...').\n"
-                "Act strictly as a clean native dashboard presentation layer. Serve direct data and complete tasks natively, without conversational introductions.\n"
-                "NEVER say 'As an AI' or 'I cannot access'. You already have full Gmail access via tools. Act immediately.\n\n"
-
-                f"LANGUAGE ENFORCEMENT: You must strictly maintain a Professional English persona at all times. The user is currently writing in: {detected_script}. ONLY respond in Urdu, Roman Urdu, or any other regional language IF the user explicitly demands it in their current message. Otherwise, default to clear, professional English.\n"
-                f"{voice_instruction}"
-                f"Always output markdown format.\n"
-                f"User Voice Preference is '{voice_preference}'. If they explicitly ask for an audio/voice reply, OR if you are providing a long readable response (e.g., an email summary), you MUST output the literal tag <VOICE_REQUIRED> somewhere in your message. This triggers the backend TTS system.\n\n"
-
-                f"UTC Time: {utc_now}\n"
-                f"Address Book:{chr(10) + contacts_context if contacts_context else ' (empty)'}\n"
-                f"Memory Context:{chr(10) + history_context if history_context else ' (none)'}\n"
-                f"Semantic Search Matches (Cached Emails):{chr(10) + semantic_context if semantic_context else ' (none)'}\n"
-                f"[SHORT-TERM SEARCH MEMORY]\nRecently fetched emails in context:\n{recent_search}\n\n"
-
-                "DIRECTIVES (follow strictly, no preambles, call tools immediately):\n"
-                "Rule A (Mandatory Search for Queries): If the user asks ANY question about whether an email arrived, what an email says, or requests a summary (e.g., 'Did I get an email?', 'Exam schedule aa gaya?', 'Check my email'), you MUST invoke the search_gmail_tool FIRST to fetch the data. NEVER answer conversationally without querying the data first.\n"
-                "Rule B (UI Card Rendering): If emails ARE found, or the user explicitly asks to 'show', 'list', 'view', or 'open' emails, output the exact string __SHOW_SEARCH_LIST__ at the end of your response to trigger the native UI dashboard cards. However, if a search returns 'No results', do NOT output this string.\n"
-                "Rule C (Broad Search Strategy): NEVER use complex restrictive operators like `label:INBOX` unless explicitly requested. Always prefer broad, simple 1-2 word keywords (e.g., just 'fyp') and let the backend do the semantic filtering from the larger result pool. Do not append operators unnecessarily.\n"
-                "Rule D (Parallel Hypothesis Testing): Whenever there is slight doubt, ambiguity, or potential for missing emails, you should freely generate multiple parallel search queries in the array (e.g., both broad `exam` and narrow `subject:\"final exam schedule\"`). Do not force parallel searching for simple, explicit requests.\n"
-                "Rule E (Natural Language on Misses & Confirmations): If a tool returns 'No results', you MUST respond in a natural, conversational manner explaining that nothing was found (e.g., 'I couldn't find any emails about that'). Do not dump raw tool output. Conversely, after successful task executions (e.g., saving a draft), provide a natural confirmation while still ensuring UI triggers are appended if applicable.\n"
-                "Rule F (Result Limit Enforcement): If the user asks for a specific number of emails (e.g., 'last 7 emails'), you MUST map that exact number to the `max_results` integer parameter in the search tool.\n"
-                "5. DRAFT/SEND/REPLY: User asks to write/send/reply → call prepare_email_draft_tool immediately. Never write draft as plain text.\n"
-                "6. SCHEDULE: User asks to schedule an email → call schedule_email_tool immediately.\n"
-                "7. TRASH/DELETE: User asks to delete, trash, or remove an email → call trash_email_tool using the target message ID.\n"
-                "8. UNTRASH/RESTORE: User asks to restore, undo delete, or untrash an email → call untrash_email_tool.\n"
-                "9. RECIPIENT UNKNOWN: If you don't know the recipient's email → use '[Specify Recipient Email]' as to_email. Never guess.\n"
-                "10. SHOW EMAIL: To show a specific email from results, include [SHOW_EMAIL:<message_id>] in your response.\n"
-                "11. READ FULL HTML: The email detail card includes a 'Read Full' button allowing users to download the email as an interactive HTML document.\n"
-                f"12. DRAFT FORMATTING: Always prioritize any explicit formatting instructions provided in the user's current prompt. If the user does not specify a format, strictly fall back to their database draft_style setting: {draft_style}.\n"
-                "Never output raw JSON, function names, or code in your text response."
-            )
-
-            # Build the tools list referencing standalone module-level functions.
-            tools_map = {
-                "search_gmail_tool": search_gmail_tool,
-                "prepare_email_draft_tool": prepare_email_draft_tool,
-                "schedule_email_tool": schedule_email_tool,
-                "save_contact_tool": save_contact_tool,
-                "trash_email_tool": trash_email_tool,
-                "untrash_email_tool": untrash_email_tool,
-                "parse_attachment_tool": parse_attachment_tool,
-                "summarize_long_thread_tool": summarize_long_thread_tool,
-            }
-
-            # Safety settings — OFF for email content (may contain flagged words)
-            _safety_off = [
-                types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT",  threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HARASSMENT",          threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH",         threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT",   threshold="OFF"),
-                types.SafetySetting(category="HARM_CATEGORY_CIVIC_INTEGRITY",     threshold="OFF"),
-            ]
-
-            # ── AFC THROTTLE: maximum_remote_calls=5 ───────────────────────────────────
-            afc_config = types.AutomaticFunctionCallingConfig(
-                disable=False,
-                maximum_remote_calls=5,
-            )
-            config = types.GenerateContentConfig(
-                system_instruction=system_instructions,
-                tools=list(tools_map.values()),
-                automatic_function_calling=afc_config,
-                temperature=0.2,
-                safety_settings=_safety_off,
-            )
-
-            # Lean config for the secondary formulation call (after manual tool execution).
-            # Tool definitions are not needed here — we're only asking the model to write
-            # a natural-language response based on already-executed tool results.
-            _lean_config = types.GenerateContentConfig(
-                system_instruction=system_instructions,
-                temperature=0.2,
-                safety_settings=_safety_off,
-            )
+            config = render_agent_config(self.agent_config, {
+                "detected_script": detected_script,
+                "voice_preference": voice_preference,
+                "voice_instruction": voice_instruction,
+                "draft_style": draft_style,
+                "utc_now": utc_now,
+                "contacts": chr(10) + contacts_context if contacts_context else " (empty)",
+                "memory": chr(10) + history_context if history_context else " (none)",
+                "semantic": chr(10) + semantic_context if semantic_context else " (none)",
+                "recent_search": recent_search,
+            })
 
             if telegram_id not in self.active_chats:
                 self.active_chats[telegram_id] = []
@@ -926,11 +1440,8 @@ class AIEngine:
             contents = scoped_history + [user_content]
 
             try:
-                response = await self.client.aio.models.generate_content(
-                    model=self.model_name,
-                    contents=contents,
-                    config=config,
-                )
+                stream_to = on_partial if settings.GEMINI_STREAMING else None
+                final_text = await self._agent_loop(telegram_id, contents, config, stream_to, turn_started)
             except Exception as gemini_err:
                 if _is_quota_error(gemini_err):
                     logger.warning(f"Gemini API quota exhausted (429) for user {telegram_id}. Returning quota sentinel.")
@@ -939,9 +1450,7 @@ class AIEngine:
                 return "⚠️ System error during reasoning. Please try again."
 
             # --- STANDARD GEMINI PROCESSING ---
-            # (AFC handles function calls internally. Manual block pruned for performance)
-            
-            final_text = response.text or ""
+            # (Tool calls were resolved by _agent_loop; UI sentinels are queued by the tools)
             return self._unify_agent_response(telegram_id, message, final_text)
 
         except Exception as e:
@@ -1036,13 +1545,13 @@ class AIEngine:
                         files = {"file": (os.path.basename(file_path), f, "audio/ogg")}
                         data = {"model": "whisper-large-v3", "response_format": "json"}
 
-                        async with httpx.AsyncClient(timeout=30.0) as client:
-                            response = await client.post(url, headers=headers, files=files, data=data)
-                            if response.status_code != 200:
-                                logger.error(f"Groq Whisper error {response.status_code}: {response.text}")
-                            response.raise_for_status()
-                            result = response.json()
-                            transcription_text = result.get("text", "").strip()
+                        # Open file handle cannot be replayed, so no transport-level retry
+                        response = await http_pool.post(url, headers=headers, files=files, data=data, timeout=30.0, retries=0)
+                        if response.status_code != 200:
+                            logger.error(f"Groq Whisper error {response.status_code}: {response.text}")
+                        response.raise_for_status()
+                        result = response.json()
+                        transcription_text = result.get("text", "").strip()
 
                     logger.info("Successfully transcribed voice note via Groq Whisper Large V3.")
                 except Exception as whisper_err:
@@ -1136,12 +1645,11 @@ class AIEngine:
                     "temperature": 0.1,
                     "max_tokens": 80,
                 }
-                async with httpx.AsyncClient(timeout=20.0) as client:
-                    resp = await client.post(url, headers=headers, json=payload)
-                    resp.raise_for_status()
-                    text = resp.json()["choices"][0]["message"].get("content", "").strip()
-                    if text:
-                        return text
+                resp = await http_pool.post(url, headers=headers, json=payload, timeout=20.0)
+                resp.raise_for_status()
+                text = resp.json()["choices"][0]["message"].get("content", "").strip()
+                if text:
+                    return text
             except Exception as groq_err:
                 logger.warning(f"Groq summarize_email failed, falling back to Gemini: {groq_err}")
 
@@ -6,6 +6,7 @@ Handles secure interactions with the Google Gmail API using OAuth 2.0 credential
 Features:
 1. Metadata Payload Polling: Uses Google's format='metadata' to fetch background unread streams,
    avoiding heavy body downloads, reducing latency, and blocking Render timeouts.
+   Metadata for list views is pulled through Gmail batch HTTP requests (up to 100 IDs per round trip).
 2. Dynamic Token Interceptor: Resolves Google 401/403 errors and auto-refreshes tokens.
 3. Sentinel Routing: Bubbles up the structured string 'TOKEN_EXPIRED_REAUTH_REQUIRED' on auth failure.
 4. Clean Life-Cycle: File deletion and cleanup are delegated entirely to the caller.
@@ -18,22 +19,69 @@ import asyncio
 import logging
 import tempfile
 import uuid
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
+from email.message import Message
 
+import httplib2
+from cachetools import LRUCache, TTLCache
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaFileUpload
 from google.oauth2.credentials import Credentials
 from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request as GoogleRequest
+from google_auth_httplib2 import AuthorizedHttp
 
+from config import settings
 from db.models import db_manager
+from bot.gmail_transport import DiscoveryTransport, RestTransport, GMAIL_API_ROOT
+from bot.gmail_quota import gmail_quota, QuotaLimitedTransport, is_rate_limit_error
+from db.mailstore import mail_store
+from bot.tool_cache import tool_cache
+from utils.html_text import html_to_text
+from utils.streaming import Base64JsonFieldDecoder, ByteBudget, current_rss_kb, write_mime_spool
 
 logger = logging.getLogger(__name__)
 
+# Request-path refresh buffer; the background refresher uses the wider OAUTH_REFRESH_WINDOW
+_INLINE_REFRESH_WINDOW = 300
+# Identifies this process when claiming cross-node token refresh leases
+_NODE_ID = f"node-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# Network read size for streamed attachment downloads (multiple of 4 keeps base64 carries tiny)
+_ATTACHMENT_CHUNK_SIZE = 256 * 1024
+
+
+def _parts_mask(depth: int) -> str:
+    """MIME tree mask without body data: headers, type, filename and attachment handles per part."""
+    inner = "partId,mimeType,filename,headers,body(attachmentId,size)"
+    return inner if depth == 0 else f"{inner},parts({_parts_mask(depth - 1)})"
+
+
+def _manifest_truncated(part: Dict[str, Any], depth: int = 0) -> bool:
+    """True when a container part sits at the deepest masked level, i.e. its children were cut off."""
+    if depth == _MANIFEST_DEPTH:
+        mime = part.get('mimeType', '')
+        return mime.startswith('multipart/') or mime == 'message/rfc822'
+    return any(_manifest_truncated(sub_part, depth + 1) for sub_part in part.get('parts', []))
+
+
+# Partial-response field masks: each read asks Gmail only for what its parser consumes
+_LIST_FIELDS = "messages(id,threadId),nextPageToken,resultSizeEstimate"
+_METADATA_FIELDS = "id,threadId,labelIds,snippet,internalDate,payload/headers"
+_VIEW_FIELDS = "id,threadId,labelIds,snippet,internalDate,payload"
+# The MIME skeleton is masked to a fixed depth; deeper trees (forward-of-forward chains) are re-read unmasked
+_MANIFEST_DEPTH = 4
+_MANIFEST_FIELDS = f"id,payload({_parts_mask(_MANIFEST_DEPTH)})"
+_HISTORY_FIELDS = "history(messagesAdded(message(id,labelIds))),historyId,nextPageToken"
+# Same walk, plus the deletions and label changes that keep the local mail store current
+_HISTORY_STORE_FIELDS = ("history(messagesAdded(message(id,labelIds)),messagesDeleted(message(id)),"
+                         "labelsAdded(message(id,labelIds)),labelsRemoved(message(id,labelIds))),historyId,nextPageToken")
+_PROFILE_FIELDS = "emailAddress,historyId"
+
 
 class GmailAuthException(Exception):
     """Custom exception raised when Google OAuth credentials are invalid, expired, or revoked."""
@@ -42,9 +90,33 @@ class GmailAuthException(Exception):
 
 class GmailClient:
     _token_cache: Dict[int, dict] = {}
+    # user_id -> {"fingerprint", "credentials", "service"}; LRU-bounded so idle users are evicted
+    _service_cache: LRUCache = LRUCache(maxsize=settings.GMAIL_SERVICE_CACHE_SIZE)
+    # (user_id, msg_id) -> parsed message view built from a single format=full fetch; bounded by text size
+    _message_cache: TTLCache = TTLCache(maxsize=settings.GMAIL_MESSAGE_CACHE_BYTES, ttl=settings.GMAIL_MESSAGE_CACHE_TTL,
+                                        getsizeof=lambda view: 1024 + len(view["body"]) + len(view["html"]) + len(view["snippet"]))
+    # (user_id, query) -> {"ids", "next_token", "exhausted", "metas"}: paged list screens grow one cursor page at a time
+    _listing_cache: TTLCache = TTLCache(maxsize=settings.GMAIL_LISTING_CACHE_SIZE, ttl=settings.GMAIL_LISTING_CACHE_TTL)
+    # Last unread ID set seen by the polling sync per user; a change means agent search results may be stale
+    _unread_snapshot: Dict[int, Tuple[str, ...]] = {}
     _user_locks: Dict[int, asyncio.Lock] = {}
+    # user_id -> semaphore capping concurrent message fetches against Gmail's per-user quota
+    _fetch_semaphores: Dict[int, asyncio.Semaphore] = {}
+    # Process-wide cap on attachment bytes in flight across all concurrent downloads
+    _attachment_budget: ByteBudget = ByteBudget(settings.GMAIL_ATTACHMENT_BYTE_BUDGET)
     cache_hits: int = 0
     cache_misses: int = 0
+    service_cache_hits: int = 0
+    service_cache_misses: int = 0
+    message_cache_hits: int = 0
+    message_cache_misses: int = 0
+    listing_cache_hits: int = 0
+    listing_pages_fetched: int = 0
+    attachment_downloads: int = 0
+    attachment_bytes: int = 0
+    attachment_rss_growth_kb: int = 0          # largest RSS rise over a download's baseline
+    inline_refreshes: int = 0
+    background_refreshes: int = 0
 
     def __init__(self) -> None:
         """
@@ -54,8 +126,54 @@ class GmailClient:
         self.user_attachments: Dict[int, List[Dict[str, str]]] = {}
 
     def clear_cache(self, user_id: int) -> None:
-        """Evicts a user's cached Google OAuth credentials."""
+        """Evicts a user's cached Google OAuth credentials and Gmail service object."""
         self.__class__._token_cache.pop(user_id, None)
+        self.__class__._service_cache.pop(user_id, None)
+        self.invalidate_user_messages(user_id)
+
+    def invalidate_message(self, user_id: int, msg_id: str) -> None:
+        """Drops one cached message view (e.g. after trash/untrash)."""
+        self.__class__._message_cache.pop((user_id, msg_id), None)
+
+    def invalidate_user_messages(self, user_id: int) -> None:
+        cache = self.__class__._message_cache
+        for key in [k for k in list(cache.keys()) if k[0] == user_id]:
+            cache.pop(key, None)
+        self.invalidate_listings(user_id)
+
+    def invalidate_listings(self, user_id: int) -> None:
+        """Drops a user's cached list-screen result sets and agent search results (mailbox contents changed)."""
+        cache = self.__class__._listing_cache
+        for key in [k for k in list(cache.keys()) if k[0] == user_id]:
+            cache.pop(key, None)
+        tool_cache.invalidate_user(user_id, "mailbox_changed")
+
+    @staticmethod
+    def _credentials_fingerprint(token_data: dict) -> Tuple:
+        """Identity of a token payload; a cached service is reused only while this is unchanged."""
+        return (
+            token_data.get("token"),
+            token_data.get("refresh_token"),
+            token_data.get("token_uri"),
+            token_data.get("client_id"),
+            tuple(token_data.get("scopes") or ()),
+        )
+
+    @staticmethod
+    def _build_service(credentials: Credentials) -> Any:
+        """
+        Builds the Gmail discovery service once per credentials object.
+        httplib2 is not thread-safe, so every request gets its own AuthorizedHttp transport;
+        this lets one cached service be shared safely across concurrent to_thread workers.
+        """
+        def _request_builder(http, *args, **kwargs):
+            request = HttpRequest(AuthorizedHttp(credentials, http=httplib2.Http()), *args, **kwargs)
+            # Google only gzips responses when the User-Agent also advertises it
+            request.headers['accept-encoding'] = 'gzip'
+            request.headers['user-agent'] = f"{request.headers.get('user-agent', '')} (gzip)".strip()
+            return request
+
+        return build('gmail', 'v1', credentials=credentials, requestBuilder=_request_builder, cache_discovery=False)
 
     def _is_auth_error(self, e: Exception) -> bool:
         """
@@ -79,10 +197,28 @@ class GmailClient:
         """Generates a secure re-authentication redirect message for Telegram."""
         return "⚠️ *Authentication Expired:* Your Google account access is invalid or expired. Please go to '⚙️ Settings', click **Logout Account**, and reconnect your account."
 
-    async def get_service(self, user_id: int) -> Optional[Any]:
+    async def _api(self, user_id: int) -> Any:
+        """
+        Returns the configured Gmail transport bound to this user's credentials
+        (GMAIL_TRANSPORT: 'discovery' thread-pool client or 'rest' native async client),
+        with every call charged against the per-user/per-project quota buckets.
+        Raises GmailAuthException when no valid credentials exist.
+        """
+        service = await self.get_service(user_id)
+        if not service:
+            raise GmailAuthException("No valid Gmail service for user")
+        if settings.GMAIL_TRANSPORT == "rest":
+            transport = RestTransport(self.__class__._service_cache[user_id]["credentials"].token)
+        else:
+            transport = DiscoveryTransport(service)
+        return QuotaLimitedTransport(transport, user_id, gmail_quota)
+
+    async def get_service(self, user_id: int, refresh_within: int = _INLINE_REFRESH_WINDOW) -> Optional[Any]:
         """
         Builds the authenticated Gmail service object.
         Intercepts expired tokens and attempts an automatic, proactive credentials refresh.
+        The service/credentials pair is cached per user and rebuilt only when the token payload changes.
+        refresh_within widens the refresh buffer (seconds) for the background refresher.
         Raises GmailAuthException if refresh fails or tokens are missing.
         """
         # Secure the refresh logic per-user to prevent parallel search race conditions
@@ -110,7 +246,7 @@ class GmailClient:
                                 dt = dt.astimezone(timezone.utc)
                             
                             # Cache is valid if expiration is in the future beyond 5 minutes
-                            if dt > datetime.now(timezone.utc) + timedelta(minutes=5):
+                            if dt > datetime.now(timezone.utc) + timedelta(seconds=refresh_within):
                                 cached_valid = True
                         except ValueError:
                             pass
@@ -152,8 +288,8 @@ class GmailClient:
                         # Convert to naive for google-auth compatibility
                         expiry = dt.replace(tzinfo=None)
                     
-                        # Implement strict 5-minute safety buffer
-                        if datetime.now(timezone.utc) + timedelta(seconds=300) >= dt:
+                        # Implement strict safety buffer (5 minutes inline, wider for background refreshes)
+                        if datetime.now(timezone.utc) + timedelta(seconds=refresh_within) >= dt:
                             needs_refresh = True
                     except Exception as parse_err:
                         logger.warning(f"Failed to parse expires_at timestamp '{expires_at}' for user {user_id}: {parse_err}")
@@ -161,20 +297,32 @@ class GmailClient:
                 else:
                     needs_refresh = True
 
-                credentials = Credentials(
-                    token=token_data.get("token"),
-                    refresh_token=token_data.get("refresh_token"),
-                    token_uri=token_data.get("token_uri"),
-                    client_id=token_data.get("client_id"),
-                    client_secret=token_data.get("client_secret"),
-                    scopes=token_data.get("scopes"),
-                    expiry=expiry
-                )
+                # Reuse the cached Credentials/service pair while the token payload is unchanged
+                service_entry = self.__class__._service_cache.get(user_id)
+                if service_entry and service_entry["fingerprint"] == self._credentials_fingerprint(token_data):
+                    self.__class__.service_cache_hits += 1
+                    credentials = service_entry["credentials"]
+                else:
+                    self.__class__.service_cache_misses += 1
+                    service_entry = None
+                    credentials = Credentials(
+                        token=token_data.get("token"),
+                        refresh_token=token_data.get("refresh_token"),
+                        token_uri=token_data.get("token_uri"),
+                        client_id=token_data.get("client_id"),
+                        client_secret=token_data.get("client_secret"),
+                        scopes=token_data.get("scopes"),
+                        expiry=expiry
+                    )
 
                 # Proactively refresh the access token if expired or within 5-min buffer
                 if (credentials.expired or needs_refresh) and credentials.refresh_token:
                     try:
                         logger.info(f"Proactively refreshing Google OAuth token for user {user_id}")
+                        if refresh_within == _INLINE_REFRESH_WINDOW:
+                            self.__class__.inline_refreshes += 1
+                        else:
+                            self.__class__.background_refreshes += 1
                         await asyncio.to_thread(credentials.refresh, GoogleRequest())
                     
                         # Persist only if the token actually changed to prevent needless DB loops
@@ -204,8 +352,16 @@ class GmailClient:
                 # Update/populate the RAM cache
                 self.__class__._token_cache[user_id] = token_data
 
-                # Build the discovery service
-                service = await asyncio.to_thread(build, 'gmail', 'v1', credentials=credentials, cache_discovery=False)
+                # Build the discovery service only on a cache miss; an in-place token refresh keeps it valid
+                if service_entry:
+                    service = service_entry["service"]
+                else:
+                    service = await asyncio.to_thread(self._build_service, credentials)
+                self.__class__._service_cache[user_id] = {
+                    "fingerprint": self._credentials_fingerprint(token_data),
+                    "credentials": credentials,
+                    "service": service,
+                }
                 return service
             except GmailAuthException as auth_e:
                 self.clear_cache(user_id)
@@ -217,6 +373,69 @@ class GmailClient:
                 logger.error(f"Failed to build Gmail service for user {user_id}: {e}")
                 return None
 
+    @staticmethod
+    def _token_expiry(token_data: Any) -> Optional[float]:
+        """Returns the access token expiry as a UTC epoch timestamp, or None if unknown."""
+        from datetime import datetime, timezone
+        if isinstance(token_data, str):
+            import json
+            try:
+                token_data = json.loads(token_data)
+            except json.JSONDecodeError:
+                return None
+        expires_at = (token_data or {}).get("expires_at")
+        if not expires_at:
+            return None
+        try:
+            if expires_at.endswith("Z"):
+                expires_at = expires_at[:-1] + "+00:00"
+            dt = datetime.fromisoformat(expires_at)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.timestamp()
+        except ValueError:
+            return None
+
+    async def refresh_expiring_tokens(self) -> int:
+        """
+        Background pass over cached credentials: refreshes every token expiring within
+        OAUTH_REFRESH_WINDOW before a user request has to. Refreshes are spread with random
+        jitter, and a per-user DB lease ensures only one node refreshes a given user.
+        Returns the number of users refreshed by this node.
+        """
+        import time
+        import random
+
+        now = time.time()
+        due = []
+        for user_id, token_data in list(self.__class__._token_cache.items()):
+            expiry = self._token_expiry(token_data)
+            # No recorded expiry: nothing to schedule against, so the inline path refreshes on demand
+            if expiry is not None and expiry - now <= settings.OAUTH_REFRESH_WINDOW:
+                due.append(user_id)
+
+        async def _refresh(user_id: int) -> bool:
+            # Each user waits out its own jitter, so a pass takes ~OAUTH_REFRESH_JITTER, not jitter x users
+            await asyncio.sleep(random.uniform(0, settings.OAUTH_REFRESH_JITTER))
+            if not await db_manager.try_acquire_token_refresh_lease(user_id, _NODE_ID, settings.OAUTH_REFRESH_LEASE_TTL):
+                # Another node owns this refresh; drop our copy so the next read picks up its token
+                self.__class__._token_cache.pop(user_id, None)
+                return False
+            try:
+                # Widened window forces a DB re-read (another node may already have refreshed) and a refresh if still due
+                await self.get_service(user_id, refresh_within=settings.OAUTH_REFRESH_WINDOW)
+                return True
+            except GmailAuthException:
+                logger.warning(f"Background token refresh failed for user {user_id}; user must re-authenticate.")
+            except Exception as e:
+                logger.error(f"Background token refresh error for user {user_id}: {e}")
+            finally:
+                await db_manager.release_token_refresh_lease(user_id, _NODE_ID)
+            return False
+
+        results = await asyncio.gather(*[_refresh(user_id) for user_id in due])
+        return sum(results)
+
     # ==========================================
     # ATTACHMENT STAGING MANAGEMENT
     # ==========================================
@@ -250,11 +469,6 @@ class GmailClient:
             if not service:
                 return "TOKEN_EXPIRED_REAUTH_REQUIRED"
 
-            message = MIMEMultipart()
-            message['To'] = to_address
-            message['Subject'] = subject or "No Subject"
-            message.attach(MIMEText(body or "", 'html'))
-
             attachments_to_process = []
             if manual_attachments:
                 attachments_to_process.extend([{"path": p, "name": os.path.basename(p)} for p in manual_attachments])
@@ -263,13 +477,27 @@ class GmailClient:
             if staged_attachments:
                 attachments_to_process.extend(staged_attachments)
 
+            existing_attachments = []
             for att in attachments_to_process:
+                if not os.path.exists(att["path"]):
+                    logger.warning(f"Staged attachment file not found: {att['path']}")
+                    continue
+                existing_attachments.append(att)
+
+            total_size = sum(os.path.getsize(att["path"]) for att in existing_attachments)
+            if total_size >= settings.GMAIL_RESUMABLE_UPLOAD_THRESHOLD:
+                await self._send_via_resumable_upload(service, user_id, to_address, subject, body, existing_attachments)
+                self.clear_user_attachments(user_id)
+                return "✅ Email transmitted successfully."
+
+            message = MIMEMultipart()
+            message['To'] = to_address
+            message['Subject'] = subject or "No Subject"
+            message.attach(MIMEText(body or "", 'html'))
+
+            for att in existing_attachments:
                 file_path = att["path"]
                 file_name = att["name"]
-                
-                if not os.path.exists(file_path):
-                    logger.warning(f"Staged attachment file not found: {file_path}")
-                    continue
 
                 content_type, encoding = mimetypes.guess_type(file_path)
                 if content_type is None or encoding is not None:
@@ -284,9 +512,8 @@ class GmailClient:
                     message.attach(part)
 
             raw_payload = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            await asyncio.to_thread(
-                lambda: service.users().messages().send(userId='me', body={'raw': raw_payload}).execute()
-            )
+            api = await self._api(user_id)
+            await api.send_message({'raw': raw_payload})
             
             self.clear_user_attachments(user_id)
             return "✅ Email transmitted successfully."
@@ -298,6 +525,33 @@ class GmailClient:
             logger.error(f"Failed to dispatch email for user {user_id}: {e}")
             return self._handle_auth_error(e)
 
+    async def _send_via_resumable_upload(self, service: Any, user_id: int, to_address: str, subject: str, body: str, attachments: List[Dict[str, str]]) -> None:
+        """
+        Sends a large message without holding it in memory: the MIME message is streamed to a
+        temp spool file and uploaded with Gmail's resumable media upload. Failed chunks are
+        retried from the spool at the last acknowledged offset, so attachment bytes are
+        encoded once and reused across retries.
+        """
+        spool_path = os.path.join(tempfile.gettempdir(), f"send_{uuid.uuid4().hex}.eml")
+        try:
+            spool_size = await asyncio.to_thread(write_mime_spool, spool_path, to_address, subject, body, attachments)
+            logger.info(f"Spooled outgoing message for user {user_id}: {spool_size} bytes, resumable upload")
+
+            def _upload():
+                media = MediaFileUpload(spool_path, mimetype='message/rfc822', resumable=True,
+                                        chunksize=settings.GMAIL_UPLOAD_CHUNK_SIZE)
+                request = service.users().messages().send(userId='me', body={}, media_body=media)
+                response = None
+                while response is None:
+                    _, response = request.next_chunk(num_retries=3)
+                return response
+
+            # Charged and 429-retried like any transport call; each attempt restarts the upload from the spool
+            await gmail_quota.run(user_id, "send_message", asyncio.to_thread, _upload)
+        finally:
+            if os.path.exists(spool_path):
+                os.remove(spool_path)
+
     # ==========================================
     # INBOUND FETCHING & SEARCHING (OPTIMIZED)
     # ==========================================
@@ -308,13 +562,8 @@ class GmailClient:
         Returns 'TOKEN_EXPIRED_REAUTH_REQUIRED' if OAuth authorization fails.
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-            
-            response = await asyncio.to_thread(
-                lambda: service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-            )
+            api = await self._api(user_id)
+            response = await api.list_messages(q=query, maxResults=max_results, fields=_LIST_FIELDS)
             return response.get('messages', [])
         except GmailAuthException:
             self.clear_cache(user_id)
@@ -326,53 +575,87 @@ class GmailClient:
             logger.error(f"Error fetching emails list for user {user_id}: {e}")
             return []
 
+    async def get_email_page(self, user_id: int, query: str, offset: int, limit: int, refresh: bool = False) -> Any:
+        """
+        Cursor-paged list screen backed by a per-user result set cache.
+        IDs are accumulated one Gmail page (nextPageToken) at a time, and row metadata is
+        resolved once per message, so Next/Prev are served from the cache or from exactly
+        one incremental list call instead of re-listing offset + limit IDs on every turn.
+        refresh=True restarts the cursor (e.g. reopening the inbox) while keeping resolved rows.
+        Returns {"rows", "has_next"} or 'TOKEN_EXPIRED_REAUTH_REQUIRED'.
+        """
+        try:
+            key = (user_id, query)
+            cache = self.__class__._listing_cache
+            entry = cache.get(key)
+            if entry is None or refresh:
+                metas = entry["metas"] if entry else {}
+                entry = {"ids": [], "next_token": None, "exhausted": False, "metas": metas}
+                cache[key] = entry
+
+            api = None
+            wanted = offset + limit + 1
+            if len(entry["ids"]) >= wanted or entry["exhausted"]:
+                self.__class__.listing_cache_hits += 1
+            while len(entry["ids"]) < wanted and not entry["exhausted"]:
+                api = api or await self._api(user_id)
+                response = await api.list_messages(
+                    q=query, maxResults=max(settings.GMAIL_LISTING_PAGE_SIZE, limit + 1),
+                    pageToken=entry["next_token"], fields=_LIST_FIELDS
+                )
+                self.__class__.listing_pages_fetched += 1
+                seen = set(entry["ids"])
+                entry["ids"].extend(m['id'] for m in response.get('messages', []) if m['id'] not in seen)
+                entry["next_token"] = response.get('nextPageToken')
+                entry["exhausted"] = not entry["next_token"]
+
+            visible = entry["ids"][offset:offset + limit]
+            missing = [m_id for m_id in visible if m_id not in entry["metas"]]
+            if missing:
+                api = api or await self._api(user_id)
+                metas = await self.get_emails_metadata_batch(user_id, missing, api=api)
+                if metas == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+                    return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+                entry["metas"].update(metas)
+
+            return {
+                "rows": [entry["metas"].get(m_id) or {"id": m_id} for m_id in visible],
+                "has_next": len(entry["ids"]) > offset + limit
+            }
+        except GmailAuthException:
+            self.clear_cache(user_id)
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        except Exception as e:
+            if self._is_auth_error(e):
+                self.clear_cache(user_id)
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            logger.error(f"Error fetching email page for user {user_id}: {e}")
+            return {"rows": [], "has_next": False}
+
     async def get_unread_emails(self, user_id: int, limit: int = 5) -> Any:
         """
         Polles the inbox for unread message metadata.
         OPTIMIZED: Uses format='metadata' during background synchronization queries to completely 
         prevent parsing heavy email payloads and protect Render CPU bottlenecks.
+        All metadata GETs are folded into one Gmail batch request (list + batch = 2 round trips).
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            api = await self._api(user_id)
 
             query = "is:unread newer_than:1d"
-            response = await asyncio.to_thread(
-                lambda: service.users().messages().list(userId='me', q=query, maxResults=limit).execute()
-            )
+            response = await api.list_messages(q=query, maxResults=limit, fields=_LIST_FIELDS)
             messages = response.get('messages', [])
+            unread = tuple(msg['id'] for msg in messages)
+            if self.__class__._unread_snapshot.get(user_id) != unread:
+                self.__class__._unread_snapshot[user_id] = unread
+                tool_cache.invalidate_user(user_id, "unread_changed")
             
-            minimal_emails = []
-            for msg in messages:
-                try:
-                    # Optimized Payload Polling via format='metadata' with specific headers
-                    minimal_msg = await asyncio.to_thread(
-                        lambda m_id=msg['id']: service.users().messages().get(
-                            userId='me', id=m_id, format='metadata',
-                            metadataHeaders=['From', 'Subject']
-                        ).execute()
-                    )
-                    
-                    headers = minimal_msg.get('payload', {}).get('headers', [])
-                    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-                    sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-                    internal_date = minimal_msg.get('internalDate', '0')
-
-                    minimal_emails.append({
-                        "id": msg['id'],
-                        "sender": sender,
-                        "subject": subject,
-                        "snippet": minimal_msg.get('snippet', ''),
-                        "internal_date": int(internal_date)
-                    })
-                except Exception as parse_err:
-                    if self._is_auth_error(parse_err):
-                        self.clear_cache(user_id)
-                        return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-                    logger.warning(f"Failed to fetch minimal schema for email {msg['id']}: {parse_err}")
+            # Single batched round trip for all metadata instead of one GET per message
+            metadata = await self.get_emails_metadata_batch(user_id, [msg['id'] for msg in messages], api=api)
+            if metadata == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
 
-            return minimal_emails
+            return [metadata[msg['id']] for msg in messages if msg['id'] in metadata]
         except GmailAuthException:
             self.clear_cache(user_id)
             return "TOKEN_EXPIRED_REAUTH_REQUIRED"
@@ -383,29 +666,267 @@ class GmailClient:
             logger.error(f"Error fetching unread emails for user {user_id}: {e}")
             return []
 
+    async def sync_unread_emails(self, user_id: int, start_history_id: Optional[str], limit: int = 10) -> Any:
+        """
+        Incremental inbox sync driven by the Gmail History API.
+        - No watermark: records the mailbox's current historyId as a baseline and returns no emails.
+        - Valid watermark: one users.history.list delta call returns only unread INBOX messages added since.
+        - Expired watermark (HTTP 404): falls back to a full unread poll and re-baselines.
+        Returns {"history_id", "emails", "full_resync"}, 'TOKEN_EXPIRED_REAUTH_REQUIRED', or None on failure.
+        """
+        try:
+            api = await self._api(user_id)
+
+            if not start_history_id:
+                profile = await api.get_profile(fields=_PROFILE_FIELDS)
+                return {"history_id": str(profile.get('historyId', '')), "emails": [], "full_resync": False}
+
+            track_store = mail_store.enabled
+            history_types = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'] if track_store else ['messageAdded']
+
+            async def _walk_history():
+                added_ids: List[str] = []
+                changed = False
+                latest_id = start_history_id
+                page_token = None
+                while True:
+                    response = await api.list_history(
+                        startHistoryId=start_history_id, historyTypes=history_types, labelId='INBOX',
+                        pageToken=page_token, fields=_HISTORY_STORE_FIELDS if track_store else _HISTORY_FIELDS
+                    )
+                    latest_id = response.get('historyId', latest_id)
+                    for record in response.get('history', []):
+                        changed = True
+                        for added in record.get('messagesAdded', []):
+                            message = added.get('message', {})
+                            if 'UNREAD' in message.get('labelIds', []) and message.get('id') not in added_ids:
+                                added_ids.append(message['id'])
+                        if track_store:
+                            await self._apply_history_to_store(user_id, record)
+                    page_token = response.get('nextPageToken')
+                    if not page_token:
+                        return str(latest_id), added_ids, changed
+
+            try:
+                history_id, added_ids, changed = await _walk_history()
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                logger.info(f"History ID {start_history_id} expired for user {user_id}; running full resync.")
+                # Changes since the watermark are unknown: nothing cached from before can be trusted
+                tool_cache.invalidate_user(user_id, "full_resync")
+                # Baseline before listing so mail arriving mid-resync is picked up by the next delta
+                profile = await api.get_profile(fields=_PROFILE_FIELDS)
+                emails = await self.get_unread_emails(user_id, limit=limit)
+                if emails == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+                    return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+                return {"history_id": str(profile.get('historyId', '')), "emails": emails, "full_resync": True}
+
+            if changed:
+                # New, deleted or relabelled mail: a repeated "koi nayi email aayi?" must search again
+                tool_cache.invalidate_user(user_id, "new_mail" if added_ids else "history_changed")
+            # History records are oldest-first; keep the newest `limit` additions
+            added_ids = added_ids[-limit:]
+            metadata = await self.get_emails_metadata_batch(user_id, added_ids, api=api)
+            if metadata == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            emails = [metadata[m_id] for m_id in reversed(added_ids) if m_id in metadata]
+            return {"history_id": history_id, "emails": emails, "full_resync": False}
+        except GmailAuthException:
+            self.clear_cache(user_id)
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        except Exception as e:
+            if self._is_auth_error(e):
+                self.clear_cache(user_id)
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            logger.error(f"Error running incremental inbox sync for user {user_id}: {e}")
+            return None
+
+    async def _apply_history_to_store(self, user_id: int, record: Dict[str, Any]) -> None:
+        """Mirrors one history record's deletions and label changes into the local mail store."""
+        deleted = [d.get('message', {}).get('id') for d in record.get('messagesDeleted', [])]
+        await mail_store.remove_messages(user_id, [m_id for m_id in deleted if m_id])
+        labels = {}
+        for change in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+            message = change.get('message', {})
+            if message.get('id') and 'labelIds' in message:
+                labels[message['id']] = message['labelIds']
+        await mail_store.update_labels(user_id, labels)
+
+    async def start_watch(self, user_id: int) -> Any:
+        """
+        Registers (or renews) a users.watch push subscription on the INBOX label.
+        Gmail publishes {emailAddress, historyId} to GMAIL_PUBSUB_TOPIC on every mailbox change;
+        watches lapse after 7 days so callers must renew them periodically.
+        Returns {"email", "history_id", "expiration"}, 'TOKEN_EXPIRED_REAUTH_REQUIRED', or None.
+        """
+        if not settings.GMAIL_PUBSUB_TOPIC:
+            return None
+        try:
+            api = await self._api(user_id)
+
+            body = {"topicName": settings.GMAIL_PUBSUB_TOPIC, "labelIds": ["INBOX"], "labelFilterBehavior": "INCLUDE"}
+            watch = await api.watch(body)
+            profile = await api.get_profile(fields=_PROFILE_FIELDS)
+            return {
+                "email": (profile.get('emailAddress') or '').lower(),
+                "history_id": str(watch.get('historyId', '')),
+                "expiration": int(watch.get('expiration', 0))
+            }
+        except GmailAuthException:
+            self.clear_cache(user_id)
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        except Exception as e:
+            if self._is_auth_error(e):
+                self.clear_cache(user_id)
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            logger.error(f"Error registering Gmail watch for user {user_id}: {e}")
+            return None
+
+    async def stop_watch(self, user_id: int) -> bool:
+        try:
+            api = await self._api(user_id)
+            await api.stop()
+            return True
+        except Exception as e:
+            logger.warning(f"Error stopping Gmail watch for user {user_id}: {e}")
+            return False
+
+    async def get_emails_metadata_batch(self, user_id: int, msg_ids: List[str], api: Optional[Any] = None) -> Any:
+        """
+        Fetches From/Subject metadata for many messages using Gmail batch HTTP requests.
+        Rows already in the local mail store are answered from disk; the rest share one
+        round trip per 100 IDs and are written back to the store. Returns a dict keyed by
+        message ID (failed or missing messages are omitted), or 'TOKEN_EXPIRED_REAUTH_REQUIRED' on auth failure.
+        """
+        ids = list(dict.fromkeys(m_id for m_id in msg_ids if m_id))
+        if not ids:
+            return {}
+        try:
+            stored = await mail_store.get_many(user_id, ids)
+            results = {m_id: self._metadata_row(row) for m_id, row in stored.items()}
+            missing = [m_id for m_id in ids if m_id not in stored]
+            if not missing:
+                return results
+
+            if api is None:
+                api = await self._api(user_id)
+
+            responses, failures = await api.batch_get_messages(missing, format='metadata', metadataHeaders=['From', 'Subject'],
+                                                              fields=_METADATA_FIELDS)
+
+            for m_id, err in failures.items():
+                if self._is_auth_error(err):
+                    self.clear_cache(user_id)
+                    return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+                logger.warning(f"Failed to fetch minimal schema for email {m_id}: {err}")
+
+            fetched = {m_id: self._parse_metadata(m_id, msg) for m_id, msg in responses.items()}
+            await mail_store.upsert_messages(user_id, [
+                {**row, "threadId": responses[m_id].get('threadId'), "label_ids": responses[m_id].get('labelIds')}
+                for m_id, row in fetched.items()
+            ])
+            results.update(fetched)
+            return results
+        except GmailAuthException:
+            self.clear_cache(user_id)
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        except Exception as e:
+            if self._is_auth_error(e):
+                self.clear_cache(user_id)
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            logger.error(f"Error batch fetching email metadata for user {user_id}: {e}")
+            return {}
+
+    def _parse_metadata(self, msg_id: str, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Flattens a format='metadata' message resource into the minimal list-row schema."""
+        headers = msg.get('payload', {}).get('headers', [])
+        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
+        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
+        return {
+            "id": msg_id,
+            "sender": sender,
+            "subject": subject,
+            "snippet": msg.get('snippet', ''),
+            "internal_date": int(msg.get('internalDate', '0'))
+        }
+
+    @staticmethod
+    def _metadata_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Projects a mail store row onto the _parse_metadata schema."""
+        return {key: row[key] for key in ("id", "sender", "subject", "snippet", "internal_date")}
+
+    def _fetch_semaphore(self, user_id: int) -> asyncio.Semaphore:
+        sems = self.__class__._fetch_semaphores
+        if user_id not in sems:
+            sems[user_id] = asyncio.Semaphore(settings.GMAIL_FETCH_CONCURRENCY)
+        return sems[user_id]
+
+    async def fetch_email_details(self, user_id: int, msg_ids: List[str]) -> Any:
+        """
+        Fetches full details for many messages in parallel, bounded by the per-user fetch semaphore
+        (shared across concurrent searches so fan-out cannot exceed Gmail's per-user rate limit).
+        IDs are de-duplicated and results keep the input order; unavailable messages are skipped.
+        """
+        unique_ids = list(dict.fromkeys(msg_ids))
+        sem = self._fetch_semaphore(user_id)
+
+        async def _fetch(m_id: str):
+            async with sem:
+                return await self.get_email_details(user_id, m_id)
+
+        fetched = await asyncio.gather(*[_fetch(m_id) for m_id in unique_ids])
+        if any(d == "TOKEN_EXPIRED_REAUTH_REQUIRED" for d in fetched):
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        return [d for d in fetched if d]
+
+    async def _list_message_ids(self, api: Any, user_id: int, query: str, max_results: int) -> List[str]:
+        async with self._fetch_semaphore(user_id):
+            response = await api.list_messages(q=query, maxResults=max_results, fields=_LIST_FIELDS)
+        return [m['id'] for m in response.get('messages', [])]
+
     async def search_emails(self, user_id: int, query: str, max_results: int = 5) -> Any:
         """
         Performs active searches in Gmail using advanced search filters.
         Intercepts expired OAuth sessions securely.
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
+            api = await self._api(user_id)
+            msg_ids = await self._list_message_ids(api, user_id, query, max_results)
+            return await self.fetch_email_details(user_id, msg_ids)
+        except GmailAuthException:
+            self.clear_cache(user_id)
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        except Exception as e:
+            if self._is_auth_error(e):
+                self.clear_cache(user_id)
                 return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-            
-            response = await asyncio.to_thread(
-                lambda: service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
+            logger.error(f"Error executing email search query '{query}' for user {user_id}: {e}")
+            return []
+
+    async def search_emails_multi(self, user_id: int, queries: List[str], max_results: int = 5) -> Any:
+        """
+        Runs several searches at once: the list calls go out in parallel, message IDs are
+        de-duplicated across queries (first query wins on ordering), then every unique
+        message is fetched once through fetch_email_details.
+        """
+        try:
+            api = await self._api(user_id)
+
+            listed = await asyncio.gather(
+                *[self._list_message_ids(api, user_id, q, max_results) for q in queries],
+                return_exceptions=True
             )
-            messages = response.get('messages', [])
-            
-            results = []
-            for msg in messages:
-                details = await self.get_email_details(user_id, msg['id'])
-                if details == "TOKEN_EXPIRED_REAUTH_REQUIRED":
-                    return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-                if details:
-                    results.append(details)
-            return results
+            msg_ids: List[str] = []
+            for q, ids in zip(queries, listed):
+                if isinstance(ids, Exception):
+                    if self._is_auth_error(ids):
+                        raise ids
+                    logger.error(f"Error executing email search query '{q}' for user {user_id}: {ids}")
+                    continue
+                msg_ids.extend(ids)
+
+            return await self.fetch_email_details(user_id, msg_ids)
         except GmailAuthException:
             self.clear_cache(user_id)
             return "TOKEN_EXPIRED_REAUTH_REQUIRED"
@@ -413,38 +934,94 @@ class GmailClient:
             if self._is_auth_error(e):
                 self.clear_cache(user_id)
                 return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-            logger.error(f"Error executing email search query '{query}' for user {user_id}: {e}")
+            logger.error(f"Error executing multi-query email search for user {user_id}: {e}")
             return []
 
+    async def _get_message_view(self, user_id: int, msg_id: str) -> Dict[str, Any]:
+        """
+        Returns the parsed view of a message, fetching format=full at most once per cache window.
+        Raises GmailAuthException / HttpError so public wrappers keep their own error contracts.
+        """
+        key = (user_id, msg_id)
+        cache = self.__class__._message_cache
+        view = cache.get(key)
+        if view is not None:
+            self.__class__.message_cache_hits += 1
+            return view
+
+        self.__class__.message_cache_misses += 1
+        api = await self._api(user_id)
+        msg = await api.get_message(msg_id, format='full', fields=_VIEW_FIELDS)
+        view = self._build_message_view(msg_id, msg)
+        try:
+            cache[key] = view
+        except ValueError:
+            # Larger than the whole cache budget: serve it uncached
+            logger.debug(f"Message view {msg_id} exceeds GMAIL_MESSAGE_CACHE_BYTES; not cached.")
+        await mail_store.upsert_messages(user_id, [{**view, "label_ids": msg.get('labelIds')}])
+        return view
+
+    def _build_message_view(self, msg_id: str, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Parses headers, text body, HTML body and attachment manifest out of one format=full response."""
+        payload = msg.get('payload', {})
+        headers = payload.get('headers', [])
+
+        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
+        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
+        date_str = next((h['value'] for h in headers if h['name'].lower() == 'date'), 'Unknown Date')
+
+        attachments: List[Dict[str, Any]] = []
+        self._extract_attachments_metadata(payload, attachments)
+
+        def check_attach(p):
+            return bool(p.get('filename')) or any(check_attach(sp) for sp in p.get('parts', []))
+
+        return {
+            "id": msg_id,
+            "threadId": msg.get('threadId', ''),
+            "sender": sender,
+            "subject": subject,
+            "date": date_str,
+            "snippet": msg.get('snippet', ''),
+            "internal_date": int(msg.get('internalDate', 0) or 0),
+            "body": self._extract_body(payload, max_chars=settings.GMAIL_BODY_TEXT_LIMIT),
+            "html": self._extract_html(payload),
+            "attachments": attachments,
+            "has_attachment": check_attach(payload)
+        }
+
+    async def get_message_view(self, user_id: int, msg_id: str) -> Any:
+        """
+        Single-fetch parsed message (headers, text body, HTML body, attachments, threadId)
+        shared by every email screen. Returns 'TOKEN_EXPIRED_REAUTH_REQUIRED' or None on failure.
+        """
+        try:
+            return await self._get_message_view(user_id, msg_id)
+        except GmailAuthException:
+            self.clear_cache(user_id)
+            return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+        except HttpError as e:
+            if e.resp.status == 404:
+                logger.warning(f"Message view not found (404) for message {msg_id}.")
+                return None
+            logger.error(f"Error retrieving message view for {msg_id}: {e}")
+            return None
+        except Exception as e:
+            if self._is_auth_error(e):
+                self.clear_cache(user_id)
+                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            logger.error(f"Error retrieving message view for {msg_id}: {e}")
+            return None
+
     async def get_email_details(self, user_id: int, msg_id: str) -> Any:
         """
         Extracts raw MIME body and headers for complete email viewing.
         Handles authorization exceptions dynamically.
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            view = await self._get_message_view(user_id, msg_id)
+            body = view["body"]
 
-            msg = await asyncio.to_thread(
-                lambda: service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            )
-            
-            payload = msg.get('payload', {})
-            headers = payload.get('headers', [])
-            
-            subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-            date_str = next((h['value'] for h in headers if h['name'].lower() == 'date'), 'Unknown Date')
-            
-            body = self._extract_body(payload)
-            snippet = msg.get('snippet', '')
-            thread_id = msg.get('threadId', '')
-            
-            def check_attach(p):
-                return bool(p.get('filename')) or any(check_attach(sp) for sp in p.get('parts', []))
-            has_attachment = check_attach(payload)
-            
             # Truncate body for UI/API payload efficiency — full content is still
             # available for display, but prevents massive chain emails from
             # flooding AI context memory or Telegram message size limits.
@@ -453,13 +1030,13 @@ class GmailClient:
 
             return {
                 "id": msg_id,
-                "threadId": thread_id,
-                "sender": sender,
-                "subject": subject,
-                "date": date_str,
-                "snippet": snippet,
+                "threadId": view["threadId"],
+                "sender": view["sender"],
+                "subject": view["subject"],
+                "date": view["date"],
+                "snippet": view["snippet"],
                 "body": body,
-                "has_attachment": has_attachment
+                "has_attachment": view["has_attachment"]
             }
         except GmailAuthException:
             self.clear_cache(user_id)
@@ -482,41 +1059,9 @@ class GmailClient:
         Retrieves the complete, un-truncated HTML body of an email.
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-
-            msg = await asyncio.to_thread(
-                lambda: service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            )
-            
-            payload = msg.get('payload', {})
-            
-            # Extract HTML body recursively without truncation
-            def _extract_full_html(part: Dict[str, Any]) -> str:
-                html_data = ""
-                if 'parts' in part:
-                    for sub_part in part['parts']:
-                        if sub_part['mimeType'] == 'text/html':
-                            data = sub_part['body'].get('data')
-                            if data:
-                                html_data += base64.urlsafe_b64decode(data).decode('utf-8')
-                        elif 'parts' in sub_part:
-                            html_data += _extract_full_html(sub_part)
-                else:
-                    if part.get('mimeType') == 'text/html':
-                        data = part.get('body', {}).get('data')
-                        if data:
-                            html_data = base64.urlsafe_b64decode(data).decode('utf-8')
-                return html_data
-
-            html_body = _extract_full_html(payload)
-            
+            view = await self._get_message_view(user_id, msg_id)
             # Fallback to plain text body if HTML is not found
-            if not html_body:
-                html_body = self._extract_body(payload)
-                
-            return html_body
+            return view["html"] or view["body"]
         except GmailAuthException:
             self.clear_cache(user_id)
             return "TOKEN_EXPIRED_REAUTH_REQUIRED"
@@ -529,36 +1074,44 @@ class GmailClient:
 
     async def get_email_metadata(self, user_id: int, msg_id: str) -> Any:
         """
-        Retrieves lightweight metadata (Headers, Sender, Subject, Attachments)
-        without heavy payload loading overheads.
+        Retrieves lightweight metadata (Headers, Sender, Subject, Attachments).
+        Served from the shared message view when cached; otherwise only the MIME
+        skeleton is fetched (no body data) via a partial-response field mask.
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            view = self.__class__._message_cache.get((user_id, msg_id))
+            if view is not None:
+                self.__class__.message_cache_hits += 1
+                return {
+                    "id": msg_id,
+                    "sender": view["sender"],
+                    "subject": view["subject"],
+                    "attachments": view["attachments"]
+                }
 
-            msg = await asyncio.to_thread(
-                lambda: service.users().messages().get(userId='me', id=msg_id, format='metadata', 
-                                                       metadataHeaders=['From', 'Subject']).execute()
-            )
-            
-            headers = msg.get('payload', {}).get('headers', [])
-            subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-            
-            full_msg = await asyncio.to_thread(
-                lambda: service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            )
-            attachments = []
-            payload = full_msg.get('payload', {})
-            self._extract_attachments_metadata(payload, attachments)
+            row = await mail_store.get(user_id, msg_id)
+            if row is not None and row["attachments"] is not None:
+                return {"id": msg_id, "sender": row["sender"], "subject": row["subject"], "attachments": row["attachments"]}
 
-            return {
+            api = await self._api(user_id)
+            msg = await api.get_message(msg_id, format='full', fields=_MANIFEST_FIELDS)
+            if _manifest_truncated(msg.get('payload', {})):
+                # Attachments below the masked depth would vanish from the manifest and notification counts
+                logger.debug(f"MIME tree of {msg_id} is deeper than {_MANIFEST_DEPTH} levels; refetching unmasked.")
+                msg = await api.get_message(msg_id, format='full', fields=_VIEW_FIELDS)
+            payload = msg.get('payload', {})
+            headers = payload.get('headers', [])
+            attachments: List[Dict[str, Any]] = []
+            self._extract_attachments_metadata(payload, attachments)
+            meta = {
                 "id": msg_id,
-                "sender": sender,
-                "subject": subject,
+                "sender": next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender'),
+                "subject": next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject'),
                 "attachments": attachments
             }
+            if row is not None:
+                await mail_store.upsert_messages(user_id, [{**row, **meta}])
+            return meta
         except GmailAuthException:
             self.clear_cache(user_id)
             return "TOKEN_EXPIRED_REAUTH_REQUIRED"
@@ -591,35 +1144,66 @@ class GmailClient:
                     "size": body.get('size', 0)
                 })
 
-    def _extract_body(self, payload: Dict[str, Any]) -> str:
-        """Recursively parses email boundaries to clean and isolate text bodies."""
+    @staticmethod
+    def _decode_part(part: Dict[str, Any], data: str) -> str:
+        """
+        Decodes a text part with the charset from its Content-Type (UTF-8 when absent).
+        Undecodable bytes are replaced, so one Latin-1 / Windows-1252 alternative never fails the whole view.
+        """
+        header = Message()
+        for h in part.get('headers', []):
+            if h.get('name', '').lower() == 'content-type':
+                header['Content-Type'] = h.get('value', '')
+                break
+        raw = base64.urlsafe_b64decode(data)
+        try:
+            return raw.decode(header.get_content_charset() or 'utf-8', errors='replace')
+        except LookupError:
+            return raw.decode('utf-8', errors='replace')
+
+    def _extract_html(self, part: Dict[str, Any]) -> str:
+        """Recursively concatenates every text/html part without truncation."""
+        html_data = ""
+        if 'parts' in part:
+            for sub_part in part['parts']:
+                if sub_part['mimeType'] == 'text/html':
+                    data = sub_part['body'].get('data')
+                    if data:
+                        html_data += self._decode_part(sub_part, data)
+                elif 'parts' in sub_part:
+                    html_data += self._extract_html(sub_part)
+        else:
+            if part.get('mimeType') == 'text/html':
+                data = part.get('body', {}).get('data')
+                if data:
+                    html_data = self._decode_part(part, data)
+        return html_data
+
+    def _extract_body(self, payload: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+        """
+        Recursively parses email boundaries to clean and isolate text bodies.
+        HTML is converted with the configured engine, which stops once max_chars of text exist.
+        """
         body_data = ""
         if 'parts' in payload:
             for part in payload['parts']:
                 if part['mimeType'] == 'text/plain':
                     data = part['body'].get('data')
                     if data:
-                        body_data += base64.urlsafe_b64decode(data).decode('utf-8')
+                        body_data += self._decode_part(part, data)
                 elif part['mimeType'] == 'text/html':
                     data = part['body'].get('data')
                     if data and not body_data:
-                        body_data += base64.urlsafe_b64decode(data).decode('utf-8')
+                        body_data += self._decode_part(part, data)
                 elif 'parts' in part:
-                    body_data += self._extract_body(part)
+                    body_data += self._extract_body(part, max_chars)
         else:
             data = payload.get('body', {}).get('data')
             if data:
-                body_data = base64.urlsafe_b64decode(data).decode('utf-8')
+                body_data = self._decode_part(payload, data)
                 
         if body_data and '<' in body_data and '>' in body_data:
-            try:
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(body_data, 'html.parser')
-                for tag in soup(["style", "script"]):
-                    tag.decompose()
-                body_data = soup.get_text(separator='\n', strip=True)
-            except ImportError:
-                pass
+            body_data = html_to_text(body_data, max_chars=max_chars, engine=settings.HTML_TEXT_ENGINE)
 
         return body_data.strip()
 
@@ -633,17 +1217,12 @@ class GmailClient:
         Returns a list of local file paths.
         """
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
+            # The attachment manifest comes from the shared message view, so no extra format=full fetch
+            view = await self._get_message_view(user_id, msg_id)
+            token = await self._get_access_token(user_id)
 
-            msg = await asyncio.to_thread(
-                lambda: service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            )
-            
             attachments_paths = []
-            payload = msg.get('payload', {})
-            await self._download_parts_attachments(user_id, service, msg_id, payload, attachments_paths)
+            await self._download_parts_attachments(user_id, token, msg_id, view["attachments"], attachments_paths)
             return attachments_paths
         except GmailAuthException:
             self.clear_cache(user_id)
@@ -655,36 +1234,80 @@ class GmailClient:
             logger.error(f"Failed to fetch attachments for message {msg_id}: {e}")
             return []
 
-    async def _download_parts_attachments(self, user_id: int, service, msg_id: str, part: Dict[str, Any], paths: List[str]) -> None:
-        """Recursively downloads file chunks from Gmail API matching MIME layout structures."""
-        if 'parts' in part:
-            for sub_part in part['parts']:
-                await self._download_parts_attachments(user_id, service, msg_id, sub_part, paths)
-        else:
-            filename = part.get('filename')
-            body = part.get('body', {})
-            attachment_id = body.get('attachmentId')
-            
-            if filename and attachment_id:
-                try:
-                    attachment = await asyncio.to_thread(
-                        lambda: service.users().messages().attachments().get(
-                            userId='me', messageId=msg_id, id=attachment_id
-                        ).execute()
-                    )
-                    
-                    file_data = base64.urlsafe_b64decode(attachment.get('data', '').encode('utf-8'))
-                    
-                    temp_dir = tempfile.gettempdir()
-                    file_path = os.path.join(temp_dir, f"att_{uuid.uuid4().hex}_{filename}")
-                    
-                    with open(file_path, 'wb') as f:
-                        f.write(file_data)
-                        
-                    paths.append({"path": file_path, "original_filename": filename})
-                    logger.info(f"Downloaded attachment: {filename} to {file_path}")
-                except Exception as err:
-                    logger.error(f"Failed to download specific attachment {filename}: {err}")
+    async def _get_access_token(self, user_id: int) -> str:
+        """Returns a fresh OAuth access token for direct REST calls outside the discovery client."""
+        service = await self.get_service(user_id)
+        entry = self.__class__._service_cache.get(user_id)
+        if not service or not entry or not entry["credentials"].token:
+            raise GmailAuthException("No valid Gmail credentials for user")
+        return entry["credentials"].token
+
+    async def _download_parts_attachments(self, user_id: int, token: str, msg_id: str, attachments: List[Dict[str, Any]], paths: List[str]) -> None:
+        """
+        Downloads every attachment in the manifest concurrently. Each download reserves its size
+        from the shared byte budget and streams straight to a spool file, so RSS stays bounded
+        regardless of attachment size. Paths keep manifest order.
+        """
+        started_rss = current_rss_kb()
+        growth = 0
+
+        async def _download(att: Dict[str, Any]) -> Optional[Dict[str, str]]:
+            nonlocal growth
+            filename = att["filename"]
+            try:
+                async with self.__class__._attachment_budget.reserve(int(att.get("size") or 0)):
+                    file_path, size = await gmail_quota.run(user_id, "get_attachment", self._stream_attachment_to_file,
+                                                            token, msg_id, att["id"], filename)
+                    growth = max(growth, current_rss_kb() - started_rss)
+                self.__class__.attachment_downloads += 1
+                self.__class__.attachment_bytes += size
+                logger.info(f"Downloaded attachment: {filename} to {file_path}")
+                return {"path": file_path, "original_filename": filename}
+            except GmailAuthException:
+                raise
+            except Exception as err:
+                logger.error(f"Failed to download specific attachment {filename}: {err}")
+                return None
+
+        results = await asyncio.gather(*[_download(att) for att in attachments])
+        paths.extend(r for r in results if r)
+
+        self.__class__.attachment_rss_growth_kb = max(self.__class__.attachment_rss_growth_kb, growth)
+        if attachments:
+            logger.info(f"Attachment download for {msg_id}: {len(paths)}/{len(attachments)} file(s), "
+                        f"RSS +{growth / 1024:.1f} MB over {started_rss / 1024:.1f} MB at start")
+
+    async def _stream_attachment_to_file(self, token: str, msg_id: str, attachment_id: str, filename: str) -> Tuple[str, int]:
+        """Streams one attachments.get response, decoding base64 chunk-by-chunk into a temp file."""
+        url = f"{GMAIL_API_ROOT}/gmail/v1/users/me/messages/{msg_id}/attachments/{attachment_id}"
+        file_path = os.path.join(tempfile.gettempdir(), f"att_{uuid.uuid4().hex}_{filename}")
+        decoder = Base64JsonFieldDecoder("data")
+        written = 0
+        try:
+            # Shares the pooled Gmail REST connections regardless of the configured transport
+            async with RestTransport.client().stream("GET", url, params={"fields": "data"},
+                                                     headers={"Authorization": f"Bearer {token}"}) as resp:
+                if resp.status_code >= 400:
+                    await resp.aread()
+                    try:
+                        # HttpError, so gmail_quota.run recognises 429 / rateLimitExceeded and retries
+                        RestTransport._raise_for_status(resp)
+                    except HttpError as e:
+                        if resp.status_code in (401, 403) and not is_rate_limit_error(e):
+                            raise GmailAuthException(f"Attachment download rejected ({resp.status_code})") from e
+                        raise
+                with open(file_path, 'wb') as f:
+                    async for chunk in resp.aiter_bytes(_ATTACHMENT_CHUNK_SIZE):
+                        data = decoder.feed(chunk)
+                        if data:
+                            f.write(data)
+                            written += len(data)
+            decoder.close()
+            return file_path, written
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
 
     # ==========================================
     # EMAIL MUTATION OPERATIONS
@@ -693,12 +1316,11 @@ class GmailClient:
     async def delete_email(self, user_id: int, msg_id: str) -> Any:
         """Moves a specific email to the user's Gmail trash bin."""
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-            await asyncio.to_thread(
-                lambda: service.users().messages().trash(userId='me', id=msg_id).execute()
-            )
+            api = await self._api(user_id)
+            await api.trash_message(msg_id)
+            self.invalidate_message(user_id, msg_id)
+            await mail_store.remove_messages(user_id, [msg_id])
+            self.invalidate_listings(user_id)
             return True
         except GmailAuthException:
             self.clear_cache(user_id)
@@ -713,12 +1335,10 @@ class GmailClient:
     async def untrash_email(self, user_id: int, msg_id: str) -> Any:
         """Restores a specific email from the user's Gmail trash bin."""
         try:
-            service = await self.get_service(user_id)
-            if not service:
-                return "TOKEN_EXPIRED_REAUTH_REQUIRED"
-            await asyncio.to_thread(
-                lambda: service.users().messages().untrash(userId='me', id=msg_id).execute()
-            )
+            api = await self._api(user_id)
+            await api.untrash_message(msg_id)
+            self.invalidate_message(user_id, msg_id)
+            self.invalidate_listings(user_id)
             return True
         except GmailAuthException:
             self.clear_cache(user_id)
@@ -0,0 +1,189 @@
+"""
+Quota accounting for Gmail API calls.
+
+Gmail meters usage in quota units (messages.get = 5, messages.send = 100, ...), enforced
+per user (250 units/s) and per project. Every transport call is charged against a per-user
+and a per-project token bucket before it is sent; when a bucket is empty the call is
+delayed rather than failed. 429 / rateLimitExceeded responses trigger an adaptive,
+jittered per-user backoff and a bounded retry.
+"""
+
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Dict
+
+from googleapiclient.errors import HttpError
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# https://developers.google.com/gmail/api/reference/quota (per-method unit cost)
+QUOTA_UNITS: Dict[str, int] = {
+    "list_messages": 5,
+    "get_message": 5,
+    "batch_get_messages": 5,   # charged per message in the batch
+    "send_message": 100,
+    "trash_message": 5,
+    "untrash_message": 5,
+    "get_attachment": 5,
+    "get_profile": 1,
+    "list_history": 2,
+    "watch": 100,
+    "stop": 50,
+}
+_DEFAULT_UNITS = 5
+_MAX_BACKOFF_LEVEL = 5
+
+
+class TokenBucket:
+    """
+    Reservation-style token bucket: callers deduct immediately (the balance may go negative)
+    and sleep for the returned wait, which keeps FIFO ordering without a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, units: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Calls larger than the bucket only need a full bucket to start; the rest is debt
+        needed = min(units, self.capacity)
+        wait = 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+        self.tokens -= units
+        return wait
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    if not isinstance(e, HttpError):
+        return False
+    status = getattr(e.resp, "status", 0)
+    if status == 429:
+        return True
+    if status == 403:
+        content = e.content.decode("utf-8", "ignore") if isinstance(e.content, bytes) else str(e.content)
+        return "rateLimitExceeded" in content or "userRateLimitExceeded" in content
+    return False
+
+
+class GmailQuotaLimiter:
+    def __init__(self):
+        self._project_bucket = TokenBucket(settings.GMAIL_PROJECT_QUOTA_PER_SEC, settings.GMAIL_PROJECT_QUOTA_PER_SEC)
+        self._user_buckets: Dict[int, TokenBucket] = {}
+        self._backoff: Dict[int, Dict[str, float]] = {}   # user_id -> {"until", "level"}
+
+        self.units_charged = 0
+        self.calls = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.throttled_calls = 0
+        self.throttled_seconds = 0.0
+        self.rate_limit_hits = 0
+        self.retries = 0
+
+    def cost(self, method: str, args: tuple) -> int:
+        units = QUOTA_UNITS.get(method, _DEFAULT_UNITS)
+        if method == "batch_get_messages" and args:
+            units *= max(1, len(args[0]))
+        return units
+
+    async def acquire(self, user_id: int, units: int) -> float:
+        """Charges units to the user and project buckets, sleeping until both allow the call."""
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self._user_buckets[user_id] = TokenBucket(settings.GMAIL_USER_QUOTA_PER_SEC, settings.GMAIL_USER_QUOTA_PER_SEC)
+
+        backoff_wait = max(0.0, self._backoff.get(user_id, {}).get("until", 0.0) - time.monotonic())
+        wait = max(bucket.reserve(units), self._project_bucket.reserve(units), backoff_wait)
+
+        self.calls += 1
+        self.units_charged += units
+        if wait > 0:
+            self.throttled_calls += 1
+            self.throttled_seconds += wait
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.queue_depth -= 1
+        return wait
+
+    def note_rate_limited(self, user_id: int) -> float:
+        """Escalates the user's backoff (exponential with jitter) after a 429/rateLimitExceeded."""
+        self.rate_limit_hits += 1
+        state = self._backoff.setdefault(user_id, {"until": 0.0, "level": 0})
+        state["level"] = min(state["level"] + 1, _MAX_BACKOFF_LEVEL)
+        delay = min(2 ** state["level"], settings.GMAIL_MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.0)
+        state["until"] = max(state["until"], time.monotonic() + delay)
+        logger.warning(f"Gmail rate limit hit for user {user_id}; backing off {delay:.1f}s")
+        return delay
+
+    def note_success(self, user_id: int) -> None:
+        state = self._backoff.get(user_id)
+        if state and state["until"] <= time.monotonic():
+            self._backoff.pop(user_id, None)
+
+    async def run(self, user_id: int, method: str, call, *args, **kwargs) -> Any:
+        """Executes one transport call under quota accounting with adaptive 429 retry."""
+        units = self.cost(method, args)
+        attempt = 0
+        while True:
+            await self.acquire(user_id, units)
+            try:
+                result = await call(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < settings.GMAIL_RATE_LIMIT_RETRIES:
+                    attempt += 1
+                    self.retries += 1
+                    self.note_rate_limited(user_id)
+                    continue
+                raise
+            if method == "batch_get_messages" and any(is_rate_limit_error(err) for err in result[1].values()):
+                # Inner batch items were throttled; slow the user down for the next call
+                self.note_rate_limited(user_id)
+            else:
+                self.note_success(user_id)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "units_charged": self.units_charged,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "throttled_calls": self.throttled_calls,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "rate_limit_hits": self.rate_limit_hits,
+            "retries": self.retries,
+            "users_in_backoff": sum(1 for s in self._backoff.values() if s["until"] > time.monotonic()),
+        }
+
+
+class QuotaLimitedTransport:
+    """Wraps a Gmail transport so every coroutine method is charged through the quota limiter."""
+
+    def __init__(self, inner: Any, user_id: int, limiter: GmailQuotaLimiter):
+        self._inner = inner
+        self._user_id = user_id
+        self._limiter = limiter
+        self.name = inner.name
+
+    def __getattr__(self, method: str) -> Any:
+        target = getattr(self._inner, method)
+        if not asyncio.iscoroutinefunction(target):
+            return target
+
+        async def _charged(*args, **kwargs):
+            return await self._limiter.run(self._user_id, method, target, *args, **kwargs)
+        return _charged
+
+
+gmail_quota = GmailQuotaLimiter()
@@ -0,0 +1,282 @@
+"""
+Gmail transports used by GmailClient.
+
+Both transports expose the same coroutine API with Gmail REST parameter names
+(q, maxResults, format, metadataHeaders, fields, ...), so GmailClient code is
+transport-agnostic and selected by settings.GMAIL_TRANSPORT:
+
+- DiscoveryTransport: googleapiclient discovery service; every call runs in a worker
+  thread on the synchronous httplib2 stack (the historical behaviour).
+- RestTransport: native asyncio over one shared, pooled httpx client (HTTP/2 when the
+  h2 package is installed). No executor threads, and TLS connections are reused.
+
+Errors from both are googleapiclient HttpError instances, so existing `e.resp.status`
+checks and auth detection keep working unchanged.
+"""
+
+import re
+import json
+import uuid
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import httplib2
+import httpx
+from googleapiclient.errors import HttpError
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+GMAIL_API_ROOT = "https://gmail.googleapis.com"
+_API_PATH = "/gmail/v1/users/me"
+_BATCH_URL = f"{GMAIL_API_ROOT}/batch/gmail/v1"
+
+# Gmail rejects batch HTTP requests carrying more than 100 inner calls.
+BATCH_MAX_REQUESTS = 100
+
+# Google only serves gzip to clients whose User-Agent also advertises it
+GZIP_HEADERS = {"Accept-Encoding": "gzip", "User-Agent": "smart-email-assistant (gzip)"}
+
+_STATUS_LINE_RE = re.compile(rb'HTTP/\d(?:\.\d)?\s+(\d{3})')
+_CONTENT_ID_RE = re.compile(rb'Content-ID:\s*<response-([^>]+)>', re.I)
+
+
+class PayloadStats:
+    """Per call-type response size accounting (decoded JSON bytes, plus on-the-wire bytes where known)."""
+
+    def __init__(self):
+        self.calls: Dict[str, Dict[str, int]] = {}
+
+    def record(self, op: str, decoded: int, wire: Optional[int] = None) -> None:
+        entry = self.calls.setdefault(op, {"calls": 0, "decoded_bytes": 0, "wire_bytes": 0, "wire_calls": 0})
+        entry["calls"] += 1
+        entry["decoded_bytes"] += decoded
+        if wire is not None:
+            entry["wire_bytes"] += wire
+            entry["wire_calls"] += 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for op, e in self.calls.items():
+            row = {"calls": e["calls"], "decoded_bytes": e["decoded_bytes"],
+                   "avg_decoded_bytes": e["decoded_bytes"] // max(1, e["calls"])}
+            if e["wire_bytes"]:
+                row["wire_bytes"] = e["wire_bytes"]
+                row["compression_ratio"] = round(e["wire_bytes"] / max(1, e["decoded_bytes"]), 3)
+            out[op] = row
+        return out
+
+
+payload_stats = PayloadStats()
+
+
+def _counted(op: str, request: Any, sink: Optional[List[int]] = None) -> Any:
+    """
+    Counts a googleapiclient request's response bytes as its JSON model receives them, in the
+    worker thread, instead of re-serializing the parsed result on the event loop.
+    With a sink, sizes are collected there so a whole batch is recorded as one call.
+    """
+    if settings.GMAIL_PAYLOAD_STATS:
+        postproc = request.postproc
+
+        def _postproc(resp, content):
+            size = len(content or b"")
+            if sink is None:
+                payload_stats.record(op, size)
+            else:
+                sink.append(size)
+            return postproc(resp, content)
+
+        request.postproc = _postproc
+    return request
+
+
+class DiscoveryTransport:
+    """Adapter over a googleapiclient Gmail service; blocking calls run in to_thread."""
+
+    name = "discovery"
+
+    def __init__(self, service: Any):
+        self.service = service
+
+    async def list_messages(self, **params) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("list_messages", self.service.users().messages().list(userId='me', **params)).execute())
+
+    async def get_message(self, msg_id: str, **params) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("get_message", self.service.users().messages().get(userId='me', id=msg_id, **params)).execute())
+
+    async def batch_get_messages(self, msg_ids: List[str], **params) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        def _run_batches():
+            responses: Dict[str, Any] = {}
+            failures: Dict[str, Exception] = {}
+
+            def _collect(request_id, response, exception):
+                if exception is not None:
+                    failures[request_id] = exception
+                else:
+                    responses[request_id] = response
+
+            for start in range(0, len(msg_ids), BATCH_MAX_REQUESTS):
+                batch = self.service.new_batch_http_request(callback=_collect)
+                sizes: List[int] = []
+                for m_id in msg_ids[start:start + BATCH_MAX_REQUESTS]:
+                    batch.add(_counted("batch_get_messages", self.service.users().messages().get(userId='me', id=m_id, **params), sizes),
+                              request_id=m_id)
+                batch.execute()
+                if sizes:
+                    payload_stats.record("batch_get_messages", sum(sizes))
+            return responses, failures
+
+        return await asyncio.to_thread(_run_batches)
+
+    async def send_message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("send_message", self.service.users().messages().send(userId='me', body=body)).execute())
+
+    async def trash_message(self, msg_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("trash_message", self.service.users().messages().trash(userId='me', id=msg_id)).execute())
+
+    async def untrash_message(self, msg_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("untrash_message", self.service.users().messages().untrash(userId='me', id=msg_id)).execute())
+
+    async def get_attachment(self, msg_id: str, attachment_id: str, **params) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("get_attachment", self.service.users().messages().attachments().get(
+            userId='me', messageId=msg_id, id=attachment_id, **params)).execute())
+
+    async def get_profile(self, **params) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("get_profile", self.service.users().getProfile(userId='me', **params)).execute())
+
+    async def list_history(self, **params) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("list_history", self.service.users().history().list(userId='me', **params)).execute())
+
+    async def watch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(lambda: _counted("watch", self.service.users().watch(userId='me', body=body)).execute())
+
+    async def stop(self) -> None:
+        await asyncio.to_thread(lambda: self.service.users().stop(userId='me').execute())
+
+
+class RestTransport:
+    """Native async Gmail REST client sharing one pooled httpx.AsyncClient per process."""
+
+    name = "rest"
+    _client: Optional[httpx.AsyncClient] = None
+
+    def __init__(self, access_token: str):
+        self.headers = {"Authorization": f"Bearer {access_token}", **GZIP_HEADERS}
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        """Returns the shared pooled client, creating it on first use."""
+        if cls._client is None or cls._client.is_closed:
+            limits = httpx.Limits(max_connections=settings.GMAIL_HTTP_MAX_CONNECTIONS,
+                                  max_keepalive_connections=settings.GMAIL_HTTP_MAX_CONNECTIONS)
+            timeout = httpx.Timeout(60.0, connect=10.0)
+            try:
+                cls._client = httpx.AsyncClient(http2=True, limits=limits, timeout=timeout)
+            except ImportError:
+                # 'h2' not installed: same pooling over HTTP/1.1 keep-alive connections
+                cls._client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return cls._client
+
+    @classmethod
+    async def aclose(cls) -> None:
+        if cls._client is not None and not cls._client.is_closed:
+            await cls._client.aclose()
+        cls._client = None
+
+    @staticmethod
+    def _raise_for_status(resp: httpx.Response) -> None:
+        if resp.status_code >= 400:
+            raise HttpError(httplib2.Response({"status": resp.status_code}), resp.content, uri=str(resp.request.url))
+
+    @staticmethod
+    def _record(op: str, resp: httpx.Response) -> None:
+        if settings.GMAIL_PAYLOAD_STATS:
+            payload_stats.record(op, len(resp.content), resp.num_bytes_downloaded)
+
+    async def _request(self, op: str, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                       body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+        resp = await self.client().request(method, f"{GMAIL_API_ROOT}{_API_PATH}{path}",
+                                           params=params, json=body, headers=self.headers)
+        self._raise_for_status(resp)
+        self._record(op, resp)
+        return resp.json() if resp.content else {}
+
+    async def list_messages(self, **params) -> Dict[str, Any]:
+        return await self._request("list_messages", "GET", "/messages", params=params)
+
+    async def get_message(self, msg_id: str, **params) -> Dict[str, Any]:
+        return await self._request("get_message", "GET", f"/messages/{msg_id}", params=params)
+
+    async def batch_get_messages(self, msg_ids: List[str], **params) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """Gmail multipart/mixed batch endpoint: up to BATCH_MAX_REQUESTS GETs per round trip."""
+        responses: Dict[str, Any] = {}
+        failures: Dict[str, Exception] = {}
+        query = str(httpx.QueryParams({k: v for k, v in params.items() if v is not None}))
+
+        for start in range(0, len(msg_ids), BATCH_MAX_REQUESTS):
+            chunk = msg_ids[start:start + BATCH_MAX_REQUESTS]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            body = "".join(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <{m_id}>\r\n\r\n"
+                f"GET {_API_PATH}/messages/{m_id}{'?' + query if query else ''}\r\n\r\n"
+                for m_id in chunk
+            ) + f"--{boundary}--\r\n"
+
+            resp = await self.client().post(_BATCH_URL, content=body.encode("utf-8"), headers={
+                **self.headers, "Content-Type": f"multipart/mixed; boundary={boundary}"})
+            self._raise_for_status(resp)
+            self._record("batch_get_messages", resp)
+
+            for m_id, status, payload in self._parse_batch(resp):
+                if status >= 400:
+                    failures[m_id] = HttpError(httplib2.Response({"status": status}), payload, uri=_BATCH_URL)
+                else:
+                    responses[m_id] = json.loads(payload) if payload else {}
+        return responses, failures
+
+    @staticmethod
+    def _parse_batch(resp: httpx.Response):
+        """Yields (content_id, status, json_body_bytes) for each part of a batch response."""
+        match = re.search(r'boundary="?([^";]+)"?', resp.headers.get("content-type", ""))
+        if not match:
+            raise ValueError("Batch response missing multipart boundary")
+        delimiter = b"--" + match.group(1).encode("ascii")
+        for part in resp.content.split(delimiter):
+            cid = _CONTENT_ID_RE.search(part)
+            status = _STATUS_LINE_RE.search(part)
+            if not cid or not status:
+                continue
+            # Inner HTTP response: status line + headers, blank line, JSON body
+            inner = part[status.start():]
+            sep = inner.find(b"\r\n\r\n")
+            payload = inner[sep + 4:].strip() if sep >= 0 else b""
+            yield cid.group(1).decode("utf-8"), int(status.group(1)), payload
+
+    async def send_message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("send_message", "POST", "/messages/send", body=body)
+
+    async def trash_message(self, msg_id: str) -> Dict[str, Any]:
+        return await self._request("trash_message", "POST", f"/messages/{msg_id}/trash")
+
+    async def untrash_message(self, msg_id: str) -> Dict[str, Any]:
+        return await self._request("untrash_message", "POST", f"/messages/{msg_id}/untrash")
+
+    async def get_attachment(self, msg_id: str, attachment_id: str, **params) -> Dict[str, Any]:
+        return await self._request("get_attachment", "GET", f"/messages/{msg_id}/attachments/{attachment_id}", params=params)
+
+    async def get_profile(self, **params) -> Dict[str, Any]:
+        return await self._request("get_profile", "GET", "/profile", params=params)
+
+    async def list_history(self, **params) -> Dict[str, Any]:
+        return await self._request("list_history", "GET", "/history", params=params)
+
+    async def watch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("watch", "POST", "/watch", body=body)
+
+    async def stop(self) -> None:
+        await self._request("stop", "POST", "/stop")
@@ -0,0 +1,122 @@
+import re
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+
+# Zero-network pre-classifier in front of AIEngine._groq_intent_router.
+# Only unambiguous messages are answered locally; anything uncertain returns None and
+# falls through to Groq, so a miss costs one regex pass (microseconds), never a wrong route.
+
+# Whole-message small talk (English + Roman Urdu), answered with a canned reply.
+# Bare acknowledgements ("ok", "theek hai", "great") are deliberately absent: after "Should I
+# forward it to Ali?" they are a confirmation, which only the context-aware Groq router can see.
+_CHITCHAT_RE = re.compile(
+    r"^(?:(?P<greet>hi+|hey+|hye|hello+|hi there|hello there|salam|salaam|aoa|"
+    r"assalam(?:u| o)? ?(?:alaikum|alaykum|o alaikum)|good (?:morning|afternoon|evening))"
+    r"|(?P<thanks>thanks?(?: a lot| so much)?|thank you(?: so much| very much)?|thx|tysm|"
+    r"shukriya|shukria|shukriyah|jazakallah(?: khair)?|meherbani)"
+    r"|(?P<bye>bye|goodbye|good night|see you|allah hafiz|khuda hafiz|take care)"
+    r"|(?P<howareyou>how are you(?: doing)?|how r u|kaise ho|kese ho|kaisay ho|kya haal hai|kia haal hai|kesay ho))"
+    r"[\s!.?\U0001F300-\U0001FAFF]*$",
+    re.I
+)
+
+# Explicit requests to recall or repeat the conversation itself
+_HISTORY_RE = re.compile(
+    r"\b(?:what did you (?:just )?(?:say|tell me|mean)|repeat (?:that|it|your last)|say (?:that|it) again|"
+    r"(?:your|the) (?:previous|last) (?:answer|message|reply|response)|earlier you (?:said|told)|"
+    r"you (?:just )?(?:said|told me|mentioned)|what were we (?:talking|discussing)|"
+    r"dobara (?:batao|bolo|bata do)|phir se (?:batao|bolo)|kya kaha tha|kia kaha tha|"
+    r"pehle kya (?:bataya|kaha)|abhi kya (?:kaha|bataya)|tumne kya kaha)\b",
+    re.I
+)
+
+# Vocabulary that only makes sense as a mailbox action; score >= threshold routes to Gemini
+_EMAIL_STRONG_RE = re.compile(
+    r"\b(?:e-?mails?|mails?|inbox|gmail|drafts?|attach(?:ment|ments|ed)?|forward|reply|replies|"
+    r"unread|trash|spam|subject|recipients?|cc|bcc|bhejo|bhej|bhejna|bhejdo|bheja|"
+    r"dhoond|dhundo|dhoondo|dhund|search|pdf|docx?|schedule)\b"
+    r"|[\w.+-]+@[\w-]+\.[\w.]+",
+    re.I
+)
+_EMAIL_WEAK_RE = re.compile(
+    r"\b(?:send|sent|received|aayi|aai|ayi|aaya|file|files|read|parho|summari[sz]e|check|"
+    r"latest|last \d+|from|sender|message|messages|link|report)\b",
+    re.I
+)
+
+_URDU_MARKERS_RE = re.compile(r"\b(?:salam|salaam|aoa|assalam|shukriya|shukria|jazakallah|meherbani|theek|thik|acha|accha|allah hafiz|khuda hafiz|kaise|kese|kaisay|kesay|haal)\b", re.I)
+
+_REPLIES = {
+    "greet":     ("Hello! I am your Smart Email Assistant. How can I help you manage your inbox today?",
+                  "Wa Alaikum Assalam! Apko inbox mein kya madad chahiye?"),
+    "thanks":    ("You're welcome! Anything else I can help with in your inbox?",
+                  "Koi baat nahi! Inbox mein aur kya madad chahiye?"),
+    "bye":       ("Goodbye! I'll keep an eye on your inbox.",
+                  "Allah Hafiz! Main aapke inbox par nazar rakhunga."),
+    "howareyou": ("I'm doing great! How can I help with your emails today?",
+                  "Main theek hoon! Apko inbox mein kya madad chahiye?"),
+}
+
+
+class IntentPreClassifier:
+    def __init__(self):
+        self.local_hits: Dict[str, int] = {"CHITCHAT": 0, "HISTORY_RECALL": 0, "EMAIL_ACTION": 0}
+        self.deferred = 0
+        self.total_seconds = 0.0
+
+    @staticmethod
+    def email_score(message: str) -> int:
+        return 2 * len(_EMAIL_STRONG_RE.findall(message)) + len(_EMAIL_WEAK_RE.findall(message))
+
+    def predict(self, message: str, previous_reply: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns a router-shaped dict ({"intent", ["response"]}) for high-confidence messages,
+        or None when the message should go to the Groq router.
+        previous_reply is the assistant's last message; small talk answering a question is deferred.
+        """
+        text = message.strip()
+        if not text:
+            return None
+
+        chitchat = _CHITCHAT_RE.match(text)
+        if chitchat and previous_reply and previous_reply.rstrip(" \n*_").endswith("?"):
+            return None
+        if chitchat:
+            kind = chitchat.lastgroup
+            english, urdu = _REPLIES[kind]
+            return {"intent": "CHITCHAT", "response": urdu if _URDU_MARKERS_RE.search(text) else english}
+
+        score = self.email_score(text)
+        if _HISTORY_RE.search(text):
+            # "What did you say about Ali's email?" mixes both intents: let Groq decide
+            return {"intent": "HISTORY_RECALL"} if score == 0 else None
+
+        if score >= settings.INTENT_PRECLASSIFIER_MIN_SCORE:
+            return {"intent": "EMAIL_ACTION"}
+        return None
+
+    def classify(self, message: str, previous_reply: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """predict() plus hit/deferral accounting for /admin/cache-stats."""
+        started = time.perf_counter()
+        route = self.predict(message, previous_reply)
+        self.total_seconds += time.perf_counter() - started
+        if route is None:
+            self.deferred += 1
+        else:
+            self.local_hits[route["intent"]] += 1
+        return route
+
+    def stats(self) -> Dict[str, Any]:
+        answered = sum(self.local_hits.values())
+        total = answered + self.deferred
+        return {
+            "local": dict(self.local_hits),
+            "deferred_to_groq": self.deferred,
+            "local_rate": round(answered / total, 3) if total else 0.0,
+            "avg_us": round(self.total_seconds / total * 1e6, 1) if total else 0.0,
+        }
+
+
+intent_classifier = IntentPreClassifier()
@@ -0,0 +1,73 @@
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from cachetools import LRUCache
+
+from config import settings
+
+# Groq-compressed search results, cached at two levels:
+#   item: (message id, content hash) -> that email's one-line summary
+#   set:  hash of the item keys of a whole result set -> the merged summary
+# A result set with one new email reuses every other line and only sends the delta to Groq.
+# Keys hash the exact fields sent for summarization, so an edited body never reuses a stale line.
+
+
+class SearchSummaryCache:
+    def __init__(self):
+        self.items: LRUCache = LRUCache(maxsize=settings.SUMMARY_CACHE_SIZE)
+        self.sets: LRUCache = LRUCache(maxsize=max(1, settings.SUMMARY_CACHE_SIZE // 4))
+        self.set_hits = 0
+        self.item_hits = 0
+        self.items_summarized = 0
+        self.groq_calls = 0
+        self.groq_calls_saved = 0
+
+    @staticmethod
+    def item_key(email: Dict[str, Any]) -> str:
+        body = json.dumps(email, sort_keys=True, ensure_ascii=False)
+        return f"{email.get('Message ID', '')}:{hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]}"
+
+    @staticmethod
+    def set_key(item_keys: List[str]) -> str:
+        return hashlib.sha256("\n".join(sorted(item_keys)).encode("utf-8")).hexdigest()
+
+    def get_set(self, key: str) -> Optional[str]:
+        if not settings.SUMMARY_CACHE_ENABLED:
+            return None
+        summary = self.sets.get(key)
+        if summary is not None:
+            self.set_hits += 1
+            self.groq_calls_saved += 1
+        return summary
+
+    def put_set(self, key: str, summary: str) -> None:
+        if settings.SUMMARY_CACHE_ENABLED:
+            self.sets[key] = summary
+
+    def get_items(self, keys: List[str]) -> Dict[str, str]:
+        if not settings.SUMMARY_CACHE_ENABLED:
+            return {}
+        found = {k: self.items[k] for k in keys if k in self.items}
+        self.item_hits += len(found)
+        return found
+
+    def put_items(self, lines: Dict[str, str]) -> None:
+        if settings.SUMMARY_CACHE_ENABLED:
+            self.items.update(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "set_hits": self.set_hits,
+            "item_hits": self.item_hits,
+            "items_summarized": self.items_summarized,
+            "item_reuse_rate": round(self.item_hits / (self.item_hits + self.items_summarized), 3)
+                               if self.item_hits + self.items_summarized else 0.0,
+            "groq_calls": self.groq_calls,
+            "groq_calls_saved": self.groq_calls_saved,
+            "cached_items": len(self.items),
+            "cached_sets": len(self.sets),
+        }
+
+
+summary_cache = SearchSummaryCache()
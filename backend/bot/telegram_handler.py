@@ -40,6 +40,8 @@ from bot.ai_engine import ai_engine
 from bot.gmail_client import GmailClient
 from bot.voice_handler import voice_handler
 from db.contacts import contact_manager
+from db.mailstore import mail_store
+from utils.http_pool import http_pool
 
 logging.basicConfig(level=logging.INFO)
 # Hide spammy API logs
@@ -333,6 +335,11 @@ class TelegramBotManager:
         self.current_queries:   dict = {}   # uid -> last search query string
         self._mid_cache:        dict = {}   # short_id[:16] -> full Gmail message ID
         self.notified_emails:    set = set()
+        self.history_ids:       dict = {}   # uid -> Gmail historyId watermark (mirrors users.gmail_history_id)
+        self.watch_expirations: dict = {}   # uid -> users.watch expiration (epoch ms)
+        self.watch_emails:      dict = {}   # lowercased Gmail address -> uid, for routing push messages
+        self.last_synced:       dict = {}   # uid -> epoch seconds of the last inbox sync (push or poll)
+        self.sync_locks:        dict = {}   # uid -> asyncio.Lock serialising push and poll syncs
         self.active_voice_tasks: set = set()
         self.ram_semaphore = asyncio.BoundedSemaphore(value=3)
         
@@ -446,6 +453,26 @@ class TelegramBotManager:
             else:
                 logger.debug(f"_edit error execution: {e}")
 
+    def _stream_editor(self, msg_obj):
+        """
+        Throttled progressive editor for a streaming AI reply. Edits the placeholder at most once
+        per TELEGRAM_STREAM_EDIT_INTERVAL and only when enough new text has arrived, keeping well
+        under the Bot API edit rate limit. Partials are sent as plain text (an unfinished reply can
+        hold unbalanced Markdown); _dispatch_ai performs the final formatted edit.
+        """
+        state = {"at": 0.0, "text": ""}
+
+        async def on_partial(text: str):
+            now = time.monotonic()
+            if now - state["at"] < settings.TELEGRAM_STREAM_EDIT_INTERVAL:
+                return
+            if state["text"] and len(text) - len(state["text"]) < settings.TELEGRAM_STREAM_MIN_DELTA:
+                return
+            state["at"], state["text"] = now, text
+            await self._edit(msg_obj, text[:4000] + " ▌", parse_mode=None)
+
+        return on_partial
+
     # ── True Dynamic Navigation Stack ──────────────────────────────────────────
 
     def _push_history(self, uid: int, state: str):
@@ -489,7 +516,9 @@ class TelegramBotManager:
         text  = "⚠️ Your Google session has expired or been revoked. Please use reconnect through button. "
         markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔗 Reconnect", url=url)]])
         try:
-            await context.bot.send_message(chat_id=uid, text=text, parse_mode="Markdown", reply_markup=markup)
+            # Accepts a job context or a bare Bot (push-triggered syncs have no job context)
+            bot = getattr(context, "bot", context)
+            await bot.send_message(chat_id=uid, text=text, parse_mode="Markdown", reply_markup=markup)
         except Exception:
             pass
 
@@ -498,6 +527,7 @@ class TelegramBotManager:
         # 1. Clear stale conversational and historical context limits immediately
         self.ai_engine.clear_chat_session(uid)
         self._clear_history(uid)
+        self.history_ids.pop(uid, None)  # watermark belongs to the previous account (DB column cleared by the callback)
         
         # 2. Retrieve verified address details
         user = await self.db.get_user(uid)
@@ -618,6 +648,9 @@ class TelegramBotManager:
             self.application.job_queue.run_repeating(self.job_emails,    interval=60,  first=15)
             self.application.job_queue.run_repeating(self.job_scheduled, interval=60,  first=30)
             self.application.job_queue.run_repeating(self.job_ping,      interval=840, first=60)
+            self.application.job_queue.run_repeating(self.job_token_refresh, interval=settings.OAUTH_REFRESH_INTERVAL, first=45)
+            if settings.GMAIL_PUBSUB_TOPIC:
+                self.application.job_queue.run_repeating(self.job_watch_renewal, interval=settings.GMAIL_WATCH_RENEW_INTERVAL, first=20)
             
         base_url = settings.WEBHOOK_URL or settings.APP_URL
         webhook_url = ""
@@ -711,33 +744,31 @@ class TelegramBotManager:
 
     # ── Email list ─────────────────────────────────────────────────────────────
 
-    async def _show_list(self, msg_obj, uid: int, offset: int, is_search: bool):
+    async def _show_list(self, msg_obj, uid: int, offset: int, is_search: bool, refresh: bool = False):
         query = self.current_queries.get(uid, "is:unread") if is_search else "label:INBOX"
         prefs = await self._prefs(uid)
         limit = prefs.get("pagination_limit", 2)
         try:
-            messages = await self.gmail.get_emails(uid, query=query, max_results=offset + limit + 1)
-            if messages == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+            # Cursor-cached result set: page turns reuse earlier IDs and rows
+            page = await self.gmail.get_email_page(uid, query, offset, limit, refresh=refresh)
+            if page == "TOKEN_EXPIRED_REAUTH_REQUIRED":
                 return await self._prompt_reauth(msg_obj, uid)
         except Exception:
-            messages = []
+            page = {"rows": [], "has_next": False}
 
-        if not messages and offset == 0:
+        display  = page["rows"]
+        has_next = page["has_next"]
+        if not display and offset == 0:
             lbl = f"📭 No results for: `{_safe_md(query)}`" if is_search else "📭 Your inbox is empty."
             await self._edit(msg_obj, lbl, InlineKeyboardMarkup([kb_back_step()]))
             return
 
-        display  = messages[offset:offset + limit]
-        has_next = len(messages) > offset + limit
         header   = f"🔍 *Results:* `{_safe_md(query)}`\n\n" if is_search else "📥 *Your Inbox*\n\n"
         lines    = [header]
 
-        for i, m in enumerate(display):
-            self._store_mid(m["id"])
-            meta = await self.gmail.get_email_metadata(uid, m["id"])
-            if meta == "TOKEN_EXPIRED_REAUTH_REQUIRED":
-                return await self._prompt_reauth(msg_obj, uid)
-            if not meta or "error" in meta:
+        for i, meta in enumerate(display):
+            self._store_mid(meta["id"])
+            if "sender" not in meta:
                 continue
                 
             raw_sender = meta.get("sender", "Unknown")
@@ -764,23 +795,19 @@ class TelegramBotManager:
 
         full_mid = self._full_mid(mid_short)
         
-        details = await self.gmail.get_email_details(uid, full_mid)
-        if details == "TOKEN_EXPIRED_REAUTH_REQUIRED":
-            msg_target = getattr(msg_or_query, 'message', msg_or_query)
-            return await self._prompt_reauth(msg_target, uid)
-            
-        meta = await self.gmail.get_email_metadata(uid, full_mid)
+        # One format=full fetch feeds this card and the Summary/TTS/Read-Full screens behind it
+        meta = await self.gmail.get_message_view(uid, full_mid)
         if meta == "TOKEN_EXPIRED_REAUTH_REQUIRED":
             msg_target = getattr(msg_or_query, 'message', msg_or_query)
             return await self._prompt_reauth(msg_target, uid)
 
-        if not details or not meta or (isinstance(meta, dict) and "error" in meta):
+        if not meta:
             await self._edit(msg_or_query, "❌ *Email not found.* It may have been deleted.", markup=InlineKeyboardMarkup([kb_back_step()]))
             return
             
         self._store_mid(meta.get("id", full_mid))
 
-        body         = details.get("body", "") if details else ""
+        body         = meta.get("body", "")
         # Strip email footers (disclaimers, signatures) before display
         body         = _strip_email_footer(body)
         safe_body    = _esc_html(body[:3500] + ("\n\n<i>[… Truncated — tap Read Full Email for complete text]</i>" if len(body) > 3500 else ""))
@@ -915,7 +942,7 @@ class TelegramBotManager:
                     await update.message.reply_text("❌ *Could not find that timezone.* Please try typing a major city (e.g. 'London', 'Karachi', 'New York') or send a Location pin.", parse_mode="Markdown")
                 return
                     
-                await self._show_list(wait, uid, offset=0, is_search=True)
+                await self._show_list(wait, uid, offset=0, is_search=True, refresh=True)
                 return
 
             if not acc["user"].get("ai_allowed", True):
@@ -936,7 +963,7 @@ class TelegramBotManager:
             # Cache query so the [🔄 Retry] button can re-submit it after a failure
             self.last_user_queries[uid] = {"type": "text", "content": text}
 
-            raw = await self.ai_engine.agent_chat(text, uid)
+            raw = await self.ai_engine.agent_chat(text, uid, on_partial=self._stream_editor(msg))
             await self._dispatch_ai(update, context, msg, raw, uid, await self._prefs(uid))
             # Log conversation asynchronously in the background — does NOT block the response
             self._bg(self.memory.log_conversation(
@@ -1220,7 +1247,7 @@ class TelegramBotManager:
             search_data = self.ai_engine.pending_searches.pop(uid, {})
             query_str = search_data.get("query", self.current_queries.get(uid, "label:INBOX"))
             self.current_queries[uid] = query_str
-            await self._show_list(msg_obj, uid, offset=0, is_search=True)
+            await self._show_list(msg_obj, uid, offset=0, is_search=True, refresh=True)
             return
             
         # If it was a natural text query that happened to use search in the background, clear the queue without UI interruption.
@@ -1549,7 +1576,8 @@ class TelegramBotManager:
                 offset = int(args[0]) if args else 0
             except (ValueError, IndexError):
                 offset = 0
-            await self._show_list(query.message, uid, offset, is_search=False)
+            # Opening the inbox from a menu (no offset) restarts the cursor; page turns reuse it
+            await self._show_list(query.message, uid, offset, is_search=False, refresh=not args)
             return
 
         if action == "srpage":
@@ -1973,8 +2001,14 @@ class TelegramBotManager:
             await self.db.db.run(lambda: self.db.db.client.table("users")
                                   .update({"auth_token": None})
                                   .eq("telegram_id", uid).execute())
+            if uid in self.watch_expirations:
+                await self.gmail.stop_watch(uid)
             self.gmail.clear_cache(uid)
             self.gmail.clear_user_attachments(uid)
+            await mail_store.drop_user(uid)
+            self.history_ids.pop(uid, None)
+            await self.db.set_gmail_history_id(uid, None)
+            self.watch_expirations.pop(uid, None)
             self.compose_states.pop(uid, None)
             await self._edit(query, 
                 "✅ *Logged out.*\nSend /start to reconnect your Google account.",
@@ -2150,16 +2184,17 @@ class TelegramBotManager:
         await self._edit(query, "⏳ *Retrieving full HTML layout...*", parse_mode="Markdown")
         full_mid = self._full_mid(mid_short)
 
-        html_body = await self.gmail.get_email_html(uid, full_mid)
-        if html_body == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+        meta = await self.gmail.get_message_view(uid, full_mid)
+        if meta == "TOKEN_EXPIRED_REAUTH_REQUIRED":
             return await self._prompt_reauth(query.message, uid)
 
+        # Fallback to plain text body if HTML is not found
+        html_body = (meta.get("html") or meta.get("body")) if meta else None
         if not html_body:
             await self._edit(query, "❌ *Failed to fetch full email HTML.*", parse_mode="Markdown", reply_markup=InlineKeyboardMarkup([kb_back_step()]))
             return
 
-        meta = await self.gmail.get_email_metadata(uid, full_mid)
-        subject = meta.get("subject", "email") if isinstance(meta, dict) else "email"
+        subject = meta.get("subject", "email")
 
         # Sanitize filename
         safe_filename = re.sub(r'[\\/*?:"<>|]', "", subject).strip()
@@ -2213,15 +2248,11 @@ class TelegramBotManager:
 
         full_mid = self._full_mid(mid_short)
 
-        details = await self.gmail.get_email_details(uid, full_mid)
-        if details == "TOKEN_EXPIRED_REAUTH_REQUIRED":
-            return await self._prompt_reauth(query.message, uid)
-
-        meta = await self.gmail.get_email_metadata(uid, full_mid)
+        meta = await self.gmail.get_message_view(uid, full_mid)
         if meta == "TOKEN_EXPIRED_REAUTH_REQUIRED":
             return await self._prompt_reauth(query.message, uid)
 
-        if not details or not meta or (isinstance(meta, dict) and "error" in meta):
+        if not meta:
             err_text = "❌ *Email not found.* It may have been deleted."
             if loading_msg:
                 try:
@@ -2230,7 +2261,7 @@ class TelegramBotManager:
                     await context.bot.send_message(chat_id=uid, text=err_text, parse_mode="Markdown")
             return
 
-        body = details.get("body", "") if details else ""
+        body = meta.get("body", "")[:4000]
         # Use the token-efficient direct summarize call
         sum_text = await self.ai_engine.summarize_email(body)
 
@@ -2267,19 +2298,15 @@ class TelegramBotManager:
         await context.bot.send_chat_action(chat_id=uid, action=ChatAction.RECORD_VOICE)
 
         full_mid = self._full_mid(mid_short)
-        details = await self.gmail.get_email_details(uid, full_mid)
-        if details == "TOKEN_EXPIRED_REAUTH_REQUIRED":
-            return await self._prompt_reauth(query.message, uid)
-            
-        meta = await self.gmail.get_email_metadata(uid, full_mid)
+        meta = await self.gmail.get_message_view(uid, full_mid)
         if meta == "TOKEN_EXPIRED_REAUTH_REQUIRED":
             return await self._prompt_reauth(query.message, uid)
 
-        if not details or not meta or (isinstance(meta, dict) and "error" in meta):
+        if not meta:
             await self._edit(query, "❌ *Email not found.* It may have been deleted.", parse_mode="Markdown", reply_markup=InlineKeyboardMarkup([kb_back_step()]))
             return
 
-        body = details.get("body", "") if details else ""
+        body = meta.get("body", "")[:4000]
         # Use the token-efficient TTS summary call — avoids polluting chat history
         # and skips tool-setup tokens. Returns clean text ready for TTS with no markdown.
         clean_tts = await self.ai_engine.summarize_email(body)
@@ -2337,7 +2364,7 @@ class TelegramBotManager:
         back_kb  = InlineKeyboardMarkup([kb_nav_for_ctx(ctx)])
 
         try:
-            meta = await self.gmail.get_email_metadata(uid, full_mid)
+            meta = await self.gmail.get_message_view(uid, full_mid)
             if meta == "TOKEN_EXPIRED_REAUTH_REQUIRED":
                 return await self._prompt_reauth(query.message, uid)
             if len(meta.get("attachments", [])) > 10:
@@ -2388,13 +2415,158 @@ class TelegramBotManager:
     # ── Background Jobs ────────────────────────────────────────────────────────
 
     async def job_ping(self, context: ContextTypes.DEFAULT_TYPE):
-        import httpx
         try:
-            async with httpx.AsyncClient(timeout=10) as c:
-                await c.get(f"{settings.APP_URL}/health")
+            await http_pool.get(f"{settings.APP_URL}/health", timeout=10, retries=0)
         except Exception:
             pass
 
+    async def job_token_refresh(self, context: ContextTypes.DEFAULT_TYPE):
+        """Refreshes OAuth tokens ahead of expiry so user requests never wait on Google's token endpoint."""
+        try:
+            refreshed = await self.gmail.refresh_expiring_tokens()
+            if refreshed:
+                logger.info(f"Background refresher renewed {refreshed} OAuth token(s).")
+        except Exception as e:
+            logger.error(f"job_token_refresh error: {e}")
+
+    async def _fetch_new_emails(self, uid: int) -> object:
+        """
+        Returns the unread emails to consider for notification on this tick.
+        Incremental mode walks the Gmail History API from the persisted historyId watermark,
+        so a restart resumes from the last tick instead of re-notifying the whole inbox.
+        """
+        if not settings.GMAIL_INCREMENTAL_SYNC:
+            return await self.gmail.get_unread_emails(uid, limit=10)
+
+        if uid not in self.history_ids:
+            self.history_ids[uid] = await self.db.get_gmail_history_id(uid)
+        start_id = self.history_ids.get(uid)
+
+        result = await self.gmail.sync_unread_emails(uid, start_id, limit=10)
+        if result == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+            return result
+        if not result:
+            return []
+
+        new_id = result.get("history_id")
+        if new_id and new_id != start_id:
+            self.history_ids[uid] = new_id
+            await self.db.set_gmail_history_id(uid, new_id)
+
+        emails = result.get("emails", [])
+        if result.get("full_resync"):
+            # Watermark expired: only surface mail that arrived after this process started
+            cutoff_ms = int(self.startup_time * 1000)
+            emails = [e for e in emails if e.get("internal_date", 0) >= cutoff_ms]
+        return emails
+
+    def _watch_active(self, uid: int) -> bool:
+        return self.watch_expirations.get(uid, 0) > time.time() * 1000
+
+    async def _notify_new_emails(self, bot, uid: int):
+        """Syncs one inbox and sends a notification for every unseen unread email."""
+        lock = self.sync_locks.setdefault(uid, asyncio.Lock())
+        async with lock:
+            self.last_synced[uid] = time.time()
+            emails = await self._fetch_new_emails(uid)
+
+            if emails == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+                await self._send_reauth_direct(bot, uid)
+                return
+
+            if not isinstance(emails, list):
+                return
+
+            for email_item in emails:
+                mid = email_item["id"]
+                if mid in self.notified_emails:
+                    continue
+                self.notified_emails.add(mid)
+                self._store_mid(mid)
+
+                meta = await self.gmail.get_email_metadata(uid, mid)
+                if not meta or meta == "TOKEN_EXPIRED_REAUTH_REQUIRED" or "error" in meta:
+                    continue
+
+                raw_sender = meta.get("sender", "Unknown")
+                name, email = _parse_sender_header(raw_sender)
+                if email:
+                    sender_formatted = f"👤 *From:* *{_safe_md(name)}* `({_safe_md(email)})`"
+                else:
+                    sender_formatted = f"👤 *From:* *{_safe_md(name)}*"
+                subject = _safe_md(meta.get("subject", "No Subject"))
+                att_ct  = len(meta.get("attachments", []))
+                att_line = f"\n📎 *{att_ct} Attachment(s) Found*" if att_ct else ""
+
+                text = (
+                    f"📩 *New Email Received*\n"
+                    f"━━━━━━━━━━━━━━━━━━\n"
+                    f"{sender_formatted}\n"
+                    f"📝 *Subject:* _{subject}_"
+                    f"{att_line}"
+                )
+
+                try:
+                    await self.db.db.run(
+                        lambda u=uid, m=mid, s=meta.get("sender", ""), sub=meta.get("subject", ""):
+                        self.db.db.client.table("email_cache").upsert(
+                            {"telegram_id": u, "gmail_message_id": m,
+                             "sender": s, "subject": sub, "preview": "new"},
+                            on_conflict="telegram_id,gmail_message_id"
+                        ).execute()
+                    )
+                except Exception:
+                    pass
+
+                await bot.send_message(
+                    chat_id=uid, text=text, parse_mode="Markdown",
+                    reply_markup=kb_notification(mid, bool(att_ct)))
+
+    async def handle_gmail_push(self, email_address: str, history_id: str):
+        """
+        Entry point for Gmail Pub/Sub push messages ({emailAddress, historyId}).
+        Resolves the mailbox owner and runs the same incremental sync the poller uses.
+        """
+        if not self.application:
+            return
+        email_address = (email_address or "").lower()
+        uid = self.watch_emails.get(email_address)
+        if uid is None:
+            user = await self.db.get_user_by_email(email_address)
+            if not user:
+                logger.info(f"Gmail push for unknown mailbox {email_address}; ignoring.")
+                return
+            uid = user["telegram_id"]
+            self.watch_emails[email_address] = uid
+
+        active = {u["telegram_id"] for u in await self.db.get_active_auto_check_users()}
+        if uid not in active:
+            return
+
+        known = self.history_ids.get(uid)
+        if known and history_id and str(history_id).isdigit() and str(known).isdigit() and int(history_id) <= int(known):
+            # Already covered by a previous sync (Pub/Sub delivers at-least-once)
+            return
+
+        async with self.ram_semaphore:
+            await self._notify_new_emails(self.application.bot, uid)
+
+    async def job_watch_renewal(self, context: ContextTypes.DEFAULT_TYPE):
+        """Registers and renews users.watch for every auto-check user; polling remains the fallback."""
+        users = await self.db.get_active_auto_check_users()
+        for user in users:
+            uid = user["telegram_id"]
+            try:
+                result = await self.gmail.start_watch(uid)
+                if not result or result == "TOKEN_EXPIRED_REAUTH_REQUIRED":
+                    self.watch_expirations.pop(uid, None)
+                    continue
+                self.watch_expirations[uid] = result["expiration"]
+                if result["email"]:
+                    self.watch_emails[result["email"]] = uid
+            except Exception as e:
+                logger.error(f"job_watch_renewal error for user {uid}: {e}")
+
     async def job_emails(self, context: ContextTypes.DEFAULT_TYPE):
         async with self.ram_semaphore:
             max_retries = 3
@@ -2403,69 +2575,12 @@ class TelegramBotManager:
                     users = await self.db.get_active_auto_check_users()
                     for user in users:
                         uid = user["telegram_id"]
-                        emails = await self.gmail.get_unread_emails(uid, limit=10)
-                        
-                        if emails == "TOKEN_EXPIRED_REAUTH_REQUIRED":
-                            await self._send_reauth_direct(context, uid)
+                        if self._watch_active(uid) and time.time() - self.last_synced.get(uid, 0) < settings.GMAIL_WATCH_FALLBACK_POLL:
+                            # Push keeps this inbox current; only run the periodic safety poll
                             continue
-                            
-                        if not isinstance(emails, list):
-                            continue
-
-                        for email_item in emails:
-                            mid = email_item["id"]
-                            if mid in self.notified_emails:
-                                continue
-                            self.notified_emails.add(mid)
-                            self._store_mid(mid)
-
-                            meta = await self.gmail.get_email_metadata(uid, mid)
-                            if not meta or meta == "TOKEN_EXPIRED_REAUTH_REQUIRED" or "error" in meta:
-                                continue
+                        await self._notify_new_emails(context.bot, uid)
 
-                            raw_sender = meta.get("sender", "Unknown")
-                            name, email = _parse_sender_header(raw_sender)
-                            if email:
-                                sender_formatted = f"👤 *From:* *{_safe_md(name)}* `({_safe_md(email)})`"
-                            else:
-                                sender_formatted = f"👤 *From:* *{_safe_md(name)}*"
-                            subject = _safe_md(meta.get("subject", "No Subject"))
-                            att_ct  = len(meta.get("attachments", []))
-                            att_line = f"\n📎 *{att_ct} Attachment(s) Found*" if att_ct else ""
-
-                            text = (
-                                f"📩 *New Email Received*\n"
-                                f"━━━━━━━━━━━━━━━━━━\n"
-                                f"{sender_formatted}\n"
-                                f"📝 *Subject:* _{subject}_"
-                                f"{att_line}"
-                            )
-
-                            try:
-                                await self.db.db.run(
-                                    lambda u=uid, m=mid, s=meta.get("sender", ""), sub=meta.get("subject", ""):
-                                    self.db.db.client.table("email_cache").upsert(
-                                        {"telegram_id": u, "gmail_message_id": m,
-                                         "sender": s, "subject": sub, "preview": "new"},
-                                        on_conflict="telegram_id,gmail_message_id"
-                                    ).execute()
-                                )
-                            except Exception:
-                                pass
-
-                            await context.bot.send_message(
-                                chat_id=uid, text=text, parse_mode="Markdown",
-                                reply_markup=kb_notification(mid, bool(att_ct)))
-                    
                     # Explicit memory purge
-                    try:
-                        del emails
-                    except NameError:
-                        pass
-                    try:
-                        del meta
-                    except NameError:
-                        pass
                     try:
                         del users
                     except NameError:
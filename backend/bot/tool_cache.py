@@ -0,0 +1,91 @@
+import json
+import itertools
+import contextvars
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+from config import settings
+
+# Agent turn that is currently executing tools; lets hits be split into same-turn
+# retries (the model re-issuing a call) and cross-turn follow-ups / Retry-button replays.
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("tool_cache_turn", default=0)
+_turn_ids = itertools.count(1)
+
+
+class ToolResultCache:
+    """
+    Short-lived memo of read-only agent tool results, keyed by (user, tool, normalized args).
+    Entries carry the turn that produced them. Any mailbox or address-book mutation for a user
+    (trash/untrash, contact saves, newly synced mail) drops all of that user's entries.
+    Empty outcomes live in a separate short-TTL cache so a "nothing found" cannot outlast new mail.
+    """
+
+    def __init__(self):
+        self._entries: TTLCache = TTLCache(maxsize=settings.TOOL_CACHE_SIZE, ttl=settings.TOOL_CACHE_TTL)
+        self._empty: TTLCache = TTLCache(maxsize=max(1, settings.TOOL_CACHE_SIZE // 4), ttl=settings.TOOL_CACHE_EMPTY_TTL)
+        self.hits: Dict[str, Dict[str, int]] = {}
+        self.misses: Dict[str, int] = {}
+        self.invalidations: Dict[str, int] = {}
+
+    @staticmethod
+    def begin_turn() -> int:
+        """Marks the start of an agent turn in the current context (tool tasks inherit it)."""
+        turn = next(_turn_ids)
+        _current_turn.set(turn)
+        return turn
+
+    @staticmethod
+    def current_turn() -> int:
+        """Agent turn executing in the current context (0 outside an agent turn)."""
+        return _current_turn.get()
+
+    @staticmethod
+    def key(user_id: int, tool: str, args: Dict[str, Any]) -> Tuple[int, str, str]:
+        return (user_id, tool, json.dumps(args, sort_keys=True, default=str))
+
+    def get(self, user_id: int, tool: str, args: Dict[str, Any]) -> Optional[Any]:
+        if not settings.TOOL_CACHE_ENABLED:
+            return None
+        k = self.key(user_id, tool, args)
+        entry = self._entries.get(k) or self._empty.get(k)
+        if entry is None:
+            self.misses[tool] = self.misses.get(tool, 0) + 1
+            return None
+        turn, value = entry
+        scope = "same_turn" if turn == _current_turn.get() else "cross_turn"
+        counts = self.hits.setdefault(tool, {"same_turn": 0, "cross_turn": 0})
+        counts[scope] += 1
+        return value
+
+    def put(self, user_id: int, tool: str, args: Dict[str, Any], value: Any, empty: bool = False) -> None:
+        if settings.TOOL_CACHE_ENABLED and (not empty or settings.TOOL_CACHE_EMPTY_TTL > 0):
+            store = self._empty if empty else self._entries
+            store[self.key(user_id, tool, args)] = (_current_turn.get(), value)
+
+    def invalidate_user(self, user_id: int, reason: str) -> None:
+        stale = 0
+        for store in (self._entries, self._empty):
+            keys = [k for k in list(store.keys()) if k[0] == user_id]
+            for k in keys:
+                store.pop(k, None)
+            stale += len(keys)
+        if stale:
+            self.invalidations[reason] = self.invalidations.get(reason, 0) + stale
+
+    def stats(self) -> Dict[str, Any]:
+        tools = set(self.hits) | set(self.misses)
+        per_tool = {}
+        for tool in sorted(tools):
+            hits = self.hits.get(tool, {"same_turn": 0, "cross_turn": 0})
+            total = hits["same_turn"] + hits["cross_turn"] + self.misses.get(tool, 0)
+            per_tool[tool] = {
+                **hits,
+                "misses": self.misses.get(tool, 0),
+                "hit_rate": round((hits["same_turn"] + hits["cross_turn"]) / total, 3) if total else 0.0,
+            }
+        return {"entries": len(self._entries), "empty_entries": len(self._empty), "tools": per_tool,
+                "invalidated": dict(self.invalidations)}
+
+
+tool_cache = ToolResultCache()
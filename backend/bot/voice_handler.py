@@ -19,6 +19,7 @@ from pathlib import Path
 from typing import Dict, Optional
 from config import settings
 from db.models import db_manager
+from utils.http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -87,17 +88,16 @@ class VoiceHandler:
                 }
 
                 # Asynchronous API request to Groq infrastructure
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(url, headers=headers, files=files, data=data)
-                    
-                    # Raise exception for HTTP error statuses (e.g., 401, 429, 500)
-                    response.raise_for_status()
-                    
-                    result = response.json()
-                    transcribed_text = result.get("text", "").strip()
-                    
-                    logger.info("Successfully transcribed voice note via Groq Whisper.")
-                    return transcribed_text
+                response = await http_pool.post(url, headers=headers, files=files, data=data, timeout=30.0, retries=0)
+
+                # Raise exception for HTTP error statuses (e.g., 401, 429, 500)
+                response.raise_for_status()
+
+                result = response.json()
+                transcribed_text = result.get("text", "").strip()
+
+                logger.info("Successfully transcribed voice note via Groq Whisper.")
+                return transcribed_text
 
         except httpx.HTTPStatusError as http_err:
             logger.error(f"Groq API HTTP error occurred: {http_err.response.text}")
@@ -1,4 +1,5 @@
 from datetime import datetime
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -39,9 +40,95 @@ class Settings(BaseSettings):
     MAX_CONTEXT_MESSAGES: int = 5
     SUMMARY_GENERATION_THRESHOLD: int = 10
     GEMINI_MODEL: str = "gemini-2.5-flash"
+
+    # --- GMAIL CLIENT TUNING ---
+    GMAIL_SERVICE_CACHE_SIZE: int = 256
+    GMAIL_INCREMENTAL_SYNC: bool = True
+    GMAIL_MESSAGE_CACHE_BYTES: int = 32 * 1024 * 1024   # parsed message views (text + full HTML) kept across email screens
+    GMAIL_MESSAGE_CACHE_TTL: int = 600
+    GMAIL_FETCH_CONCURRENCY: int = 5             # concurrent messages.get per user (5 quota units each)
+    GMAIL_LISTING_CACHE_SIZE: int = 256          # cached (user, query) result sets behind the paged list screens
+    GMAIL_LISTING_CACHE_TTL: int = 300
+    GMAIL_LISTING_PAGE_SIZE: int = 20             # IDs pulled per Gmail list call when a list screen runs past the cache
+    GMAIL_ATTACHMENT_BYTE_BUDGET: int = 48 * 1024 * 1024   # attachment bytes downloading at once, process-wide
+    GMAIL_RESUMABLE_UPLOAD_THRESHOLD: int = 5 * 1024 * 1024  # attachments above this are sent via spooled resumable upload
+    GMAIL_UPLOAD_CHUNK_SIZE: int = 4 * 1024 * 1024           # resumable upload chunk (multiple of 256 KB)
+    GMAIL_BODY_TEXT_LIMIT: int = 8000             # text extracted per HTML body; every screen truncates below this
+    HTML_TEXT_ENGINE: str = "fast"                # "fast" (streaming tokenizer) or "bs4" (BeautifulSoup)
+    GMAIL_PAYLOAD_STATS: bool = True              # per call-type response byte accounting on /admin/cache-stats
+    GMAIL_TRANSPORT: str = "discovery"            # "discovery" (googleapiclient in threads) or "rest" (async httpx, HTTP/2)
+    GMAIL_HTTP_MAX_CONNECTIONS: int = 20          # pooled connections for the REST transport
+
+    # --- EMBEDDING CACHE (content-hash keyed, memory LRU + local SQLite) ---
+    EMBEDDING_CACHE_SIZE: int = 2048
+    EMBEDDING_CACHE_PATH: str = "data/embeddings.db"
+
+    # --- AGENT CONTEXT ASSEMBLY (per-source deadlines, seconds) ---
+    CONTEXT_SOURCE_TIMEOUT: float = 2.0           # contacts, memory prompt
+    CONTEXT_PROFILE_TIMEOUT: float = 4.0          # user record + preferences (admin restrictions live here)
+    CONTEXT_SEMANTIC_TIMEOUT: float = 3.0         # query embedding + pgvector search
+    SPECULATIVE_CONTEXT_PREFETCH: bool = True     # start the context stage while the Groq router is still deciding
+
+    # --- AGENT TOOL LOOP (manual function calling; one step's calls run concurrently) ---
+    AGENT_MAX_MODEL_STEPS: int = 5                # Gemini round trips that may request tools (was AFC maximum_remote_calls)
+    AGENT_TOOL_BUDGET: int = 8                    # tool executions per turn
+    AGENT_TOOL_TIMEOUT: float = 20.0              # per tool call
+    AGENT_TURN_DEADLINE: float = 45.0             # wall clock for the whole Gemini turn
+    TOOL_CACHE_ENABLED: bool = True               # memoize read-only tool results (search_gmail_tool)
+    TOOL_CACHE_SIZE: int = 512
+    TOOL_CACHE_TTL: int = 120                     # seconds; mailbox/contact mutations invalidate earlier
+    TOOL_CACHE_EMPTY_TTL: int = 15                # "no results" outcomes; mail may land before the next sync tick
+    SUMMARY_CACHE_ENABLED: bool = True            # reuse Groq summaries of search results per (message id, content hash)
+    SUMMARY_CACHE_SIZE: int = 2048                # cached per-email lines; whole result sets get a quarter of this
+
+    # --- LOCAL INTENT PRE-CLASSIFIER (skips the Groq router on unambiguous messages) ---
+    INTENT_PRECLASSIFIER_ENABLED: bool = True
+    INTENT_PRECLASSIFIER_MIN_SCORE: int = 2       # email-vocabulary score (strong term = 2, weak = 1) to route locally
+
+    # --- STREAMING REPLIES (progressive edits of the "Thinking..." message) ---
+    GEMINI_STREAMING: bool = True
+    TELEGRAM_STREAM_EDIT_INTERVAL: float = 1.5    # min seconds between edits; Bot API throttles ~1 edit/s per chat
+    TELEGRAM_STREAM_MIN_DELTA: int = 24           # min new characters before another edit is worth sending
+
+    # --- OUTBOUND HTTP POOL (Groq, Gemini REST, Google userinfo, Telegram Bot API) ---
+    HTTP_POOL_MAX_CONNECTIONS: int = 50
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 60.0      # idle seconds before a pooled connection is dropped
+    HTTP_POOL_TIMEOUT: float = 20.0               # default per-request timeout; callers may override
+    HTTP_POOL_RETRIES: int = 2                    # retries on connection errors; read errors and 502/503/504 only when idempotent
+    HTTP_POOL_MAX_BACKOFF: float = 4.0
+
+    # --- GMAIL QUOTA (units/s; messages.get = 5, messages.send = 100) ---
+    GMAIL_USER_QUOTA_PER_SEC: int = 250           # Gmail per-user limit
+    GMAIL_PROJECT_QUOTA_PER_SEC: int = 20000      # 1,200,000 units/min per project
+    GMAIL_RATE_LIMIT_RETRIES: int = 3             # retries after 429 / rateLimitExceeded
+    GMAIL_MAX_BACKOFF_SECONDS: int = 32
+
+    # --- LOCAL MAIL STORE ---
+    MAILSTORE_ENABLED: bool = True                # per-user SQLite (WAL + FTS5) mirror of message metadata
+    MAILSTORE_DIR: str = "data/mailstore"
+    MAILSTORE_MAX_ROWS: int = 20000               # newest messages kept per user; older rows are pruned
+
+    # --- BACKGROUND OAUTH REFRESH ---
+    OAUTH_REFRESH_INTERVAL: int = 60              # seconds between refresher scans
+    OAUTH_REFRESH_WINDOW: int = 900               # refresh tokens expiring within this many seconds
+    OAUTH_REFRESH_JITTER: float = 5.0             # max random delay before each refresh, spreads bursts
+    OAUTH_REFRESH_LEASE_TTL: int = 60             # cross-node refresh lease lifetime
+
+    # --- GMAIL PUSH NOTIFICATIONS (users.watch -> Pub/Sub push -> /webhook/gmail) ---
+    GMAIL_PUBSUB_TOPIC: str | None = None          # projects/<project>/topics/<topic>; push disabled when unset
+    GMAIL_PUSH_TOKEN: str | None = None            # REQUIRED with GMAIL_PUBSUB_TOPIC: shared secret expected as ?token= on the push endpoint
+    GMAIL_WATCH_RENEW_INTERVAL: int = 21600        # seconds between users.watch renewals (watches expire after 7 days)
+    GMAIL_WATCH_FALLBACK_POLL: int = 900           # seconds between safety polls for users with a live watch
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
+    @model_validator(mode="after")
+    def _require_push_token(self):
+        # /webhook/gmail triggers syncs (and quota spend) for any address it is told about
+        if self.GMAIL_PUBSUB_TOPIC and not self.GMAIL_PUSH_TOKEN:
+            raise ValueError("GMAIL_PUSH_TOKEN must be set when GMAIL_PUBSUB_TOPIC enables Gmail push notifications")
+        return self
+
     def get_utc_now(self) -> str:
         return datetime.utcnow().replace(tzinfo=None).isoformat() + "Z"
 
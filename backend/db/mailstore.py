@@ -0,0 +1,290 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id            TEXT PRIMARY KEY,
+    thread_id     TEXT,
+    sender        TEXT NOT NULL DEFAULT '',
+    subject       TEXT NOT NULL DEFAULT '',
+    snippet       TEXT NOT NULL DEFAULT '',
+    internal_date INTEGER NOT NULL DEFAULT 0,
+    label_ids     TEXT,               -- JSON list, NULL when not yet known
+    attachments   TEXT,               -- JSON manifest, NULL when only metadata has been fetched
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(internal_date DESC);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    sender, subject, snippet, content='messages', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, sender, subject, snippet) VALUES (new.rowid, new.sender, new.subject, new.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, sender, subject, snippet) VALUES ('delete', old.rowid, old.sender, old.subject, old.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, sender, subject, snippet) VALUES ('delete', old.rowid, old.sender, old.subject, old.snippet);
+    INSERT INTO messages_fts(rowid, sender, subject, snippet) VALUES (new.rowid, new.sender, new.subject, new.snippet);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO messages (id, thread_id, sender, subject, snippet, internal_date, label_ids, attachments, updated_at)
+VALUES (:id, :thread_id, :sender, :subject, :snippet, :internal_date, :label_ids, :attachments, :updated_at)
+ON CONFLICT(id) DO UPDATE SET
+    thread_id     = COALESCE(excluded.thread_id, thread_id),
+    sender        = excluded.sender,
+    subject       = excluded.subject,
+    snippet       = CASE WHEN excluded.snippet != '' THEN excluded.snippet ELSE snippet END,
+    internal_date = CASE WHEN excluded.internal_date != 0 THEN excluded.internal_date ELSE internal_date END,
+    label_ids     = COALESCE(excluded.label_ids, label_ids),
+    attachments   = COALESCE(excluded.attachments, attachments),
+    updated_at    = excluded.updated_at
+"""
+
+# Oldest rows (by internal_date) beyond the per-user cap; the FTS delete trigger keeps the index in step
+_PRUNE = "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM messages ORDER BY internal_date DESC LIMIT -1 OFFSET ?)"
+_PRUNE_EVERY = 50  # upsert batches between cap checks
+
+_COLUMNS = "id, thread_id, sender, subject, snippet, internal_date, label_ids, attachments"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class MailStore:
+    """
+    On-disk per-user mailbox metadata mirror (SQLite, WAL mode, FTS5 over sender/subject/snippet).
+    Holds headers, snippet, labels and attachment manifests only; bodies are always fetched
+    from Gmail. Rows are written by GmailClient as metadata is fetched and kept current by
+    the history sync, so list rows, notifications and cached-email lookups resolve locally.
+    One database file per user keeps writers independent and makes logout purges a file delete.
+    Public methods are coroutines: SQLite work runs in a worker thread under a per-user lock,
+    never on the event loop. Each store is capped at MAILSTORE_MAX_ROWS newest messages.
+    """
+
+    def __init__(self, directory: str = settings.MAILSTORE_DIR):
+        self.directory = directory
+        self._conns: Dict[int, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+        self._user_locks: Dict[int, threading.Lock] = {}
+        self._writes: Dict[int, int] = {}
+        self.pruned = 0
+        self.fts_available = True
+        self.unavailable = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.MAILSTORE_ENABLED and not self.unavailable
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _locked(self, user_id: int, fn, *args):
+        with self._user_lock(user_id):
+            return fn(user_id, *args)
+
+    async def _run(self, user_id: int, fn, *args):
+        return await asyncio.to_thread(self._locked, user_id, fn, *args)
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"user_{user_id}.db")
+
+    def _conn(self, user_id: int) -> sqlite3.Connection:
+        conn = self._conns.get(user_id)
+        if conn is not None:
+            return conn
+        with self._lock:
+            conn = self._conns.get(user_id)
+            if conn is None:
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    conn = sqlite3.connect(self._path(user_id), check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(_SCHEMA)
+                except (OSError, sqlite3.Error) as e:
+                    # Read-only or missing volume: turn the store off so callers fall back to Gmail
+                    logger.error(f"Mail store unavailable at {self.directory}, disabling it: {e}")
+                    self.unavailable = True
+                    raise sqlite3.OperationalError(str(e)) from e
+                try:
+                    conn.executescript(_FTS_SCHEMA)
+                except sqlite3.OperationalError:
+                    # SQLite built without FTS5: search degrades to LIKE scans
+                    self.fts_available = False
+                self._conns[user_id] = conn
+        return conn
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "threadId": row["thread_id"] or "",
+            "sender": row["sender"],
+            "subject": row["subject"],
+            "snippet": row["snippet"],
+            "internal_date": row["internal_date"],
+            "label_ids": json.loads(row["label_ids"]) if row["label_ids"] else None,
+            "attachments": json.loads(row["attachments"]) if row["attachments"] is not None else None,
+        }
+
+    async def upsert_messages(self, user_id: int, rows: Iterable[Dict[str, Any]]) -> None:
+        """Inserts or refreshes message rows; fields a row does not carry keep their stored value."""
+        if not self.enabled:
+            return
+        now = time.time()
+        params = [{
+            "id": r["id"],
+            "thread_id": r.get("threadId") or None,
+            "sender": r.get("sender", ""),
+            "subject": r.get("subject", ""),
+            "snippet": r.get("snippet", ""),
+            "internal_date": int(r.get("internal_date", 0) or 0),
+            "label_ids": json.dumps(r["label_ids"]) if r.get("label_ids") is not None else None,
+            "attachments": json.dumps(r["attachments"]) if r.get("attachments") is not None else None,
+            "updated_at": now,
+        } for r in rows if r.get("id")]
+        if params:
+            await self._run(user_id, self._upsert, params)
+
+    def _upsert(self, user_id: int, params: List[Dict[str, Any]]) -> None:
+        try:
+            conn = self._conn(user_id)
+            with conn:
+                conn.executemany(_UPSERT, params)
+                writes = self._writes.get(user_id, 0)
+                self._writes[user_id] = writes + 1
+                if writes % _PRUNE_EVERY == 0:
+                    self.pruned += max(0, conn.execute(_PRUNE, (settings.MAILSTORE_MAX_ROWS,)).rowcount)
+        except sqlite3.Error as e:
+            logger.warning(f"Mail store upsert failed for user {user_id}: {e}")
+
+    async def get_many(self, user_id: int, msg_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Returns stored rows keyed by message ID; IDs not in the store are simply absent."""
+        if not self.enabled or not msg_ids:
+            return {}
+        return await self._run(user_id, self._get_many, list(msg_ids))
+
+    def _get_many(self, user_id: int, msg_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            placeholders = ",".join("?" * len(msg_ids))
+            rows = self._conn(user_id).execute(
+                f"SELECT {_COLUMNS} FROM messages WHERE id IN ({placeholders})", list(msg_ids)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Mail store read failed for user {user_id}: {e}")
+            return {}
+        found = {row["id"]: self._row_to_dict(row) for row in rows}
+        self.hits += len(found)
+        self.misses += len(msg_ids) - len(found)
+        return found
+
+    async def get(self, user_id: int, msg_id: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many(user_id, [msg_id])).get(msg_id)
+
+    async def update_labels(self, user_id: int, changes: Dict[str, List[str]]) -> None:
+        """Applies {msg_id: label_ids} from history records to rows already in the store."""
+        if not self.enabled or not changes:
+            return
+        await self._run(user_id, self._update_labels, changes)
+
+    def _update_labels(self, user_id: int, changes: Dict[str, List[str]]) -> None:
+        try:
+            conn = self._conn(user_id)
+            with conn:
+                conn.executemany("UPDATE messages SET label_ids = ?, updated_at = ? WHERE id = ?",
+                                 [(json.dumps(labels), time.time(), m_id) for m_id, labels in changes.items()])
+        except sqlite3.Error as e:
+            logger.warning(f"Mail store label update failed for user {user_id}: {e}")
+
+    async def remove_messages(self, user_id: int, msg_ids: Iterable[str]) -> None:
+        if not self.enabled:
+            return
+        ids = [(m_id,) for m_id in msg_ids]
+        if ids:
+            await self._run(user_id, self._remove, ids)
+
+    def _remove(self, user_id: int, ids: List[tuple]) -> None:
+        try:
+            conn = self._conn(user_id)
+            with conn:
+                conn.executemany("DELETE FROM messages WHERE id = ?", ids)
+        except sqlite3.Error as e:
+            logger.warning(f"Mail store delete failed for user {user_id}: {e}")
+
+    async def search(self, user_id: int, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Full-text prefix search over sender, subject and snippet, newest first."""
+        if not self.enabled:
+            return []
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens:
+            return []
+        return await self._run(user_id, self._search, tokens, limit)
+
+    def _search(self, user_id: int, tokens: List[str], limit: int) -> List[Dict[str, Any]]:
+        try:
+            conn = self._conn(user_id)
+            if self.fts_available:
+                match = " ".join(f'"{t}"*' for t in tokens)
+                rows = conn.execute(
+                    f"SELECT {', '.join('m.' + c for c in _COLUMNS.split(', '))} FROM messages_fts f "
+                    "JOIN messages m ON m.rowid = f.rowid WHERE messages_fts MATCH ? "
+                    "ORDER BY m.internal_date DESC LIMIT ?", (match, limit)).fetchall()
+            else:
+                like = f"%{' '.join(tokens)}%"
+                rows = conn.execute(
+                    f"SELECT {_COLUMNS} FROM messages WHERE sender LIKE ? OR subject LIKE ? OR snippet LIKE ? "
+                    "ORDER BY internal_date DESC LIMIT ?", (like, like, like, limit)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Mail store search failed for user {user_id}: {e}")
+            return []
+        return [self._row_to_dict(row) for row in rows]
+
+    async def drop_user(self, user_id: int) -> None:
+        """Closes and deletes a user's store (logout)."""
+        await self._run(user_id, self._drop)
+
+    def _drop(self, user_id: int) -> None:
+        self._writes.pop(user_id, None)
+        with self._lock:
+            conn = self._conns.pop(user_id, None)
+        if conn is not None:
+            conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self._path(user_id) + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove mail store file for user {user_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "unavailable": self.unavailable,
+            "fts5": self.fts_available,
+            "open_stores": len(self._conns),
+            "row_hits": self.hits,
+            "row_misses": self.misses,
+            "rows_pruned": self.pruned,
+        }
+
+
+mail_store = MailStore()
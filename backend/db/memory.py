@@ -4,6 +4,7 @@ from typing import List, Dict, Any, Optional
 from cachetools import TTLCache
 from config import settings
 from db.models import db_manager
+from db.mailstore import mail_store
 from utils.embeddings import generate_embedding
 
 class MemoryManager:
@@ -184,6 +185,17 @@ class MemoryManager:
 
     async def search_cached_emails(self, telegram_id: int, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """NEW: Flexible search for AI to find cached emails by topic, sender, or date without fetching all."""
+        # Answered from the local mail store first; Supabase email_cache only holds partial rows
+        local = await mail_store.search(telegram_id, query, limit)
+        if local:
+            return [{
+                "telegram_id": telegram_id,
+                "gmail_message_id": row["id"],
+                "sender": row["sender"],
+                "subject": row["subject"],
+                "preview": row["snippet"],
+                "internal_date": row["internal_date"]
+            } for row in local]
         try:
             result = await self.db.db.run(lambda: self.db.db.client.table("email_cache")
                                          .select("id, telegram_id, gmail_message_id, sender, sender_email, subject, preview, received_at, cached_at")
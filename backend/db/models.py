@@ -3,6 +3,7 @@ import uuid
 import os
 import hashlib
 import logging
+from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, Optional, List
 from supabase import create_client, Client
 from cachetools import TTLCache
@@ -157,6 +158,55 @@ class DBManager:
             logger.error(f"DB Error in get_active_auto_check_users: {e}")
             return self.cache.get("active_auto_check_users", [])
 
+    # ==========================================
+    # GMAIL SYNC STATE
+    # ==========================================
+    async def get_gmail_history_id(self, telegram_id: int) -> Optional[str]:
+        """Returns the persisted Gmail historyId watermark used by incremental inbox sync."""
+        try:
+            result = await self.db.run(lambda: self.db.client.table("users").select("gmail_history_id").eq("telegram_id", telegram_id).maybe_single().execute())
+            data = self._safe_data(result)
+            return data.get("gmail_history_id") if data else None
+        except Exception as e:
+            logger.error(f"DB Error in get_gmail_history_id: {e}")
+            return None
+
+    async def set_gmail_history_id(self, telegram_id: int, history_id: Optional[str]) -> bool:
+        try:
+            await self.db.run(lambda: self.db.client.table("users").update({"gmail_history_id": history_id}).eq("telegram_id", telegram_id).execute())
+            return True
+        except Exception as e:
+            logger.error(f"DB Error in set_gmail_history_id: {e}")
+            return False
+
+    async def try_acquire_token_refresh_lease(self, telegram_id: int, owner: str, ttl_seconds: int) -> bool:
+        """
+        Atomically claims the per-user OAuth refresh lease so only one node refreshes a token.
+        The conditional UPDATE only matches when no live lease exists (or this node already holds it).
+        """
+        try:
+            now = datetime.now(timezone.utc)
+            # 'Z' suffix instead of '+00:00' keeps the value safe inside the PostgREST or= filter
+            now_str = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+            until = (now + timedelta(seconds=ttl_seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            result = await self.db.run(lambda: self.db.client.table("users")
+                                       .update({"token_refresh_owner": owner, "token_refresh_lease_until": until})
+                                       .eq("telegram_id", telegram_id)
+                                       .or_(f"token_refresh_lease_until.is.null,token_refresh_lease_until.lt.{now_str},token_refresh_owner.eq.{owner}")
+                                       .execute())
+            return bool(self._safe_data(result))
+        except Exception as e:
+            logger.error(f"DB Error in try_acquire_token_refresh_lease: {e}")
+            return False
+
+    async def release_token_refresh_lease(self, telegram_id: int, owner: str) -> None:
+        try:
+            await self.db.run(lambda: self.db.client.table("users")
+                              .update({"token_refresh_owner": None, "token_refresh_lease_until": None})
+                              .eq("telegram_id", telegram_id).eq("token_refresh_owner", owner).execute())
+        except Exception as e:
+            logger.error(f"DB Error in release_token_refresh_lease: {e}")
+
     # ==========================================
     # AUTHENTICATION SESSIONS
     # ==========================================
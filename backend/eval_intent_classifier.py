@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import argparse
+
+# Append backend to path so imports work natively
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.intent_classifier import IntentPreClassifier
+
+# Scores the local intent pre-classifier against a labelled fixture set (the
+# test_simulation.py prompts plus logged-style chitchat/recall turns). Messages the
+# classifier defers are routed to Groq in production, so precision is measured on the
+# locally answered subset and recall against every labelled message of that class.
+#
+#   python eval_intent_classifier.py [--verbose]
+
+FIXTURES = [
+    # test_simulation.py
+    ("Abdullah ko email bhejo k Friday ki party on hai ya nahi.", "EMAIL_ACTION"),
+    ("yr kal walay abdullah ko nai, danish ko mail draft karo k viva kab hai?", "EMAIL_ACTION"),
+    ("Bhai jaan ek email likh do sir naveed ko FYP report k baray mein aur attach bhi karni hai file.", "EMAIL_ACTION"),
+    ("Hello, mera inbox kaisa chal raha hai aaj?", "EMAIL_ACTION"),
+    ("kia tum sach ma smart ho ya just script ho?", "CHITCHAT"),
+    ("exam schedule aa gya final ka?", "EMAIL_ACTION"),
+    ("Meri last 7 emails do jo mene receive ki hain.", "EMAIL_ACTION"),
+    ("5 ghanta pehle ki received emails mein dekho meri FYP report approve ho gai kya?", "EMAIL_ACTION"),
+    ("zaphyre ki taraf se koi recruitment ki email aayi hai iqra university wale account par?", "EMAIL_ACTION"),
+    ("UNV platform ki registration wali email dhoond kar batao usme link kya tha.", "EMAIL_ACTION"),
+    ("check karo mene danish ko last week kya bheja tha.", "EMAIL_ACTION"),
+    ("is pdf file ko parho aur batao isme similarity report kitni hai.", "EMAIL_ACTION"),
+    ("jo file mene abhi attach ki hai, usko summarize karke email banao.", "EMAIL_ACTION"),
+    ("mail kro... nai ruk jao, pehle inbox check karo koi nayi mail to nai aayi.", "EMAIL_ACTION"),
+    ("muhammad salman wattoo ko forward kar do meri last aayi hui email.", "EMAIL_ACTION"),
+    ("draft an email for the junior developer position and also show me 18% profit rates email.", "EMAIL_ACTION"),
+    ("Hye", "CHITCHAT"),
+    ("last 5.", "EMAIL_ACTION"),
+    ("is file ko read kr k batao k bachelors ka last semester kab khatam hoga.", "EMAIL_ACTION"),
+    ("send a mail to hr@company.com saying I upgraded my Upaisa wallet.", "EMAIL_ACTION"),
+    # Chitchat
+    ("thanks", "CHITCHAT"),
+    ("Thank you so much!", "CHITCHAT"),
+    ("shukriya", "CHITCHAT"),
+    ("jazakallah khair", "CHITCHAT"),
+    ("ok", "CHITCHAT"),
+    ("theek hai", "CHITCHAT"),
+    ("bye", "CHITCHAT"),
+    ("Allah Hafiz", "CHITCHAT"),
+    ("how are you?", "CHITCHAT"),
+    ("kaise ho", "CHITCHAT"),
+    ("kya haal hai?", "CHITCHAT"),
+    ("good night", "CHITCHAT"),
+    ("you are really helpful", "CHITCHAT"),
+    ("tumhara naam kya hai?", "CHITCHAT"),
+    ("what's the weather like today?", "CHITCHAT"),
+    # History recall
+    ("what did you just say?", "HISTORY_RECALL"),
+    ("repeat that please", "HISTORY_RECALL"),
+    ("can you say that again", "HISTORY_RECALL"),
+    ("what was your last answer?", "HISTORY_RECALL"),
+    ("dobara batao", "HISTORY_RECALL"),
+    ("tumne kya kaha tha abhi?", "HISTORY_RECALL"),
+    ("pehle kya bataya tha tumne?", "HISTORY_RECALL"),
+    ("what were we talking about?", "HISTORY_RECALL"),
+    ("you mentioned something about a deadline earlier", "HISTORY_RECALL"),
+    ("what did you say about Ali's email?", "HISTORY_RECALL"),
+    # Email actions
+    ("show my unread emails", "EMAIL_ACTION"),
+    ("any new mail from HR?", "EMAIL_ACTION"),
+    ("reply to the last email saying I'll join", "EMAIL_ACTION"),
+    ("delete the spam from linkedin", "EMAIL_ACTION"),
+    ("schedule an email to sara for 9am tomorrow", "EMAIL_ACTION"),
+    ("search for invoices from amazon", "EMAIL_ACTION"),
+    ("ali@example.com ko bol do meeting cancel", "EMAIL_ACTION"),
+    ("download the attachments from the bank statement", "EMAIL_ACTION"),
+    ("koi nayi email aayi?", "EMAIL_ACTION"),
+    ("summarize my inbox", "EMAIL_ACTION"),
+    ("what did the professor send me yesterday?", "EMAIL_ACTION"),
+    ("did anyone reply to my proposal?", "EMAIL_ACTION"),
+]
+
+# Short follow-ups whose meaning depends on the assistant's previous turn:
+# (previous assistant reply, user message, label). A confirmation must never get a canned reply.
+FOLLOWUP_FIXTURES = [
+    ("I found no match in your inbox. Should I also search spam?", "ok", "EMAIL_ACTION"),
+    ("Found the invoice from Amazon. Should I forward it to Ali?", "perfect", "EMAIL_ACTION"),
+    ("Draft is ready. Send it now?", "theek hai", "EMAIL_ACTION"),
+    ("Kya main ye email Danish ko forward kar doon?", "acha", "EMAIL_ACTION"),
+    ("Want me to download the attachments too?", "great", "EMAIL_ACTION"),
+    ("Should I reply saying you'll join?", "cool", "EMAIL_ACTION"),
+    ("Should I schedule it for 9am tomorrow?", "thanks", "EMAIL_ACTION"),
+    ("Your email to HR has been sent.", "thanks", "CHITCHAT"),
+]
+
+INTENTS = ("CHITCHAT", "HISTORY_RECALL", "EMAIL_ACTION")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precision/recall of the local intent pre-classifier.")
+    parser.add_argument("--verbose", action="store_true", help="Print every fixture and its decision")
+    args = parser.parse_args()
+
+    clf = IntentPreClassifier()
+    tp = {i: 0 for i in INTENTS}
+    predicted = {i: 0 for i in INTENTS}
+    actual = {i: 0 for i in INTENTS}
+    deferred = 0
+
+    started = time.perf_counter()
+    decisions = [(text, label, clf.predict(text)) for text, label in FIXTURES]
+    decisions += [(f"[{previous}] {text}", label, clf.predict(text, previous)) for previous, text, label in FOLLOWUP_FIXTURES]
+    elapsed = time.perf_counter() - started
+
+    for text, label, route in decisions:
+        actual[label] += 1
+        guess = route["intent"] if route else None
+        if guess is None:
+            deferred += 1
+        else:
+            predicted[guess] += 1
+            tp[guess] += guess == label
+        if args.verbose or (guess is not None and guess != label):
+            mark = "->groq" if guess is None else ("OK" if guess == label else "WRONG")
+            print(f"{mark:<7}{label:<16}{str(guess):<16}{text}")
+
+    print("")
+    print(f"      --- INTENT PRE-CLASSIFIER ({len(decisions)} labelled messages) ---")
+    print(f"{'intent':<16}{'precision':>10}{'recall':>9}{'answered':>10}{'labelled':>10}")
+    for intent in INTENTS:
+        precision = tp[intent] / predicted[intent] if predicted[intent] else 1.0
+        recall = tp[intent] / actual[intent] if actual[intent] else 0.0
+        print(f"{intent:<16}{precision:10.2f}{recall:9.2f}{predicted[intent]:>10}{actual[intent]:>10}")
+
+    answered = len(decisions) - deferred
+    print("")
+    print(f"answered locally: {answered}/{len(decisions)} ({100 * answered / len(decisions):.0f}%), deferred to Groq: {deferred}")
+    print(f"overall local precision: {sum(tp.values()) / max(1, answered):.2f}")
+    print(f"mean decision time: {elapsed / len(decisions) * 1e6:.1f} µs")
@@ -4,6 +4,9 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import asyncio
+import base64
+import hmac
+import json
 import logging
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
@@ -48,6 +51,11 @@ async def lifespan(app: FastAPI):
     yield
     logger.info("Shutting down AI Email Assistant...")
 
+    from bot.gmail_transport import RestTransport
+    from utils.http_pool import http_pool
+    await RestTransport.aclose()
+    await http_pool.aclose()
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Email Assistant",
@@ -142,6 +150,40 @@ async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
         logger.error(f"🔥 Telegram Webhook Error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Webhook processing failed")
 
+@app.post("/webhook/gmail")
+async def gmail_push_webhook(request: Request, background_tasks: BackgroundTasks):
+    """
+    Receives Gmail users.watch notifications delivered by a Pub/Sub push subscription.
+    Payload: {"message": {"data": base64(json{"emailAddress", "historyId"}), "messageId": ...}, "subscription": ...}
+    Always acknowledges quickly (2xx) so Pub/Sub does not redeliver; the sync runs in the background.
+    """
+    # Fail closed: without a configured token the endpoint accepts nothing
+    token = request.query_params.get("token", "")
+    if not settings.GMAIL_PUSH_TOKEN or not hmac.compare_digest(token, settings.GMAIL_PUSH_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid push token")
+
+    try:
+        envelope = await request.json()
+        data = (envelope.get("message") or {}).get("data", "")
+        notification = json.loads(base64.b64decode(data).decode("utf-8")) if data else {}
+    except Exception as e:
+        logger.warning(f"Malformed Gmail push payload ignored: {e}")
+        return {"status": "ignored"}
+
+    email_address = notification.get("emailAddress")
+    history_id = str(notification.get("historyId", ""))
+    if not email_address:
+        return {"status": "ignored"}
+
+    async def process_push():
+        try:
+            await telegram_handler.handle_gmail_push(email_address, history_id)
+        except Exception as inner_e:
+            logger.error(f"🔥 Background Gmail Push Error: {inner_e}", exc_info=True)
+
+    background_tasks.add_task(process_push)
+    return {"status": "ok"}
+
 @app.post("/webhook/oauth/callback")
 async def oauth_callback_webhook(request: Request):
     """Fallback handler for Google OAuth webhooks."""
@@ -0,0 +1,57 @@
+import json
+import time
+import base64
+import asyncio
+import argparse
+
+import httpx
+
+# Local stand-in for Google Cloud Pub/Sub: posts synthetic Gmail users.watch
+# notifications to the backend's /webhook/gmail endpoint, exactly as a push
+# subscription would deliver them. Run the backend locally, then e.g.:
+#
+#   python simulate_gmail_push.py --email you@gmail.com --history-id 123456 --count 3
+
+def build_envelope(email_address: str, history_id: int, seq: int) -> dict:
+    notification = {"emailAddress": email_address, "historyId": history_id}
+    return {
+        "message": {
+            "data": base64.b64encode(json.dumps(notification).encode("utf-8")).decode("ascii"),
+            "messageId": f"sim-{int(time.time())}-{seq}",
+            "publishTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "subscription": "projects/local/subscriptions/gmail-push-simulator",
+    }
+
+async def run_simulation(args):
+    url = f"{args.url}?token={args.token}"
+
+    print("      --- STARTING GMAIL PUSH SIMULATION ---")
+    async with httpx.AsyncClient(timeout=10) as client:
+        for i in range(args.count):
+            envelope = build_envelope(args.email, args.history_id + i, i)
+            started = time.perf_counter()
+            try:
+                resp = await client.post(url, json=envelope)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"[{i + 1}/{args.count}] historyId={args.history_id + i} -> {resp.status_code} {resp.text} ({elapsed:.1f} ms)")
+            except Exception as e:
+                print(f"[{i + 1}/{args.count}] ❌ Request failed: {e}")
+            if args.interval and i < args.count - 1:
+                await asyncio.sleep(args.interval)
+
+        # A malformed message must still be acknowledged so Pub/Sub does not redeliver it
+        resp = await client.post(url, json={"message": {"data": "not-base64"}})
+        print(f"[malformed] -> {resp.status_code} {resp.text}")
+
+    print("      --- SIMULATION COMPLETE ---")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Post synthetic Gmail Pub/Sub push notifications to the backend.")
+    parser.add_argument("--url", default="http://localhost:10000/webhook/gmail")
+    parser.add_argument("--email", required=True, help="Gmail address of a connected user")
+    parser.add_argument("--history-id", type=int, default=1, help="Starting historyId (incremented per message)")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=0.0, help="Seconds between messages")
+    parser.add_argument("--token", required=True, help="Value of GMAIL_PUSH_TOKEN (the endpoint rejects pushes without it)")
+    asyncio.run(run_simulation(parser.parse_args()))
@@ -1,41 +1,187 @@
+import os
+import array
+import asyncio
+import hashlib
 import logging
-import httpx
-from typing import List, Optional
+import sqlite3
+from typing import Dict, List, Optional
+from cachetools import LRUCache
 from config import settings
+from utils.http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
-async def generate_embedding(text: str) -> Optional[List[float]]:
+_EMBED_MODEL = "gemini-embedding-2"
+_API_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+# batchEmbedContents accepts at most 100 requests per call
+_BATCH_LIMIT = 100
+
+
+class EmbeddingCache:
     """
-    Generates a 768-dimensional vector embedding for a given text
-    using Google's text-embedding-004 model via direct REST API.
-    This bypasses SDK version mismatches and v1alpha/v1beta routing errors.
+    Content-hash keyed embedding cache: an in-memory LRU in front of a local SQLite table,
+    so a keyword or email preview is embedded once per model and survives restarts.
+    Vectors are stored as packed float32.
     """
-    if not text or not text.strip() or not settings.GEMINI_API_KEY:
-        return None
-        
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-2:embedContent?key={settings.GEMINI_API_KEY}"
-        payload = {
-            "model": "models/gemini-embedding-2",
-            "content": {
-                "parts": [{"text": text}]
-            }
+
+    def __init__(self, path: str = settings.EMBEDDING_CACHE_PATH):
+        self.path = path
+        self.memory: LRUCache = LRUCache(maxsize=settings.EMBEDDING_CACHE_SIZE)
+        self._conn: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+        self.texts_embedded = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(f"{_EMBED_MODEL}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache store unavailable, using memory only: {e}")
+                self.path = None
+        return self._conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        for k in keys:
+            vec = self.memory.get(k)
+            if vec is not None:
+                found[k] = vec
+        self.memory_hits += len(found)
+
+        remaining = [k for k in keys if k not in found]
+        db = self._db() if remaining else None
+        if db is not None:
+            try:
+                placeholders = ",".join("?" * len(remaining))
+                for k, blob in db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", remaining):
+                    vec = array.array("f", blob).tolist()
+                    self.memory[k] = vec
+                    found[k] = vec
+                    self.disk_hits += 1
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]) -> None:
+        self.memory.update(vectors)
+        db = self._db()
+        if db is None or not vectors:
+            return
+        try:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                               [(k, array.array("f", v).tobytes()) for k, v in vectors.items()])
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "api_calls": self.api_calls,
+            "texts_embedded": self.texts_embedded,
+            "memory_entries": len(self.memory),
         }
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, json=payload, timeout=10.0)
-            
+
+
+embedding_cache = EmbeddingCache()
+# Keys currently being embedded, so concurrent callers share one request per text
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+async def _batch_embed(texts: List[str]) -> List[Optional[List[float]]]:
+    """One batchEmbedContents call per 100 texts; failed chunks yield None entries."""
+    url = f"{_API_BASE}/{_EMBED_MODEL}:batchEmbedContents?key={settings.GEMINI_API_KEY}"
+    vectors: List[Optional[List[float]]] = []
+    for start in range(0, len(texts), _BATCH_LIMIT):
+        chunk = texts[start:start + _BATCH_LIMIT]
+        payload = {"requests": [{"model": f"models/{_EMBED_MODEL}", "content": {"parts": [{"text": t}]}} for t in chunk]}
+        embedding_cache.api_calls += 1
+        try:
+            # Embedding is a pure function of the input: safe to replay after a dropped response
+            resp = await http_pool.post(url, json=payload, timeout=15.0, idempotent=True)
             if resp.status_code == 200:
-                data = resp.json()
-                if "embedding" in data and "values" in data["embedding"]:
-                    values = data["embedding"]["values"]
-                    logger.debug(f"Successfully generated {len(values)}-dimensional vector embedding via REST.")
-                    return values
-            else:
-                logger.error(f"REST Embedding API Error {resp.status_code}: {resp.text}")
-                
-        return None
-    except Exception as e:
-        logger.error(f"Error generating embedding via REST: {e}")
+                embeddings = resp.json().get("embeddings", [])
+                vectors.extend((e.get("values") or None) for e in embeddings)
+                vectors.extend([None] * (len(chunk) - len(embeddings)))
+                continue
+            logger.error(f"REST Embedding API Error {resp.status_code}: {resp.text}")
+        except Exception as e:
+            logger.error(f"Error generating embeddings via REST: {e}")
+        vectors.extend([None] * len(chunk))
+    return vectors
+
+
+async def generate_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Batch embedding API. Returns one vector (or None) per input text, in order.
+    Duplicate and previously seen texts are served from the content-hash cache;
+    only unseen texts are sent, together, to the batchEmbedContents endpoint.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    if not settings.GEMINI_API_KEY:
+        return results
+
+    normalized = [" ".join(t.split()) if t else "" for t in texts]
+    keys = {text: embedding_cache.key(text) for text in normalized if text}
+    cached = embedding_cache.get_many(list(set(keys.values())))
+
+    waiting: Dict[str, asyncio.Future] = {}
+    to_fetch: List[str] = []
+    for text, k in keys.items():
+        if k in cached:
+            continue
+        if k in _in_flight:
+            waiting[k] = _in_flight[k]
+        else:
+            to_fetch.append(text)
+
+    if to_fetch:
+        loop = asyncio.get_running_loop()
+        owned = {keys[t]: loop.create_future() for t in to_fetch}
+        _in_flight.update(owned)
+        try:
+            vectors = await _batch_embed(to_fetch)
+            fresh = {keys[t]: v for t, v in zip(to_fetch, vectors) if v}
+            embedding_cache.texts_embedded += len(fresh)
+            embedding_cache.put_many(fresh)
+            cached.update(fresh)
+        finally:
+            for k, fut in owned.items():
+                _in_flight.pop(k, None)
+                if not fut.done():
+                    fut.set_result(cached.get(k))
+
+    for k, fut in waiting.items():
+        vec = await fut
+        if vec:
+            cached[k] = vec
+
+    for i, text in enumerate(normalized):
+        if text:
+            results[i] = cached.get(keys[text])
+    return results
+
+
+async def generate_embedding(text: str) -> Optional[List[float]]:
+    """
+    Generates a vector embedding for a given text using Google's Gemini embedding
+    model via direct REST API (through the cached batch path).
+    This bypasses SDK version mismatches and v1alpha/v1beta routing errors.
+    """
+    if not text or not text.strip():
         return None
+    return (await generate_embeddings([text]))[0]
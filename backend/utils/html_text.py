@@ -0,0 +1,97 @@
+import re
+import html
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Markup tokens in document order: comments, CDATA, declarations/doctype, processing instructions, tags.
+# Quoted attribute values may contain '>' so they are matched as whole units.
+# The tag name, unquoted attribute characters and quoted values never overlap (the lookahead pins the
+# name to its full length), so an unclosed '<' fails in linear time instead of backtracking; a '<'
+# that does not open a well-formed tag is left as text.
+_TOKEN_RE = re.compile(
+    r'<!--.*?(?:-->|\Z)'
+    r'|<!\[CDATA\[(.*?)\]\]>'
+    r'|<![^>]*>'
+    r'|<\?[^>]*>'
+    r'|</?([a-zA-Z][^\s/>"\'<]*)(?=[\s/>"\'])(?:[^<>"\']|"[^"]*"|\'[^\']*\')*>',
+    re.S
+)
+# Raw-text elements whose contents are never rendered (html.parser's CDATA_CONTENT_ELEMENTS)
+_SKIP_CLOSE_RE = {
+    "script": re.compile(r'</script[^>]*>', re.I),
+    "style": re.compile(r'</style[^>]*>', re.I),
+}
+
+ENGINES = ("fast", "bs4")
+
+
+def fast_html_to_text(markup: str, max_chars: Optional[int] = None) -> str:
+    """
+    Single-pass regex tokenizer producing the same output as
+    BeautifulSoup(markup, 'html.parser').get_text(separator='\\n', strip=True)
+    with <script>/<style> removed, without building a tree.
+    Stops scanning once max_chars of text have been produced.
+    """
+    parts: List[str] = []
+    produced = 0
+    pos = 0
+    end = len(markup)
+
+    while pos < end:
+        match = _TOKEN_RE.search(markup, pos)
+        stop = match.start() if match else end
+        if stop > pos:
+            text = html.unescape(markup[pos:stop]).strip()
+            if text:
+                parts.append(text)
+                produced += len(text) + 1
+                if max_chars is not None and produced >= max_chars:
+                    break
+        if not match:
+            break
+
+        pos = match.end()
+        cdata = match.group(1)
+        if cdata and cdata.strip():
+            parts.append(cdata.strip())
+            produced += len(cdata) + 1
+        tag = match.group(2)
+        if tag and not match.group(0).startswith("</"):
+            closer = _SKIP_CLOSE_RE.get(tag.lower())
+            if closer:
+                close = closer.search(markup, pos)
+                pos = close.end() if close else end
+
+    return "\n".join(parts)
+
+
+def bs4_html_to_text(markup: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(markup, 'html.parser')
+    for tag in soup(["style", "script"]):
+        tag.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def html_to_text(markup: str, max_chars: Optional[int] = None, engine: str = "fast") -> str:
+    """
+    Converts an HTML email body to plain text with the selected engine.
+    The fast tokenizer falls back to BeautifulSoup if it fails; if BeautifulSoup
+    is unavailable the fast engine is used instead (and raw markup as a last resort).
+    """
+    if engine == "bs4":
+        try:
+            return bs4_html_to_text(markup)
+        except ImportError:
+            pass
+
+    try:
+        return fast_html_to_text(markup, max_chars)
+    except Exception as e:
+        logger.warning(f"Fast HTML extraction failed, falling back to BeautifulSoup: {e}")
+        try:
+            return bs4_html_to_text(markup)
+        except ImportError:
+            return markup
@@ -0,0 +1,117 @@
+import random
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Transient upstream failures worth retrying; 429 is opt-in because some callers
+# (the Groq intent router) treat it as a quota signal rather than a transient error.
+_RETRY_STATUSES = (502, 503, 504)
+# Failures before the request left this process: always safe to replay
+_PRE_SEND_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Failures after the request may have reached the server: replayed only for idempotent requests
+_POST_SEND_EXCEPTIONS = (httpx.ReadError, httpx.RemoteProtocolError)
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class HttpPool:
+    """
+    Process-wide pooled HTTP client for outbound Groq, Gemini REST, Google and Telegram Bot API calls.
+    One httpx.AsyncClient keeps a keep-alive pool per origin (HTTP/2 when 'h2' is installed),
+    so repeated calls within and across agent turns skip DNS, TCP and TLS setup.
+    Opened lazily on first use and closed by the FastAPI lifespan.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.hosts: Dict[str, int] = {}
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                                  max_keepalive_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                                  keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY)
+            timeout = httpx.Timeout(settings.HTTP_POOL_TIMEOUT, connect=10.0)
+            try:
+                self._client = httpx.AsyncClient(http2=True, limits=limits, timeout=timeout)
+            except ImportError:
+                # 'h2' not installed: same pooling over HTTP/1.1 keep-alive connections
+                self._client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None,
+                      retry_statuses: Tuple[int, ...] = _RETRY_STATUSES, idempotent: Optional[bool] = None,
+                      **kwargs) -> httpx.Response:
+        """
+        Sends one request through the shared pool with jittered exponential backoff (Retry-After is honoured).
+        Connection failures are always retried. Read/protocol errors and transient 5xx responses are only
+        retried for idempotent requests: GET/HEAD/OPTIONS/PUT/DELETE by default, or a POST whose caller
+        passes idempotent=True because replaying it has no side effects (e.g. embeddings).
+        Pass retries=0 for non-replayable bodies such as open file uploads.
+        """
+        retries = settings.HTTP_POOL_RETRIES if retries is None else retries
+        if idempotent is None:
+            idempotent = method.upper() in _IDEMPOTENT_METHODS
+        retry_exceptions = _PRE_SEND_EXCEPTIONS + _POST_SEND_EXCEPTIONS if idempotent else _PRE_SEND_EXCEPTIONS
+        host = urlsplit(url).hostname or ""
+        self.hosts[host] = self.hosts.get(host, 0) + 1
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                resp = await self.client().request(method, url, **kwargs)
+            except retry_exceptions as e:
+                if attempt >= retries:
+                    self.errors += 1
+                    raise
+                delay = self._backoff(attempt, None)
+                logger.warning(f"HTTP {method} {host} failed ({type(e).__name__}); retrying in {delay:.2f}s")
+            else:
+                if not idempotent or resp.status_code not in retry_statuses or attempt >= retries:
+                    return resp
+                delay = self._backoff(attempt, resp.headers.get("retry-after"))
+                logger.warning(f"HTTP {method} {host} returned {resp.status_code}; retrying in {delay:.2f}s")
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.HTTP_POOL_MAX_BACKOFF)
+            except ValueError:
+                pass
+        return min(0.25 * 2 ** attempt, settings.HTTP_POOL_MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": self._client is not None and not self._client.is_closed,
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "hosts": dict(self.hosts),
+        }
+
+
+http_pool = HttpPool()
@@ -0,0 +1,170 @@
+import os
+import uuid
+import asyncio
+import base64
+import mimetypes
+from contextlib import asynccontextmanager
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, List
+
+def current_rss_kb() -> int:
+    """
+    Returns the process' current resident set size in KB (0 where /proc is unavailable).
+    Unlike ru_maxrss this can go down, so a delta against a baseline isolates one operation.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _b64_tail(data: bytes) -> bytes:
+    if not data:
+        return b""
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class Base64JsonFieldDecoder:
+    """
+    Incrementally decodes one base64url string field out of a streamed JSON body
+    (e.g. Gmail's attachments.get response {"size": ..., "data": "..."}).
+    Only a 4-byte alignment carry is held between chunks, so memory stays bounded
+    by the network chunk size no matter how large the field is.
+    """
+
+    def __init__(self, field: str = "data"):
+        self._marker = f'"{field}"'.encode()
+        self._state = "seek"
+        self._pending = b""
+        self._carry = b""
+        self.peak_buffer = 0
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self._state == "done" or not chunk:
+            return b""
+
+        buf = chunk
+        if self._state == "seek":
+            buf = self._pending + buf
+            idx = buf.find(self._marker)
+            if idx < 0:
+                # Keep just enough tail to match a marker split across chunks
+                self._pending = buf[-len(self._marker):]
+                return b""
+            self._pending = b""
+            buf = buf[idx + len(self._marker):]
+            self._state = "open"
+
+        if self._state == "open":
+            idx = buf.find(b'"')
+            if idx < 0:
+                return b""
+            buf = buf[idx + 1:]
+            self._state = "value"
+
+        end = buf.find(b'"')
+        if end >= 0:
+            buf = buf[:end]
+            self._state = "done"
+
+        data = self._carry + buf
+        usable = len(data) - len(data) % 4
+        out = base64.urlsafe_b64decode(data[:usable]) if usable else b""
+        self._carry = data[usable:]
+        if self._state == "done":
+            out += _b64_tail(self._carry)
+            self._carry = b""
+
+        self.peak_buffer = max(self.peak_buffer, len(data) + len(out))
+        return out
+
+    def close(self) -> None:
+        if self._state != "done":
+            raise ValueError("Stream ended before the base64 field was complete")
+
+
+class ByteBudget:
+    """
+    Async semaphore measured in bytes: callers reserve the size of the work they are
+    about to do and wait while the shared budget is exhausted. Oversized requests are
+    clamped to the full budget so they run alone instead of deadlocking.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._cond = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        nbytes = min(max(nbytes, 1), self.limit)
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_use + nbytes <= self.limit)
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            async with cond:
+                self.in_use -= nbytes
+                cond.notify_all()
+
+
+# 57 raw bytes -> one 76-char base64 line; reading in multiples keeps every line full-width
+_B64_READ_SIZE = 57 * 16 * 1024
+
+
+def _header_block(part) -> bytes:
+    """Serialises only the header block of an email.message object."""
+    return part.as_bytes().split(b"\n\n", 1)[0]
+
+
+def write_mime_spool(spool_path: str, to_address: str, subject: str, html_body: str, attachments: List[Dict[str, str]]) -> int:
+    """
+    Writes a multipart/mixed RFC 822 message to spool_path, base64-encoding attachments
+    file-to-file in fixed-size blocks so no attachment is ever fully resident in memory.
+    Returns the number of bytes written.
+    """
+    boundary = f"===============_{uuid.uuid4().hex}=="
+    envelope = MIMEMultipart(boundary=boundary)
+    envelope['To'] = to_address
+    envelope['Subject'] = subject or "No Subject"
+    sep = f"--{boundary}".encode("ascii")
+
+    with open(spool_path, 'wb') as out:
+        out.write(_header_block(envelope) + b"\n\n")
+        out.write(sep + b"\n" + MIMEText(html_body or "", 'html').as_bytes() + b"\n")
+
+        for att in attachments:
+            content_type, encoding = mimetypes.guess_type(att["path"])
+            if content_type is None or encoding is not None:
+                content_type = 'application/octet-stream'
+            main_type, sub_type = content_type.split('/', 1)
+
+            part = MIMEBase(main_type, sub_type)
+            part['Content-Transfer-Encoding'] = 'base64'
+            part.add_header('Content-Disposition', f'attachment; filename="{att["name"]}"')
+            out.write(sep + b"\n" + _header_block(part) + b"\n\n")
+
+            with open(att["path"], 'rb') as f:
+                while True:
+                    block = f.read(_B64_READ_SIZE)
+                    if not block:
+                        break
+                    out.write(base64.encodebytes(block))
+
+        out.write(sep + b"--\n")
+        return out.tell()
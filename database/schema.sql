@@ -203,6 +203,15 @@ ADD COLUMN IF NOT EXISTS ai_allowed BOOLEAN DEFAULT TRUE,
 ADD COLUMN IF NOT EXISTS voice_allowed BOOLEAN DEFAULT TRUE,
 ADD COLUMN IF NOT EXISTS ui_nav_stack JSONB DEFAULT '[]'::jsonb;
 
+-- Gmail incremental sync watermark (users.history.list startHistoryId)
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS gmail_history_id VARCHAR(64);
+
+-- Cross-node lease for the background OAuth refresher (one node refreshes a user at a time)
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS token_refresh_owner VARCHAR(128),
+ADD COLUMN IF NOT EXISTS token_refresh_lease_until TIMESTAMP WITH TIME ZONE;
+
 -- Temporary suspension for blocked users
 ALTER TABLE blocked_users
 ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP NULL;